@@ -0,0 +1,475 @@
+"""聊天室压测：本地起一个 server.js，用 asyncio 模拟大量 Socket.IO 客户端跑注册/登录/聊天/发图场景。
+
+输出 JSON：连接速率、登录延迟、消息吞吐、端到端广播延迟 (p50/p99)、图片上传延迟。
+可以和保存的基线比较，超过阈值就算退化 (update.py 推送前会调用 gate())。
+
+用法:
+    python bench.py                         # 跑一遍，打印 JSON
+    python bench.py --clients 3000 --senders 10 --rate 0.5
+    python bench.py --compare               # 和 bench_baseline.json 比较，退化时退出码为 1
+    python bench.py --save-baseline         # 把这次结果存成新的基线
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+from sio_client import SocketIOClient, http_request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(ROOT, "bench_baseline.json")
+HOST = "127.0.0.1"
+
+# 参与比较的指标：(路径, 越大越好?)
+METRICS = [
+    ("connect.per_sec", True),
+    ("login.p99_ms", False),
+    ("chat.msgs_per_sec", True),
+    ("chat.fanout_p50_ms", False),
+    ("chat.fanout_p99_ms", False),
+    ("image.p99_ms", False),
+]
+# 毫秒级的指标抖动大，差距小于这么多毫秒不算退化
+MIN_DELTA_MS = 2.0
+# 压测客户端是单个 Python 进程，单核解析广播帧实测约 5.5 万帧/秒；每秒要收的帧 (客户端数 x 发送方数 x 速率)
+# 超过这个数的一半，广播延迟量到的就是客户端自己的积压，而不是服务器
+CLIENT_FRAMES_PER_SEC = 25000
+
+
+# ================= 启动被测服务器 =================
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port):
+    """在临时目录里放数据库、附件和归档，不碰仓库里的 chat.db。"""
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "DB_FILE": os.path.join(workdir, "bench.db"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "ARCHIVE_DIR": os.path.join(workdir, "archive"),
+        # 每次压测一个新密钥，NODE_ENV=production 的机器上也能启动
+        "SESSION_SECRET": os.urandom(32).hex(),
+        "STORAGE": "sqlite",
+        # 所有客户端都从本机连过来：不信任转发头，把按 IP 的登录限流调到压测用不完
+        "TRUST_PROXY_HOPS": "0",
+        "LOGIN_IP_LIMIT": "1000000",
+    })
+    env.pop("DATABASE_URL", None)
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    proc = subprocess.Popen(["node", "server.js"], cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server.js 启动失败，日志见 " + log.name)
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server.js 30 秒内没有开始监听")
+
+
+def stop_server(proc):
+    # SIGTERM 让服务器把写队列刷完再退出
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ================= 统计 =================
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return round(values[k], 2)
+
+
+def summary(latencies_ms):
+    return {
+        "count": len(latencies_ms),
+        "p50_ms": percentile(latencies_ms, 50),
+        "p99_ms": percentile(latencies_ms, 99),
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else None,
+    }
+
+
+def fake_png(size):
+    """大约 size 字节的真 PNG (服务器要解码它生成缩略图)；像素随机，不可压缩，也不会被内容寻址去重。"""
+    side = max(1, int((size / 3) ** 0.5))
+    rows = b"".join(b"\x00" + os.urandom(side * 3) for _ in range(side))
+
+    def chunk(kind, body):
+        return struct.pack("!I", len(body)) + kind + body + struct.pack("!I", zlib.crc32(kind + body))
+
+    ihdr = struct.pack("!IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(rows, 0)) + chunk(b"IEND", b"")
+
+
+# ================= 场景 =================
+class Bench:
+    def __init__(self, port, opts):
+        self.port = port
+        self.opts = opts
+        self.clients = []
+        self.fanout = []      # 广播延迟 (毫秒)
+        self.delivered = 0
+        self.members = 0      # 登录成功、在大厅里的客户端数
+        self.bench_tag = "bench-%d" % random.randrange(1 << 30)
+
+    def on_message(self, data):
+        text = data.get("text") or ""
+        if not text.startswith(self.bench_tag):
+            return
+        sent = float(text.rsplit(" ", 1)[1])
+        self.fanout.append((time.perf_counter() - sent) * 1000)
+        self.delivered += 1
+
+    async def connect_all(self):
+        """并发建连，统计每秒建立的连接数。"""
+        sem = asyncio.Semaphore(self.opts.concurrency)
+        latencies = []
+        failed = 0
+
+        async def one(i):
+            nonlocal failed
+            client = SocketIOClient(HOST, self.port)
+            client.on("chat message", self.on_message)
+            async with sem:
+                t = time.perf_counter()
+                try:
+                    await client.connect()
+                except Exception:
+                    failed += 1
+                    return
+                latencies.append((time.perf_counter() - t) * 1000)
+                self.clients.append(client)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(self.opts.clients)))
+        elapsed = time.perf_counter() - start
+        return dict(summary(latencies), clients=len(self.clients), failed=failed,
+                    seconds=round(elapsed, 3), per_sec=round(len(self.clients) / elapsed, 1))
+
+    async def login_all(self):
+        """注册 + 登录。bcrypt 在服务器的线程池里跑，这一步主要测准入队列和哈希线程池。"""
+        sem = asyncio.Semaphore(self.opts.concurrency)
+        latencies = []
+        failed = 0
+
+        async def one(i, client):
+            nonlocal failed
+            user = "%s-%d" % (self.bench_tag, i)
+            async with sem:
+                try:
+                    # 先挂上等回复的处理函数再发，回复来得再快也不会错过
+                    reply = client.wait_for("register_response", 60)
+                    await client.emit("register", {"username": user, "password": "bench-pass"})
+                    reg = await reply
+                    if not reg.get("success"):
+                        raise RuntimeError(reg.get("msg"))
+                    t = time.perf_counter()
+                    reply = client.wait_for("login_response", 60)
+                    await client.emit("login", {"username": user, "password": "bench-pass"})
+                    res = await reply
+                    if not res.get("success"):
+                        raise RuntimeError(res.get("msg"))
+                    latencies.append((time.perf_counter() - t) * 1000)
+                    self.members += 1
+                except Exception:
+                    failed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i, c) for i, c in enumerate(self.clients)))
+        return dict(summary(latencies), failed=failed, seconds=round(time.perf_counter() - start, 3))
+
+    async def chat(self):
+        """前 senders 个客户端按固定速率发文字消息，所有人都在大厅里，接收端算端到端延迟。"""
+        senders = self.clients[: self.opts.senders]
+        interval = 1.0 / self.opts.rate
+        acked = 0
+        errors = 0
+        ack_latencies = []
+
+        async def sender(idx, client):
+            nonlocal acked, errors
+            # 错开起点，避免所有发送方在同一毫秒发
+            await asyncio.sleep(random.random() * interval)
+            for seq in range(self.opts.messages):
+                t = time.perf_counter()
+                text = "%s %d %d %.6f" % (self.bench_tag, idx, seq, t)
+                try:
+                    res = await client.call("chat message", {"msg": text, "type": "text", "cid": "%s-%d-%d" % (self.bench_tag, idx, seq)})
+                    if res and res.get("success"):
+                        acked += 1
+                        ack_latencies.append((time.perf_counter() - t) * 1000)
+                    else:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                await asyncio.sleep(max(0, interval - (time.perf_counter() - t)))
+
+        self.fanout = []
+        self.delivered = 0
+        start = time.perf_counter()
+        await asyncio.gather(*(sender(i, c) for i, c in enumerate(senders)))
+
+        # 等广播收齐 (或超时)
+        expected = acked * self.members
+        deadline = time.perf_counter() + self.opts.drain
+        while self.delivered < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        fan = summary(self.fanout)
+        return {
+            "senders": len(senders),
+            "sent": len(senders) * self.opts.messages,
+            "acked": acked,
+            "errors": errors,
+            "ack_p50_ms": percentile(ack_latencies, 50),
+            "ack_p99_ms": percentile(ack_latencies, 99),
+            "delivered": self.delivered,
+            "expected": expected,
+            "seconds": round(elapsed, 3),
+            "msgs_per_sec": round(self.delivered / elapsed, 1),
+            "fanout_p50_ms": fan["p50_ms"],
+            "fanout_p99_ms": fan["p99_ms"],
+            "fanout_max_ms": fan["max_ms"],
+        }
+
+    async def images(self):
+        """分块上传图片：upload init -> PUT 分块 -> upload complete，统计整个流程的耗时。"""
+        uploaders = self.clients[-self.opts.images:] if self.opts.images else []
+        latencies = []
+        failed = 0
+        total_bytes = 0
+
+        async def one(client):
+            nonlocal failed, total_bytes
+            body = fake_png(self.opts.image_kb * 1024)
+            t = time.perf_counter()
+            try:
+                init = await client.call("upload init", {"size": len(body)})
+                if not init or not init.get("success"):
+                    raise RuntimeError(init)
+                offset = 0
+                while offset < len(body):
+                    chunk = body[offset: offset + init["chunkSize"]]
+                    status, headers, _ = await http_request(HOST, self.port, "PUT", "/uploads/%s?offset=%d" % (init["id"], offset), chunk)
+                    if status not in (204, 409):
+                        raise RuntimeError("PUT %d" % status)
+                    offset = int(headers["upload-offset"])
+                done = await client.call("upload complete", {"id": init["id"], "cid": "%s-img-%d" % (self.bench_tag, id(client))})
+                if not done or not done.get("success"):
+                    raise RuntimeError(done)
+                latencies.append((time.perf_counter() - t) * 1000)
+                total_bytes += len(body)
+            except Exception:
+                failed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(c) for c in uploaders))
+        elapsed = time.perf_counter() - start
+        return dict(summary(latencies), failed=failed, mb_per_sec=round(total_bytes / elapsed / 1e6, 2) if elapsed else None)
+
+    async def close(self):
+        await asyncio.gather(*(c.close() for c in self.clients), return_exceptions=True)
+
+
+async def run_scenarios(port, opts):
+    bench = Bench(port, opts)
+    result = {}
+    try:
+        result["connect"] = await bench.connect_all()
+        result["login"] = await bench.login_all()
+        result["chat"] = await bench.chat()
+        result["image"] = await bench.images()
+    finally:
+        await bench.close()
+    return result
+
+
+def run_bench(opts):
+    load = opts.clients * opts.senders * opts.rate
+    if load > CLIENT_FRAMES_PER_SEC:
+        print("⚠️  每秒要收 %d 条广播，超过压测客户端能稳定处理的 %d 条，延迟数据会偏高；"
+              "客户端多的时候把 --senders / --rate 调低" % (load, CLIENT_FRAMES_PER_SEC))
+    workdir = tempfile.mkdtemp(prefix="chat-bench-")
+    port = free_port()
+    proc = start_server(workdir, port)
+    try:
+        result = asyncio.run(run_scenarios(port, opts))
+    finally:
+        stop_server(proc)
+        shutil.rmtree(workdir, ignore_errors=True)
+    result["meta"] = {
+        "clients": opts.clients,
+        "senders": opts.senders,
+        "rate": opts.rate,
+        "messages": opts.messages,
+        "images": opts.images,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return result
+
+
+# ================= 基线比较 =================
+def lookup(result, path):
+    value = result
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(result, baseline, threshold):
+    """返回退化列表 (空列表表示通过)。"""
+    problems = []
+    params = lambda r: {k: v for k, v in r.get("meta", {}).items() if k != "time"}
+    if params(result) != params(baseline):
+        print("⚠️  压测参数和基线不一致，比较结果仅供参考")
+
+    for path, higher_is_better in METRICS:
+        new, old = lookup(result, path), lookup(baseline, path)
+        if new is None or old is None or old == 0:
+            continue
+        change = (new - old) / old
+        if higher_is_better:
+            bad = change < -threshold
+        else:
+            bad = change > threshold and new - old > MIN_DELTA_MS
+        mark = "❌" if bad else "✅"
+        print(f"{mark} {path:22} 基线 {old:>10} -> 本次 {new:>10} ({change:+.1%})")
+        if bad:
+            problems.append(f"{path}: {old} -> {new} ({change:+.1%})")
+
+    return problems + health(result)
+
+
+def health(result):
+    """这次压测本身有没有出错 (失败、报错、丢消息)，返回问题列表；不看阈值，有就是问题。"""
+    problems = []
+    for name in ("connect", "login", "image"):
+        if result.get(name, {}).get("failed"):
+            problems.append("%s: %d 个失败" % (name, result[name]["failed"]))
+    chat = result.get("chat", {})
+    if chat.get("errors"):
+        problems.append("chat: %d 条消息发送失败" % chat["errors"])
+    if not chat.get("acked"):
+        problems.append("chat: 没有一条消息发送成功")
+    elif chat.get("delivered", 0) < chat.get("expected", 0):
+        problems.append("chat: 只收到 %d / %d 条广播" % (chat["delivered"], chat["expected"]))
+    return problems
+
+
+def load_baseline(path=BASELINE):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(result, path=BASELINE):
+    """有失败或丢消息的结果不能当基线 (以后的比较全会偏)，拒绝保存并返回 False。"""
+    problems = health(result)
+    if problems:
+        print("❌ 这次压测有错误，不能存为基线:")
+        for p in problems:
+            print("   - " + p)
+        return False
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"💾 基线已保存到 {os.path.relpath(path, ROOT)}，检查后和代码一起提交")
+    return True
+
+
+def gate(threshold=None, argv=()):
+    """给 update.py 用：跑一遍默认压测并和基线比较，没有退化返回 True。
+
+    基线 bench_baseline.json 要先用 --save-baseline 生成、看过再提交；没有基线时不放行
+    (不能拿待检查的版本给自己当基线)。阈值默认取环境变量 BENCH_THRESHOLD (0.15 = 15%)。
+    """
+    opts = parse_args(list(argv))
+    if threshold is None:
+        threshold = opts.threshold
+    print("\n⏱️  正在压测新版本 ...")
+    try:
+        result = run_bench(opts)
+    except Exception as e:
+        print(f"❌ 压测失败: {e}")
+        return False
+
+    baseline = load_baseline()
+    if baseline is None:
+        print("❌ 还没有基线：在装好依赖的机器上用旧版本跑 python bench.py --save-baseline，")
+        print("   检查 bench_baseline.json 后提交 (确实要跳过压测可以设 BENCH_SKIP=1)")
+        return False
+
+    problems = compare(result, baseline, threshold)
+    if problems:
+        print("\n❌ 性能退化超过阈值 %.0f%%:" % (threshold * 100))
+        for p in problems:
+            print("   - " + p)
+        return False
+    print("\n✅ 性能没有退化")
+    return True
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="聊天室压测")
+    # 默认 500：发送方 20 个、每秒 2 条时客户端每秒收 2 万帧，在上面的预算以内；每个客户端登录要服务器做两次 bcrypt，
+    # 默认值也决定了每次 update.py 推送前要等多久。要测几千个连接用 --clients 3000 --senders 10 --rate 0.5
+    p.add_argument("--clients", type=int, default=500, help="模拟的客户端数")
+    p.add_argument("--concurrency", type=int, default=200, help="同时进行的建连/登录数")
+    p.add_argument("--senders", type=int, default=20, help="发消息的客户端数")
+    p.add_argument("--rate", type=float, default=2.0, help="每个发送方每秒几条 (服务器限流是每连接 5 条/秒)")
+    p.add_argument("--messages", type=int, default=20, help="每个发送方发几条")
+    p.add_argument("--images", type=int, default=10, help="上传图片的客户端数")
+    p.add_argument("--image-kb", type=int, default=300, help="每张图片多大 (KB)")
+    p.add_argument("--drain", type=float, default=10.0, help="发完后最多等多少秒收齐广播")
+    p.add_argument("--threshold", type=float, default=float(os.environ.get("BENCH_THRESHOLD", "0.15")), help="允许的退化比例")
+    p.add_argument("--compare", action="store_true", help="和基线比较，退化时退出码为 1")
+    p.add_argument("--save-baseline", action="store_true", help="把结果存为新的基线")
+    p.add_argument("--out", help="结果 JSON 另存到这个文件")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    opts = parse_args()
+    result = run_bench(opts)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if opts.out:
+        with open(opts.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if opts.save_baseline and not save_baseline(result):
+        sys.exit(1)
+    if opts.compare:
+        baseline = load_baseline()
+        if baseline is None:
+            sys.exit("没有基线，先用 --save-baseline 保存一份")
+        problems = compare(result, baseline, opts.threshold)
+        for p in problems:
+            print("❌ " + p)
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,319 @@
+"""前端构建：把 index.html 和 public/ 下的 css/js 压缩、加内容哈希、预压缩成 .gz/.br，输出到 dist/。
+
+dist/manifest.json 记录每个源文件的 sha256 和生成的文件名；lib/assets.js 启动时发现 manifest
+和源文件对得上就直接读 dist/，对不上 (有人改了源文件没重新构建) 就退回启动时自己压缩。
+
+构建是增量的：内容没变的文件不重写，返回值是真正改动过的路径，update.py 只提交这些。
+.br 需要 brotli 模块 (pip install brotli)，没装就只出 .gz，br 交给服务器启动时补。
+
+用法:
+    python build.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PUBLIC = os.path.join(ROOT, "public")
+DIST = os.path.join(ROOT, "dist")
+MANIFEST = os.path.join(DIST, "manifest.json")
+EXTS = (".css", ".js")
+
+
+# ================= 压缩 =================
+# 都是保守的压缩：去注释、去缩进、合并空白，不改名、不改写语法，宁可少压一点也不能压坏
+
+def minify_css(text):
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c in "\"'":
+            j = i + 1
+            while j < n and text[j] != c:
+                j += 2 if text[j] == "\\" else 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            out.append(" ")
+        elif c.isspace():
+            while i < n and text[i].isspace():
+                i += 1
+            out.append(" ")
+        else:
+            out.append(c)
+            i += 1
+    css = "".join(out)
+    # 字符串已经原样拷贝，下面的替换只会碰到结构字符 (字符串里恰好有 "; }" 这种写法的概率可以忽略)
+    css = re.sub(r" *([{};,>]) *", r"\1", css)
+    css = re.sub(r": +", ":", css)
+    css = css.replace(";}", "}")
+    return css.strip()
+
+
+# 这些字符前后的空白都可以去掉 (不含 + - / . —— "a + +b"、"a - -b"、"x / /re/" 这类去空格会变义)
+JS_PUNCT = set("{}()[];,:=<>?!&|*%^~")
+# 这些关键字后面的 / 是正则开头而不是除号
+JS_REGEX_AFTER = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw", "case", "do", "else", "yield", "await"}
+
+
+def minify_js(text):
+    """去注释、去缩进和空行、合并多余空白；保留换行 (不依赖分号)，字符串/模板/正则原样保留。"""
+    out = []
+    i, n = 0, len(text)
+    braces = []  # 模板字符串 ${ } 嵌套：记录进入 ${ 时的花括号深度
+    depth = 0
+    pending_space = None  # 待定的空白：" " 或 "\n"
+
+    def last_significant():
+        for chunk in reversed(out):
+            s = chunk.rstrip()
+            if s:
+                return s
+        return ""
+
+    def regex_allowed():
+        prev = last_significant()
+        if not prev:
+            return True
+        ch = prev[-1]
+        if ch.isalnum() or ch in "_$":
+            word = re.search(r"[\w$]+$", prev).group(0)
+            return word in JS_REGEX_AFTER
+        return ch not in ")]"
+
+    def flush_space(next_char):
+        nonlocal pending_space
+        if pending_space is None:
+            return
+        prev = out[-1][-1:] if out else ""
+        if pending_space == "\n":
+            # 换行前后是结构符号时 ASI 不会起作用，可以直接去掉
+            if prev and prev in "{([,;" or next_char in ")]},":
+                pass
+            else:
+                out.append("\n")
+        elif prev and not (prev in JS_PUNCT or next_char in JS_PUNCT):
+            out.append(" ")
+        pending_space = None
+
+    def scan_template(j):
+        """从 ` 或 } 之后扫模板文本，返回停下的位置 (` 之后或 ${ 之后) 和是否进入了 ${。"""
+        while j < n:
+            ch = text[j]
+            if ch == "\\":
+                j += 2
+            elif ch == "`":
+                return j + 1, False
+            elif ch == "$" and text.startswith("${", j):
+                return j + 2, True
+            else:
+                j += 1
+        return n, False
+
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            has_newline = False
+            while i < n and text[i].isspace():
+                has_newline |= text[i] == "\n"
+                i += 1
+            if out:
+                pending_space = "\n" if has_newline or pending_space == "\n" else " "
+            continue
+        if text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            block = text[i:n if end < 0 else end]
+            i = n if end < 0 else end + 2
+            if out:
+                pending_space = "\n" if "\n" in block or pending_space == "\n" else (pending_space or " ")
+            continue
+
+        flush_space(c)
+        if c in "\"'":
+            j = i + 1
+            while j < n and text[j] != c and text[j] != "\n":
+                j += 2 if text[j] == "\\" else 1
+            out.append(text[i:j + 1])
+            i = j + 1
+        elif c == "`":
+            j, entered = scan_template(i + 1)
+            out.append(text[i:j])
+            if entered:
+                braces.append(depth)
+                depth += 1
+            i = j
+        elif c == "}" and braces and depth - 1 == braces[-1]:
+            # ${ ... } 结束，回到模板文本
+            braces.pop()
+            depth -= 1
+            j, entered = scan_template(i + 1)
+            out.append(text[i:j])
+            if entered:
+                braces.append(depth)
+                depth += 1
+            i = j
+        elif c == "/" and regex_allowed():
+            j = i + 1
+            in_class = False
+            while j < n and text[j] != "\n":
+                ch = text[j]
+                if ch == "\\":
+                    j += 2
+                    continue
+                if ch == "[":
+                    in_class = True
+                elif ch == "]":
+                    in_class = False
+                elif ch == "/" and not in_class:
+                    break
+                j += 1
+            j += 1
+            while j < n and (text[j].isalnum()):
+                j += 1  # 标志位
+            out.append(text[i:j])
+            i = j
+        else:
+            if c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+            out.append(c)
+            i += 1
+    return "".join(out).strip() + "\n"
+
+
+def minify_html(text):
+    """去注释、合并空白；<pre>/<textarea> 原样保留，内联的 <style>/<script> 用上面的压缩器处理。"""
+    parts = re.split(r"(?is)(<(pre|textarea|script|style)\b[^>]*>.*?</\2>)", text)
+    out = []
+    # re.split 带两个分组：[文本, 整块, 标签名, 文本, 整块, 标签名, ...]
+    for k in range(0, len(parts), 3):
+        chunk = re.sub(r"<!--(?!\[if).*?-->", "", parts[k], flags=re.S)
+        chunk = re.sub(r"\s+", " ", chunk)
+        chunk = re.sub(r">\s+<(?=/?(?:head|body|meta|link|title|html|div|ul|li|form|h\d)\b)", "><", chunk)
+        out.append(chunk)
+        if k + 1 < len(parts):
+            block, tag = parts[k + 1], parts[k + 2].lower()
+            m = re.match(r"(?is)(<[^>]*>)(.*)(</\w+>)$", block)
+            body = m.group(2)
+            if tag == "style":
+                body = minify_css(body)
+            elif tag == "script" and body.strip():
+                body = minify_js(body).strip()
+            out.append(m.group(1) + body + m.group(3))
+    return "".join(out).strip() + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js, ".html": minify_html}
+
+
+# ================= 输出 =================
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_if_changed(path, data):
+    """内容一样就不写 (不动 mtime，git 也看不到改动)；返回是否写了。"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+def emit(name, body, changed):
+    """写 dist/<name> 和它的 .gz/.br，返回支持的编码列表。压缩后没变小的编码不要。"""
+    path = os.path.join(DIST, name)
+    encodings = []
+    # mtime=0：同样的内容压出来的字节也一样，才能做到“没变就不写”
+    variants = [("gzip", ".gz", gzip.compress(body, compresslevel=9, mtime=0))]
+    if brotli:
+        variants.insert(0, ("br", ".br", brotli.compress(body, quality=11)))
+    if write_if_changed(path, body):
+        changed.append(path)
+    for encoding, suffix, data in variants:
+        if len(data) < len(body):
+            encodings.append(encoding)
+            if write_if_changed(path + suffix, data):
+                changed.append(path + suffix)
+    return encodings
+
+
+def build(verbose=True):
+    """构建 dist/，返回改动 (写入或删除) 过的文件路径列表；什么都没变时返回空列表。"""
+    changed = []
+    manifest = {"sources": {}, "assets": {}, "html": None}
+
+    for file in sorted(os.listdir(PUBLIC)):
+        base, ext = os.path.splitext(file)
+        if ext not in EXTS:
+            continue
+        with open(os.path.join(PUBLIC, file), "rb") as f:
+            source = f.read()
+        body = MINIFIERS[ext](source.decode("utf-8")).encode("utf-8")
+        digest = sha256(body)[:16]
+        name = f"{base}.{digest}{ext}"
+        encodings = emit(os.path.join("assets", name), body, changed)
+        manifest["sources"]["public/" + file] = sha256(source)
+        manifest["assets"]["/" + file] = {"file": name, "hash": digest, "encodings": encodings}
+        if verbose:
+            print(f"   {file:20} {len(source):>7} -> {len(body):>7} 字节")
+
+    # index.html 里指向 public/ 文件的路径改成带哈希的 (规则和 lib/assets.js 一致)
+    with open(os.path.join(ROOT, "index.html"), "rb") as f:
+        source = f.read()
+    urls = {url: "/assets/" + a["file"] for url, a in manifest["assets"].items()}
+    html = re.sub(r'(=")(/[\w.-]+\.(?:js|css))(")', lambda m: m.group(1) + urls.get(m.group(2), m.group(2)) + m.group(3), source.decode("utf-8"))
+    body = minify_html(html).encode("utf-8")
+    manifest["sources"]["index.html"] = sha256(source)
+    manifest["html"] = {"file": "index.html", "hash": sha256(body)[:16], "encodings": emit("index.html", body, changed)}
+    if verbose:
+        print(f"   {'index.html':20} {len(source):>7} -> {len(body):>7} 字节")
+
+    # 上一版留下的带哈希文件删掉 (页面是 no-cache 的，拿到新页面就不会再请求旧文件)
+    keep = {a["file"] for a in manifest["assets"].values()}
+    assets_dir = os.path.join(DIST, "assets")
+    for file in os.listdir(assets_dir):
+        if re.sub(r"\.(gz|br)$", "", file) not in keep:
+            os.remove(os.path.join(assets_dir, file))
+            changed.append(os.path.join(assets_dir, file))
+
+    text = json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True) + "\n"
+    if write_if_changed(MANIFEST, text):
+        changed.append(MANIFEST)
+    return changed
+
+
+if __name__ == "__main__":
+    print("🔨 构建前端资源 ...")
+    paths = build()
+    if not brotli:
+        print("ℹ️  没装 brotli 模块，只生成了 .gz")
+    if paths:
+        for p in paths:
+            print(f"✅ {os.path.relpath(p, ROOT)}")
+    else:
+        print("✅ 没有变化")
+    sys.exit(0)
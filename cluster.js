@@ -0,0 +1,111 @@
+// 集群模式入口 (npm run start:cluster)：主进程只负责分发连接和保存在线状态，聊天逻辑都在 worker (server.js) 里
+const cluster = require('cluster');
+const net = require('net');
+const os = require('os');
+const path = require('path');
+const Presence = require('./lib/presence');
+
+const PORT = process.env.PORT || 3000;
+const WORKERS = parseInt(process.env.WEB_CONCURRENCY, 10) || (os.availableParallelism ? os.availableParallelism() : os.cpus().length);
+
+// advanced 序列化：IPC 里可以直接传 Buffer / Set (广播包里会有)
+cluster.setupPrimary({ exec: path.join(__dirname, 'server.js'), serialization: 'advanced' });
+
+const workers = [];
+const sids = new Map();          // engine.io sid -> worker，用于粘性会话
+const workerSockets = new Map(); // worker.id -> Set(socketId)，worker 挂掉时清理在线状态
+let nextWorker = 0;
+// 归档只能有一个 worker 在跑：由主进程指定，fork 时通过环境变量告诉它；它退出后重新拉起的那个接手
+let archiver = null;
+
+// 整个集群共用一份在线状态，增量广播给所有 worker
+const presence = new Presence({ batchMs: parseInt(process.env.PRESENCE_BATCH_MS, 10) || 50 });
+presence.on('delta', batch => sendAll({ bus: 'event', type: 'presence delta', payload: batch }));
+
+const requests = {
+    'presence snapshot': () => presence.snapshot()
+};
+
+function sendAll(msg, except) {
+    workers.forEach(w => { if (w !== except && w.isConnected()) w.send(msg); });
+}
+
+function fork() {
+    const isArchiver = !archiver;
+    const worker = cluster.fork({ CHAT_CLUSTER: '1', CHAT_CLUSTER_SIZE: String(WORKERS), CHAT_ARCHIVER: isArchiver ? '1' : '0' });
+    if (isArchiver) archiver = worker;
+    workers.push(worker);
+    workerSockets.set(worker.id, new Set());
+    worker.on('message', msg => onWorkerMessage(worker, msg));
+}
+
+function onWorkerMessage(worker, msg) {
+    if (!msg || !msg.bus) return;
+    switch (msg.bus) {
+        case 'publish':
+            sendAll({ bus: 'event', type: msg.type, payload: msg.payload }, worker);
+            break;
+        case 'request': {
+            const handler = requests[msg.type];
+            worker.send({ bus: 'reply', id: msg.id, payload: handler ? handler(msg.payload) : null });
+            break;
+        }
+        case 'sticky':
+            if (msg.op === 'add') sids.set(msg.sid, worker);
+            else sids.delete(msg.sid);
+            break;
+        case 'send':
+            if (msg.type === 'presence') {
+                const p = msg.payload;
+                if (p.op === 'add') {
+                    presence.add(p.socketId, p.name);
+                    workerSockets.get(worker.id).add(p.socketId);
+                } else {
+                    presence.remove(p.socketId);
+                    workerSockets.get(worker.id).delete(p.socketId);
+                }
+            }
+            break;
+    }
+}
+
+cluster.on('exit', (worker, code) => {
+    console.log(`[cluster] worker ${worker.process.pid} 退出 (code ${code})，重新拉起`);
+    workers.splice(workers.indexOf(worker), 1);
+    for (const [sid, w] of sids) if (w === worker) sids.delete(sid);
+    (workerSockets.get(worker.id) || []).forEach(id => presence.remove(id));
+    workerSockets.delete(worker.id);
+    if (worker === archiver) archiver = null;
+    if (!shuttingDown) fork();
+});
+
+// 读第一个数据块里的 sid：同一个会话的轮询请求和 websocket 升级都要落到同一个 worker
+function pickWorker(data) {
+    const m = /[?&]sid=([\w-]{20})/.exec(data);
+    const owner = m && sids.get(m[1]);
+    if (owner && owner.isConnected()) return owner;
+    nextWorker = (nextWorker + 1) % workers.length;
+    return workers[nextWorker];
+}
+
+const balancer = net.createServer({ pauseOnConnect: true }, (conn) => {
+    conn.once('data', (buf) => {
+        conn.pause();
+        const data = buf.toString('latin1');
+        const worker = pickWorker(data);
+        if (!worker) return conn.destroy();
+        worker.send({ bus: 'connection', data: buf }, conn, (err) => { if (err) conn.destroy(); });
+    });
+    conn.on('error', () => conn.destroy());
+    conn.resume();
+});
+
+let shuttingDown = false;
+process.on('SIGTERM', () => {
+    shuttingDown = true;
+    balancer.close();
+    workers.forEach(w => w.process.kill('SIGTERM'));
+});
+
+for (let i = 0; i < WORKERS; i++) fork();
+balancer.listen(PORT, () => { console.log(`Cluster primary running on port ${PORT} with ${WORKERS} workers`); });
@@ -0,0 +1,55 @@
+// 准入控制：同时处理的登录/恢复请求数有上限，多出来的排队，排太久或队太长直接拒绝 (code = 'EBUSY')
+// 部署重启时所有连接同时回来，排队能把峰值摊平，拒绝的那部分由客户端随机退避后重试
+class Admission {
+    constructor(opts = {}) {
+        this.concurrency = opts.concurrency || 16;
+        this.maxQueue = opts.maxQueue || 2000;
+        this.maxWaitMs = opts.maxWaitMs || 10000; // 排队超过这么久，客户端多半已经放弃了
+        this.active = 0;
+        this.queue = [];
+    }
+
+    get pending() { return this.queue.length; }
+
+    // fn 返回 Promise；排到了才执行
+    run(fn) {
+        if (this.active < this.concurrency) return this.start(fn);
+        if (this.queue.length >= this.maxQueue) return Promise.reject(busy());
+        return new Promise((resolve, reject) => {
+            this.queue.push({ fn, resolve, reject, deadline: Date.now() + this.maxWaitMs });
+        });
+    }
+
+    start(fn) {
+        this.active++;
+        let result;
+        try {
+            result = Promise.resolve(fn());
+        } catch (err) {
+            result = Promise.reject(err);
+        }
+        return result.finally(() => {
+            this.active--;
+            this.next();
+        });
+    }
+
+    next() {
+        while (this.queue.length && this.active < this.concurrency) {
+            const job = this.queue.shift();
+            if (Date.now() > job.deadline) {
+                job.reject(busy());
+                continue;
+            }
+            this.start(job.fn).then(job.resolve, job.reject);
+        }
+    }
+}
+
+function busy() {
+    const err = new Error('admission queue full');
+    err.code = 'EBUSY';
+    return err;
+}
+
+module.exports = Admission;
@@ -0,0 +1,125 @@
+const fs = require('fs');
+const path = require('path');
+const zlib = require('zlib');
+const { promisify } = require('util');
+const store = require('./store');
+const bus = require('./cluster-bus');
+
+const gzip = promisify(zlib.gzip);
+const gunzip = promisify(zlib.gunzip);
+
+// 消息保留策略：超过 RETENTION_DAYS 的消息分批搬进压缩的归档段文件，只追加不修改
+// archive/index.jsonl 每行记录一个段: { file, minId, maxId, minTs, maxTs, rooms, count }
+const DIR = process.env.ARCHIVE_DIR || path.join(__dirname, '..', 'archive');
+const INDEX = path.join(DIR, 'index.jsonl');
+const RETENTION_DAYS = parseFloat(process.env.RETENTION_DAYS) || 0; // 0 表示不归档
+const BATCH = parseInt(process.env.ARCHIVE_BATCH, 10) || 2000;
+const INTERVAL = 60 * 60 * 1000;
+
+let segments = null;      // 段索引；文件变了 (集群里别的进程追加了新段) 就重新读
+let indexMtime = 0;
+const cache = new Map();  // 最近读过的段 file -> rows，按插入顺序淘汰
+const CACHE_SEGMENTS = 4;
+let running = false;
+
+async function loadIndex() {
+    let stat;
+    try {
+        stat = await fs.promises.stat(INDEX);
+    } catch (err) {
+        if (err.code !== 'ENOENT') throw err;
+        return segments || (segments = []);
+    }
+    if (segments && stat.mtimeMs === indexMtime) return segments;
+    const text = await fs.promises.readFile(INDEX, 'utf8');
+    segments = text.split('\n').filter(Boolean).map(line => JSON.parse(line));
+    indexMtime = stat.mtimeMs;
+    return segments;
+}
+
+// 搬一批：先把段文件写好并落盘，再从 messages 里删掉；中途崩溃最多导致重复归档，读取时按 id 去重
+async function archiveBatch(cutoff) {
+    const rows = await store.expiredMessages(cutoff, BATCH);
+    if (!rows.length) return 0;
+
+    await loadIndex();
+    await fs.promises.mkdir(DIR, { recursive: true });
+
+    const ids = rows.map(r => r.id);
+    const meta = {
+        file: `seg-${rows[0].ts || 0}-${Math.min(...ids)}-${Math.max(...ids)}.jsonl.gz`, // 没有 ts 的老消息记 0
+        minId: Math.min(...ids),
+        maxId: Math.max(...ids),
+        minTs: rows[0].ts,
+        maxTs: rows[rows.length - 1].ts,
+        rooms: [...new Set(rows.map(r => r.room))],
+        count: rows.length
+    };
+    const body = await gzip(rows.map(r => JSON.stringify(r)).join('\n') + '\n');
+    const dest = path.join(DIR, meta.file);
+    const fh = await fs.promises.open(dest + '.tmp', 'w');
+    await fh.writeFile(body);
+    await fh.sync();
+    await fh.close();
+    await fs.promises.rename(dest + '.tmp', dest);
+    await fs.promises.appendFile(INDEX, JSON.stringify(meta) + '\n');
+    segments = null; // 下次用到时重新读索引
+
+    await store.deleteMessages(ids);
+    await store.reclaimSpace();
+    return rows.length;
+}
+
+async function runOnce() {
+    if (running || !RETENTION_DAYS) return;
+    running = true;
+    const cutoff = Date.now() - RETENTION_DAYS * 24 * 3600 * 1000;
+    let total = 0;
+    try {
+        let n;
+        while ((n = await archiveBatch(cutoff)) > 0) {
+            total += n;
+            await new Promise(resolve => setImmediate(resolve)); // 批与批之间让出事件循环
+        }
+        if (total) console.log(`[archive] 归档了 ${total} 条消息`);
+    } catch (err) {
+        console.error('[archive] 归档失败:', err.message);
+    } finally {
+        running = false;
+    }
+}
+
+function start() {
+    // 集群模式下只有主进程指定的那个 worker (CHAT_ARCHIVER=1) 归档，避免重复搬运；它挂了主进程会把这个角色交给替补
+    if (!RETENTION_DAYS || (bus.enabled && process.env.CHAT_ARCHIVER !== '1')) return;
+    setTimeout(runOnce, 10 * 1000).unref();
+    setInterval(runOnce, INTERVAL).unref();
+}
+
+async function readSegment(meta) {
+    if (cache.has(meta.file)) return cache.get(meta.file);
+    const buf = await gunzip(await fs.promises.readFile(path.join(DIR, meta.file)));
+    const rows = buf.toString('utf8').split('\n').filter(Boolean).map(line => JSON.parse(line));
+    cache.set(meta.file, rows);
+    if (cache.size > CACHE_SEGMENTS) cache.delete(cache.keys().next().value);
+    return rows;
+}
+
+// 按需读取归档：返回某房间 id < beforeId 的最新 limit 条 (按 id 降序)
+async function read(room, beforeId, limit) {
+    const segs = (await loadIndex())
+        .filter(s => s.rooms.includes(room) && (!beforeId || s.minId < beforeId))
+        .sort((a, b) => b.maxId - a.maxId);
+
+    const found = new Map();
+    for (const seg of segs) {
+        // 段按 maxId 从大到小读，已经凑够且剩下的段都更旧时就可以停了
+        if (found.size >= limit && seg.maxId < Math.min(...found.keys())) break;
+        for (const r of await readSegment(seg)) {
+            if (r.room === room && (!beforeId || r.id < beforeId)) found.set(r.id, r);
+        }
+    }
+    return [...found.values()].sort((a, b) => b.id - a.id).slice(0, limit);
+}
+
+module.exports = { start, runOnce, read };
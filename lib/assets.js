@@ -0,0 +1,142 @@
+const fs = require('fs');
+const path = require('path');
+const zlib = require('zlib');
+const crypto = require('crypto');
+
+// 静态资源：启动时读一次 public/ 下的文件，算内容哈希、预先压缩好 gzip / brotli
+// HTML 里引用的 /app.js 这类路径会被改写成 /assets/app.<hash>.js，带哈希的文件可以永久缓存
+// build.py 构建过的话 (dist/manifest.json 和源文件对得上) 直接用 dist/ 里压缩好的文件，启动时不用再压
+const ROOT = path.join(__dirname, '..');
+const PUBLIC = path.join(ROOT, 'public');
+const DIST = path.join(ROOT, 'dist');
+
+const TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8'
+};
+const IMMUTABLE = 'public, max-age=31536000, immutable';
+
+function compile(file, body) {
+    const entry = {
+        type: TYPES[path.extname(file)] || 'application/octet-stream',
+        hash: crypto.createHash('sha256').update(body).digest('hex').slice(0, 16),
+        identity: body
+    };
+    const gz = zlib.gzipSync(body, { level: 9 });
+    const br = brotli(body);
+    // 压缩后没变小就不用了
+    if (gz.length < body.length) entry.gzip = gz;
+    if (br.length < body.length) entry.br = br;
+    return entry;
+}
+
+function brotli(body) {
+    return zlib.brotliCompressSync(body, {
+        params: {
+            [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+            [zlib.constants.BROTLI_PARAM_SIZE_HINT]: body.length
+        }
+    });
+}
+
+const assets = new Map(); // 带哈希的文件名 -> entry
+const urls = {};          // 原始路径 (/app.js) -> 带哈希的路径
+let html;
+
+function sha256(buf) {
+    return crypto.createHash('sha256').update(buf).digest('hex');
+}
+
+function sources() {
+    const files = fs.readdirSync(PUBLIC).filter(f => TYPES[path.extname(f)]).map(f => 'public/' + f);
+    return files.concat('index.html');
+}
+
+// manifest 里记的源文件和现在磁盘上的一一对得上才算新鲜；改了源文件忘了重新构建就退回 build()
+function loadDist() {
+    let manifest;
+    try {
+        manifest = JSON.parse(fs.readFileSync(path.join(DIST, 'manifest.json'), 'utf8'));
+    } catch (err) {
+        return false;
+    }
+    const files = sources();
+    if (files.length !== Object.keys(manifest.sources).length) return false;
+    if (!files.every(f => manifest.sources[f] === sha256(fs.readFileSync(path.join(ROOT, f))))) return false;
+
+    const load = (file, info) => {
+        const body = fs.readFileSync(file);
+        const entry = { type: TYPES[path.extname(file)], hash: info.hash, identity: body };
+        if (info.encodings.includes('gzip')) entry.gzip = fs.readFileSync(file + '.gz');
+        // 构建机器上没装 brotli 时没有 .br，这里补上
+        if (info.encodings.includes('br')) entry.br = fs.readFileSync(file + '.br');
+        else {
+            const br = brotli(body);
+            if (br.length < body.length) entry.br = br;
+        }
+        return entry;
+    };
+    try {
+        for (const [url, info] of Object.entries(manifest.assets)) {
+            assets.set(info.file, load(path.join(DIST, 'assets', info.file), info));
+            urls[url] = '/assets/' + info.file;
+        }
+        html = load(path.join(DIST, manifest.html.file), manifest.html);
+    } catch (err) {
+        console.warn('[assets] dist/ 不完整，改为启动时构建:', err.message);
+        assets.clear();
+        for (const url of Object.keys(urls)) delete urls[url];
+        return false;
+    }
+    return true;
+}
+
+function build() {
+    for (const file of fs.readdirSync(PUBLIC)) {
+        const ext = path.extname(file);
+        if (!TYPES[ext]) continue;
+        const entry = compile(file, fs.readFileSync(path.join(PUBLIC, file)));
+        const name = `${path.basename(file, ext)}.${entry.hash}${ext}`;
+        assets.set(name, entry);
+        urls['/' + file] = '/assets/' + name;
+    }
+
+    // 只改写指向 public/ 里真实存在的文件的属性值
+    const source = fs.readFileSync(path.join(ROOT, 'index.html'), 'utf8')
+        .replace(/(=")(\/[\w.-]+\.(?:js|css))(")/g, (m, a, url, b) => urls[url] ? a + urls[url] + b : m);
+    html = compile('index.html', Buffer.from(source));
+}
+
+// 按 Accept-Encoding 选择预压缩好的版本；每种编码有自己的 ETag
+function send(req, res, entry, cacheControl) {
+    const encoding = req.acceptsEncodings(...['br', 'gzip'].filter(e => entry[e]), 'identity');
+    const body = encoding && entry[encoding] ? entry[encoding] : entry.identity;
+
+    res.set({
+        'Content-Type': entry.type,
+        'Cache-Control': cacheControl,
+        'Vary': 'Accept-Encoding',
+        'ETag': body === entry.identity ? `"${entry.hash}"` : `"${entry.hash}-${encoding}"`
+    });
+    if (req.fresh) return res.status(304).end();
+    if (body !== entry.identity) res.set('Content-Encoding', encoding);
+    res.set('Content-Length', body.length);
+    res.end(body);
+}
+
+// GET / —— 每次都要验证 (no-cache)，没变就 304
+function serveHtml(req, res) {
+    send(req, res, html, 'no-cache');
+}
+
+// GET /assets/:name
+function serveAsset(req, res) {
+    const entry = assets.get(req.params.name);
+    if (!entry) return res.sendStatus(404);
+    send(req, res, entry, IMMUTABLE);
+}
+
+if (!loadDist()) build();
+
+module.exports = { serveHtml, serveAsset, urls };
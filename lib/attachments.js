@@ -0,0 +1,110 @@
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+
+// 附件按内容哈希存储：同一张图片只落盘一次，messages 表里只保存一个很短的引用
+const ROOT = process.env.UPLOAD_DIR || path.join(__dirname, '..', 'uploads');
+const URL_PREFIX = '/attachments/';
+
+const MIME_EXT = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/avif': 'avif',
+    'image/bmp': 'bmp'
+};
+const NAME_RE = /^([0-9a-f]{64})\.(png|jpg|gif|webp|avif|bmp)$/;
+
+function filePath(name) {
+    // 按哈希前两位分目录，避免单个目录下文件过多
+    return path.join(ROOT, name.slice(0, 2), name);
+}
+
+function parseDataUrl(str) {
+    const m = /^data:([\w.+-]+\/[\w.+-]+);base64,/.exec(str);
+    if (!m) return null;
+    return { mime: m[1].toLowerCase(), buf: Buffer.from(str.slice(m[0].length), 'base64') };
+}
+
+// 按文件头识别图片类型，不信任客户端声明的 mime
+function sniff(buf) {
+    if (buf.length < 12) return null;
+    if (buf[0] === 0x89 && buf.toString('latin1', 1, 4) === 'PNG') return 'image/png';
+    if (buf[0] === 0xff && buf[1] === 0xd8 && buf[2] === 0xff) return 'image/jpeg';
+    if (buf.toString('latin1', 0, 4) === 'GIF8') return 'image/gif';
+    if (buf.toString('latin1', 0, 4) === 'RIFF' && buf.toString('latin1', 8, 12) === 'WEBP') return 'image/webp';
+    if (buf.toString('latin1', 4, 8) === 'ftyp' && /^avi[fs]$/.test(buf.toString('latin1', 8, 12))) return 'image/avif';
+    if (buf.toString('latin1', 0, 2) === 'BM') return 'image/bmp';
+    return null;
+}
+
+// 保存二进制内容，回调返回可直接放进 <img src> 的引用
+function store(buf, mime, cb) {
+    const ext = MIME_EXT[mime];
+    if (!ext) return cb(new Error('unsupported type: ' + mime));
+
+    const hash = crypto.createHash('sha256').update(buf).digest('hex');
+    const name = `${hash}.${ext}`;
+    const dest = filePath(name);
+
+    fs.stat(dest, (err) => {
+        if (!err) return cb(null, URL_PREFIX + name); // 已经存过，直接复用
+
+        fs.mkdir(path.dirname(dest), { recursive: true }, (err) => {
+            if (err) return cb(err);
+            // 先写临时文件再 rename，避免并发上传同一张图时读到半个文件
+            const tmp = `${dest}.${process.pid}.${crypto.randomBytes(4).toString('hex')}.tmp`;
+            fs.writeFile(tmp, buf, { flag: 'wx' }, (err) => {
+                if (err) return cb(err);
+                fs.rename(tmp, dest, (err) => {
+                    if (err) return fs.unlink(tmp, () => cb(err));
+                    cb(null, URL_PREFIX + name);
+                });
+            });
+        });
+    });
+}
+
+// 把已经在磁盘上的文件 (分块上传的结果) 移进附件目录，hash 由调用方流式算好
+function adopt(file, hash, mime, cb) {
+    const ext = MIME_EXT[mime];
+    if (!ext) return cb(new Error('unsupported type: ' + mime));
+
+    const name = `${hash}.${ext}`;
+    const dest = filePath(name);
+    fs.stat(dest, (err) => {
+        if (!err) return fs.unlink(file, () => cb(null, URL_PREFIX + name));
+        fs.mkdir(path.dirname(dest), { recursive: true }, (err) => {
+            if (err) return cb(err);
+            fs.rename(file, dest, (err) => cb(err, err ? undefined : URL_PREFIX + name));
+        });
+    });
+}
+
+function storeDataUrl(dataUrl, cb) {
+    const parsed = typeof dataUrl === 'string' ? parseDataUrl(dataUrl) : null;
+    if (!parsed) return cb(new Error('invalid data url'));
+    store(parsed.buf, parsed.mime, cb);
+}
+
+// GET /attachments/:name —— 内容不可变，ETag 就是哈希本身，可以长期缓存
+function serve(req, res) {
+    const m = NAME_RE.exec(req.params.name);
+    if (!m) return res.sendStatus(404);
+
+    res.sendFile(filePath(req.params.name), {
+        acceptRanges: true,
+        cacheControl: false,
+        lastModified: false,
+        etag: false,
+        headers: {
+            'ETag': `"${m[1]}"`,
+            'Cache-Control': 'public, max-age=31536000, immutable'
+        }
+    }, (err) => {
+        if (err && !res.headersSent) res.sendStatus(err.status || 404);
+    });
+}
+
+module.exports = { ROOT, URL_PREFIX, MIME_EXT, parseDataUrl, sniff, store, adopt, storeDataUrl, serve, filePath };
@@ -0,0 +1,35 @@
+// 固定窗口计数：同一个 key (IP / 用户名) 在 windowMs 内最多尝试 limit 次
+class AttemptLimiter {
+    constructor(opts = {}) {
+        this.limit = opts.limit || 10;
+        this.windowMs = opts.windowMs || 60 * 1000;
+        this.counters = new Map();
+        // 定期清理过期的 key，防止 Map 无限增长
+        setInterval(() => this.sweep(), this.windowMs).unref();
+    }
+
+    // 记一次尝试，超过上限返回 false
+    hit(key) {
+        const now = Date.now();
+        let c = this.counters.get(key);
+        if (!c || now - c.start >= this.windowMs) {
+            c = { start: now, count: 0 };
+            this.counters.set(key, c);
+        }
+        c.count++;
+        return c.count <= this.limit;
+    }
+
+    reset(key) {
+        this.counters.delete(key);
+    }
+
+    sweep() {
+        const now = Date.now();
+        for (const [key, c] of this.counters) {
+            if (now - c.start >= this.windowMs) this.counters.delete(key);
+        }
+    }
+}
+
+module.exports = AttemptLimiter;
@@ -0,0 +1,44 @@
+// 出站背压：定期检查每个连接积压了多少没发出去的数据
+// 跟不上的连接暂时收不到非关键事件 (在线增量、系统通知)；积压太多直接断开，等它重连
+const SOFT_PACKETS = 100;
+const SOFT_BYTES = 1024 * 1024;
+const HARD_BYTES = 8 * 1024 * 1024;
+
+function bufferedBytes(socket) {
+    const transport = socket.conn && socket.conn.transport;
+    const ws = transport && transport.socket;
+    return (ws && ws.bufferedAmount) || 0;
+}
+
+function queuedPackets(socket) {
+    return (socket.conn && socket.conn.writeBuffer && socket.conn.writeBuffer.length) || 0;
+}
+
+class Backpressure {
+    constructor(io, opts = {}) {
+        this.io = io;
+        this.lagging = new Set(); // 当前跟不上的 socket.id
+        this.timer = setInterval(() => this.scan(), opts.intervalMs || 250);
+        this.timer.unref();
+    }
+
+    scan() {
+        this.lagging.clear();
+        for (const socket of this.io.of('/').sockets.values()) {
+            const bytes = bufferedBytes(socket);
+            if (bytes > HARD_BYTES) {
+                socket.disconnect(true);
+            } else if (bytes > SOFT_BYTES || queuedPackets(socket) > SOFT_PACKETS) {
+                this.lagging.add(socket.id);
+            }
+        }
+    }
+
+    // 非关键事件：跳过跟不上的连接。target 是 io / io.local / io.to(room) 这类广播对象
+    emit(target, event, payload) {
+        if (this.lagging.size) target = target.except([...this.lagging]);
+        target.emit(event, payload);
+    }
+}
+
+module.exports = Backpressure;
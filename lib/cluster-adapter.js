@@ -0,0 +1,30 @@
+const { Adapter } = require('socket.io-adapter');
+const bus = require('./cluster-bus');
+
+// 跨进程广播：本地照常发，同时通过主进程转给其他 worker，由它们发给各自的本地连接
+class ClusterAdapter extends Adapter {
+    constructor(nsp) {
+        super(nsp);
+        bus.on('broadcast', (msg) => {
+            if (msg.nsp === this.nsp.name) super.broadcast(msg.packet, msg.opts);
+        });
+        this.workers = parseInt(process.env.CHAT_CLUSTER_SIZE, 10) || 1;
+    }
+
+    broadcast(packet, opts) {
+        if (!(opts.flags && opts.flags.local)) {
+            bus.publish('broadcast', {
+                nsp: this.nsp.name,
+                packet,
+                opts: { rooms: opts.rooms, except: opts.except, flags: opts.flags }
+            });
+        }
+        super.broadcast(packet, opts);
+    }
+
+    serverCount() {
+        return Promise.resolve(this.workers);
+    }
+}
+
+module.exports = ClusterAdapter;
@@ -0,0 +1,59 @@
+// 集群模式下 worker 和主进程之间的 IPC 通道；单进程模式下所有方法都是空操作
+// 消息格式: { bus: 'publish' | 'send' | 'request' | 'event' | 'reply' | 'sticky', ... }
+const enabled = !!process.send && process.env.CHAT_CLUSTER === '1';
+
+const handlers = new Map(); // type -> [fn]
+const pending = new Map();  // requestId -> cb
+let requestSeq = 0;
+
+function on(type, fn) {
+    if (!handlers.has(type)) handlers.set(type, []);
+    handlers.get(type).push(fn);
+}
+
+// 发给其他所有 worker (不包括自己)
+function publish(type, payload) {
+    if (enabled) process.send({ bus: 'publish', type, payload });
+}
+
+// 只发给主进程
+function send(type, payload) {
+    if (enabled) process.send({ bus: 'send', type, payload });
+}
+
+// 问主进程要数据，cb(payload)
+function request(type, payload, cb) {
+    if (!enabled) return;
+    const id = ++requestSeq;
+    pending.set(id, cb);
+    process.send({ bus: 'request', id, type, payload });
+}
+
+// 接管主进程转发过来的 TCP 连接 (主进程按 sid 做粘性分发)
+function acceptConnections(server, io) {
+    io.engine.on('connection', (raw) => {
+        process.send({ bus: 'sticky', op: 'add', sid: raw.id });
+        raw.once('close', () => process.send({ bus: 'sticky', op: 'del', sid: raw.id }));
+    });
+    process.on('message', (msg, conn) => {
+        if (!msg || msg.bus !== 'connection' || !conn) return;
+        server.emit('connection', conn);
+        conn.emit('data', Buffer.from(msg.data)); // 主进程为了路由已经读走了第一个数据块，这里补回去
+        conn.resume();
+    });
+}
+
+if (enabled) {
+    process.on('message', (msg) => {
+        if (!msg || !msg.bus) return;
+        if (msg.bus === 'event') {
+            (handlers.get(msg.type) || []).forEach(fn => fn(msg.payload));
+        } else if (msg.bus === 'reply') {
+            const cb = pending.get(msg.id);
+            pending.delete(msg.id);
+            if (cb) cb(msg.payload);
+        }
+    });
+}
+
+module.exports = { enabled, on, publish, send, request, acceptConnections };
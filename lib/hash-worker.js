@@ -0,0 +1,12 @@
+const { parentPort } = require('worker_threads');
+const bcrypt = require('bcryptjs');
+
+// 在 worker 线程里做 bcrypt，主线程的事件循环不受影响
+parentPort.on('message', ({ op, password, hash }) => {
+    try {
+        const result = op === 'hash' ? bcrypt.hashSync(password, 10) : bcrypt.compareSync(password, hash);
+        parentPort.postMessage({ result });
+    } catch (err) {
+        parentPort.postMessage({ error: err.message });
+    }
+});
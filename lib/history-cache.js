@@ -0,0 +1,138 @@
+// 热历史缓存：每个房间在内存里保留最新的一段消息 (按 id 连续)，翻页落在这一段里就不查库
+// 房间第一次被请求时从库里取最新 perRoom 条作为种子，之后新消息入库后写穿进来
+// 总内存按字节封顶：超了先丢图片消息的内容 (只留 id 占位，用到时按 id 回库补)，还不够再从最久没访问的房间砍最旧的
+// load.seed(room, n) 返回最新 n 行 (id 倒序)；load.fetch(ids) 返回这些 id 的行；行的格式和 messages 表一致
+// opts.enabled 为 false 时什么都不缓存，page() 一律返回 null (调用方查库)
+const ROW_OVERHEAD = 120; // 每行对象本身的大概开销
+
+function sizeOf(row) {
+    return ROW_OVERHEAD + 2 * ((row.content || '').length + (row.meta || '').length + (row.user || '').length + (row.time || '').length);
+}
+
+class HistoryCache {
+    constructor(load, opts = {}) {
+        this.load = load;
+        this.perRoom = opts.perRoom || 500;
+        this.maxBytes = opts.maxBytes || 32 * 1024 * 1024;
+        this.enabled = opts.enabled !== false;
+        this.rooms = new Map(); // room -> { rows: [...] (id 升序), seeding: Promise | null, early: [...] }，按访问顺序排列
+        this.bytes = 0;
+    }
+
+    touch(room) {
+        const entry = this.rooms.get(room);
+        this.rooms.delete(room);
+        this.rooms.set(room, entry);
+        return entry;
+    }
+
+    // 新消息入库后调用 (本进程的，以及集群里其他 worker 转发过来的)
+    append(room, row) {
+        const entry = this.rooms.get(room);
+        if (!entry) return; // 没人看过的房间不缓存
+        // 种子还在查：先记下来，查完再合并，避免查询和这条消息擦肩而过留下空洞
+        if (entry.seeding) return entry.early.push(row);
+        this.insert(entry, row);
+        this.enforce();
+    }
+
+    insert(entry, row) {
+        const rows = entry.rows;
+        // 集群里别的 worker 的消息可能晚到一点，按 id 插到正确位置；已经有的跳过
+        let i = rows.length;
+        while (i > 0 && rows[i - 1].id > row.id) i--;
+        if (i > 0 && rows[i - 1].id === row.id) return;
+        if (i === 0 && rows.length >= this.perRoom) return; // 比窗口里最旧的还旧，不属于 "最新的一段"
+        row = { ...row };
+        rows.splice(i, 0, row);
+        this.bytes += sizeOf(row);
+        while (rows.length > this.perRoom) this.bytes -= sizeOf(rows.shift());
+    }
+
+    // 已经缓存的消息事后补了字段 (比如图片预览)；不在窗口里的不用管，下次从库里读到的就是新的
+    update(room, id, fields) {
+        const entry = this.rooms.get(room);
+        const row = entry && entry.rows.find(r => r.id === id);
+        if (!row || row.stripped) return;
+        this.bytes -= sizeOf(row);
+        Object.assign(row, fields);
+        this.bytes += sizeOf(row);
+        this.enforce();
+    }
+
+    seed(room) {
+        const entry = { rows: [], seeding: null, early: [] };
+        this.rooms.set(room, entry);
+        entry.seeding = this.load.seed(room, this.perRoom).then(rows => {
+            entry.seeding = null;
+            rows.reverse().forEach(r => { entry.rows.push(r); this.bytes += sizeOf(r); });
+            entry.early.forEach(r => this.insert(entry, r));
+            entry.early = [];
+            this.enforce();
+        }, err => {
+            this.rooms.delete(room);
+            throw err;
+        });
+        return entry.seeding;
+    }
+
+    // 返回 id 倒序、最多 limit 行 (id < beforeId)，窗口里不够的话返回 null，由调用方查库
+    async page(room, beforeId, limit) {
+        if (!this.enabled) return null; // 没有房间被种下，append/update 自然也都是空操作
+        let entry = this.rooms.get(room);
+        if (!entry) await this.seed(room);
+        else if (entry.seeding) await entry.seeding;
+        entry = this.rooms.get(room);
+        if (!entry) return null;
+        this.touch(room);
+
+        const rows = entry.rows;
+        let end = rows.length;
+        if (beforeId > 0) {
+            while (end > 0 && rows[end - 1].id >= beforeId) end--;
+            // 游标比窗口里最旧的还旧 (或者正好是最旧的)，这一页不在缓存里
+            if (end === 0) return null;
+        }
+        if (end < limit) return null;
+
+        const page = rows.slice(end - limit, end).reverse();
+        await this.backfill(page);
+        return page;
+    }
+
+    // 被剥掉内容的图片消息按 id 回库补齐
+    async backfill(page) {
+        const stripped = page.filter(r => r.stripped);
+        if (!stripped.length) return;
+        const found = new Map((await this.load.fetch(stripped.map(r => r.id))).map(r => [r.id, r]));
+        for (let i = 0; i < page.length; i++) {
+            if (page[i].stripped && found.has(page[i].id)) page[i] = found.get(page[i].id);
+        }
+    }
+
+    enforce() {
+        if (this.bytes <= this.maxBytes) return;
+
+        // 第一轮：图片消息只保留 id 和类型，从最久没访问的房间、最旧的行开始
+        for (const entry of this.rooms.values()) {
+            for (const row of entry.rows) {
+                if (this.bytes <= this.maxBytes) return;
+                if (row.type !== 'image' || row.stripped) continue;
+                this.bytes -= sizeOf(row);
+                row.content = row.meta = null;
+                row.stripped = true;
+                this.bytes += sizeOf(row);
+            }
+        }
+
+        // 第二轮：从最久没访问的房间砍最旧的行，保持每个房间剩下的仍然是连续的最新一段
+        for (const [room, entry] of this.rooms) {
+            if (entry.seeding) continue;
+            while (entry.rows.length && this.bytes > this.maxBytes) this.bytes -= sizeOf(entry.rows.shift());
+            if (!entry.rows.length) this.rooms.delete(room);
+            if (this.bytes <= this.maxBytes) return;
+        }
+    }
+}
+
+module.exports = HistoryCache;
@@ -0,0 +1,1163 @@
+const zlib = require('zlib');
+
+// 纯 JS 的图片编解码：服务器上装不了原生图片库 (sharp 之类)，缩略图只能自己做，放在 worker 线程里跑
+// 解码: PNG、GIF (第一帧)、BMP、JPEG (baseline / progressive)；编码: JPEG (baseline 4:2:0)、PNG
+// WebP、AVIF 解不了，只能从文件头读出尺寸
+// 图像统一用 { width, height, data: Uint8Array (RGBA，每像素 4 字节) }
+const MAX_PIXELS = 32 * 1000 * 1000; // 解码前先看尺寸，再大就不解了 (防解压炸弹，也防一张图吃掉几百 MB 内存)
+
+// --- 尺寸 ---
+// 只读文件头，返回 { width, height } (JPEG 的 EXIF 方向是转过 90° 的话宽高互换，和浏览器显示的一致)，不认识返回 null
+function dimensions(buf) {
+    if (buf.length < 24) return null;
+    const tag = (start, end) => buf.toString('latin1', start, end);
+    if (buf[0] === 0x89 && tag(1, 4) === 'PNG') return { width: buf.readUInt32BE(16), height: buf.readUInt32BE(20) };
+    if (tag(0, 4) === 'GIF8') return { width: buf.readUInt16LE(6), height: buf.readUInt16LE(8) };
+    if (tag(0, 2) === 'BM') return bmpHeader(buf);
+    if (buf[0] === 0xff && buf[1] === 0xd8) return jpegDimensions(buf);
+    if (tag(0, 4) === 'RIFF' && tag(8, 12) === 'WEBP') return webpDimensions(buf);
+    if (tag(4, 8) === 'ftyp') return avifDimensions(buf);
+    return null;
+}
+
+function valid(size) {
+    return size && size.width > 0 && size.height > 0 ? size : null;
+}
+
+function webpDimensions(buf) {
+    const chunk = buf.toString('latin1', 12, 16);
+    if (chunk === 'VP8 ' && buf.length >= 30) {
+        return valid({ width: buf.readUInt16LE(26) & 0x3fff, height: buf.readUInt16LE(28) & 0x3fff });
+    }
+    if (chunk === 'VP8L' && buf[20] === 0x2f) {
+        const bits = buf.readUInt32LE(21);
+        return { width: (bits & 0x3fff) + 1, height: ((bits >>> 14) & 0x3fff) + 1 };
+    }
+    if (chunk === 'VP8X' && buf.length >= 30) {
+        return { width: buf.readUIntLE(24, 3) + 1, height: buf.readUIntLE(27, 3) + 1 };
+    }
+    return null;
+}
+
+// AVIF：尺寸在 meta 里的 ispe 盒子 (有网格/alpha 的图会有好几个，取最大的那个)，irot 转 90°/270° 时宽高互换
+function avifDimensions(buf) {
+    const head = buf.subarray(0, Math.min(buf.length, 64 * 1024));
+    let size = null;
+    for (let i = head.indexOf('ispe'); i >= 4 && i + 16 <= head.length; i = head.indexOf('ispe', i + 4)) {
+        const width = head.readUInt32BE(i + 8);
+        const height = head.readUInt32BE(i + 12);
+        if (!size || width * height > size.width * size.height) size = { width, height };
+    }
+    const irot = head.indexOf('irot');
+    if (size && irot >= 4 && irot + 4 < head.length && head[irot + 4] & 1) size = { width: size.height, height: size.width };
+    return valid(size);
+}
+
+function jpegDimensions(buf) {
+    let size = null;
+    let orientation = 1;
+    forEachSegment(buf, (marker, seg) => {
+        if (marker === 0xe1) orientation = exifOrientation(seg) || orientation;
+        if (isSof(marker) && seg.length >= 5) {
+            size = { width: seg.readUInt16BE(3), height: seg.readUInt16BE(1) };
+            return false;
+        }
+    });
+    if (size && orientation >= 5) size = { width: size.height, height: size.width };
+    return valid(size);
+}
+
+// --- PNG ---
+function decodePng(buf) {
+    let pos = 8;
+    let header = null;
+    let palette = null;
+    let trns = null;
+    const idat = [];
+    while (pos + 8 <= buf.length) {
+        const len = buf.readUInt32BE(pos);
+        const type = buf.toString('latin1', pos + 4, pos + 8);
+        const body = buf.subarray(pos + 8, pos + 8 + len);
+        pos += 12 + len;
+        if (type === 'IHDR') {
+            header = { width: body.readUInt32BE(0), height: body.readUInt32BE(4), depth: body[8], color: body[9], interlace: body[12] };
+        } else if (type === 'PLTE') palette = body;
+        else if (type === 'tRNS') trns = body;
+        else if (type === 'IDAT') idat.push(body);
+        else if (type === 'IEND') break;
+    }
+    if (!header) throw new Error('png: missing IHDR');
+    const { width, height, depth, color, interlace } = header;
+    const channels = { 0: 1, 2: 3, 3: 1, 4: 2, 6: 4 }[color];
+    if (!channels || ![1, 2, 4, 8, 16].includes(depth) || (color === 3 && !palette)) throw new Error('png: unsupported format');
+    checkSize(width, height);
+
+    const bpp = channels * depth; // 每像素的位数
+    const passes = interlace ? ADAM7 : [[0, 0, 1, 1]];
+    let expected = 0;
+    for (const [x0, y0, dx, dy] of passes) {
+        const pw = Math.ceil((width - x0) / dx);
+        const ph = Math.ceil((height - y0) / dy);
+        if (pw > 0 && ph > 0) expected += ph * (1 + Math.ceil(pw * bpp / 8));
+    }
+    const raw = zlib.inflateSync(Buffer.concat(idat), { maxOutputLength: expected + 1024 });
+
+    const out = new Uint8Array(width * height * 4);
+    const maxValue = (1 << depth) - 1;
+    const sample = (row, i) => {
+        if (depth === 8) return row[i];
+        if (depth === 16) return (row[2 * i] << 8) | row[2 * i + 1];
+        const bit = i * depth;
+        return (row[bit >> 3] >> (8 - depth - (bit & 7))) & maxValue;
+    };
+    const to8 = v => depth === 16 ? v >> 8 : depth === 8 ? v : Math.round(v * 255 / maxValue);
+
+    let offset = 0;
+    for (const [x0, y0, dx, dy] of passes) {
+        const pw = Math.ceil((width - x0) / dx);
+        const ph = Math.ceil((height - y0) / dy);
+        if (pw <= 0 || ph <= 0) continue;
+        const rowBytes = Math.ceil(pw * bpp / 8);
+        const rows = unfilter(raw, offset, pw, ph, rowBytes, Math.max(1, bpp >> 3));
+        offset += ph * (rowBytes + 1);
+        for (let j = 0; j < ph; j++) {
+            const row = rows.subarray(j * rowBytes, (j + 1) * rowBytes);
+            for (let i = 0; i < pw; i++) {
+                const o = ((y0 + j * dy) * width + x0 + i * dx) * 4;
+                let r, g, b, a = 255;
+                if (color === 0 || color === 4) {
+                    const v = sample(row, i * channels);
+                    r = g = b = to8(v);
+                    if (color === 4) a = to8(sample(row, i * 2 + 1));
+                    else if (trns && trns.length >= 2 && v === trns.readUInt16BE(0)) a = 0;
+                } else if (color === 3) {
+                    const idx = sample(row, i);
+                    r = palette[idx * 3] || 0;
+                    g = palette[idx * 3 + 1] || 0;
+                    b = palette[idx * 3 + 2] || 0;
+                    if (trns && idx < trns.length) a = trns[idx];
+                } else {
+                    const vr = sample(row, i * channels);
+                    const vg = sample(row, i * channels + 1);
+                    const vb = sample(row, i * channels + 2);
+                    r = to8(vr);
+                    g = to8(vg);
+                    b = to8(vb);
+                    if (color === 6) a = to8(sample(row, i * 4 + 3));
+                    else if (trns && trns.length >= 6 && vr === trns.readUInt16BE(0) && vg === trns.readUInt16BE(2) && vb === trns.readUInt16BE(4)) a = 0;
+                }
+                out[o] = r;
+                out[o + 1] = g;
+                out[o + 2] = b;
+                out[o + 3] = a;
+            }
+        }
+    }
+    return { width, height, data: out };
+}
+
+// Adam7 隔行扫描的 7 遍：[起点 x, 起点 y, x 步长, y 步长]
+const ADAM7 = [[0, 0, 8, 8], [4, 0, 8, 8], [0, 4, 4, 8], [2, 0, 4, 4], [0, 2, 2, 4], [1, 0, 2, 2], [0, 1, 1, 2]];
+
+function unfilter(raw, offset, pw, ph, rowBytes, bpp) {
+    const out = new Uint8Array(ph * rowBytes);
+    if (raw.length < offset + ph * (rowBytes + 1)) throw new Error('png: truncated data');
+    for (let y = 0; y < ph; y++) {
+        const filter = raw[offset + y * (rowBytes + 1)];
+        const src = offset + y * (rowBytes + 1) + 1;
+        const cur = y * rowBytes;
+        const prev = cur - rowBytes;
+        for (let x = 0; x < rowBytes; x++) {
+            const a = x >= bpp ? out[cur + x - bpp] : 0;
+            const b = y > 0 ? out[prev + x] : 0;
+            const c = x >= bpp && y > 0 ? out[prev + x - bpp] : 0;
+            let v = raw[src + x];
+            if (filter === 1) v += a;
+            else if (filter === 2) v += b;
+            else if (filter === 3) v += (a + b) >> 1;
+            else if (filter === 4) v += paeth(a, b, c);
+            else if (filter !== 0) throw new Error('png: bad filter');
+            out[cur + x] = v;
+        }
+    }
+    return out;
+}
+
+function paeth(a, b, c) {
+    const p = a + b - c;
+    const pa = Math.abs(p - a);
+    const pb = Math.abs(p - b);
+    const pc = Math.abs(p - c);
+    return pa <= pb && pa <= pc ? a : pb <= pc ? b : c;
+}
+
+// --- GIF (只取第一帧；animated 表示后面还有帧) ---
+function decodeGif(buf) {
+    const width = buf.readUInt16LE(6);
+    const height = buf.readUInt16LE(8);
+    checkSize(width, height);
+    let pos = 13;
+    let globalTable = null;
+    if (buf[10] & 0x80) {
+        globalTable = buf.subarray(pos, pos + 3 * (2 << (buf[10] & 7)));
+        pos += globalTable.length;
+    }
+
+    const out = new Uint8Array(width * height * 4);
+    let transparent = -1;
+    let frames = 0;
+    while (pos < buf.length) {
+        const block = buf[pos++];
+        if (block === 0x3b) break;
+        if (block === 0x21) {
+            const label = buf[pos++];
+            if (label === 0xf9 && buf[pos] >= 4) transparent = buf[pos + 1] & 1 ? buf[pos + 4] : -1;
+            pos = skipSubBlocks(buf, pos);
+        } else if (block === 0x2c) {
+            if (++frames > 1) break;
+            const left = buf.readUInt16LE(pos);
+            const top = buf.readUInt16LE(pos + 2);
+            const w = buf.readUInt16LE(pos + 4);
+            const h = buf.readUInt16LE(pos + 6);
+            const flags = buf[pos + 8];
+            pos += 9;
+            let table = globalTable;
+            if (flags & 0x80) {
+                table = buf.subarray(pos, pos + 3 * (2 << (flags & 7)));
+                pos += table.length;
+            }
+            const minCodeSize = buf[pos++];
+            const chunks = [];
+            for (let size = buf[pos++]; size && pos < buf.length; size = buf[pos++]) {
+                chunks.push(buf.subarray(pos, pos + size));
+                pos += size;
+            }
+            if (!table) continue;
+            const pixels = lzw(minCodeSize, Buffer.concat(chunks), w * h);
+            const rows = flags & 0x40 ? interlacedRows(h) : null;
+            for (let j = 0; j < h; j++) {
+                const y = top + (rows ? rows[j] : j);
+                if (y >= height) continue;
+                for (let i = 0; i < w && left + i < width; i++) {
+                    const idx = pixels[j * w + i];
+                    if (idx === transparent || idx * 3 + 2 >= table.length) continue;
+                    const o = (y * width + left + i) * 4;
+                    out[o] = table[idx * 3];
+                    out[o + 1] = table[idx * 3 + 1];
+                    out[o + 2] = table[idx * 3 + 2];
+                    out[o + 3] = 255;
+                }
+            }
+        } else {
+            break; // 坏文件：就用已经解出来的部分
+        }
+    }
+    if (!frames) throw new Error('gif: no image data');
+    return { width, height, data: out, animated: frames > 1 };
+}
+
+function skipSubBlocks(buf, pos) {
+    for (let size = buf[pos++]; size && pos < buf.length; size = buf[pos++]) pos += size;
+    return pos;
+}
+
+// 隔行存储的 GIF：第 j 行数据实际在第几行
+function interlacedRows(h) {
+    const rows = [];
+    for (const [start, step] of [[0, 8], [4, 8], [2, 4], [1, 2]]) {
+        for (let y = start; y < h; y += step) rows.push(y);
+    }
+    return rows;
+}
+
+function lzw(minCodeSize, data, count) {
+    const out = new Uint8Array(count);
+    const clear = 1 << minCodeSize;
+    const eoi = clear + 1;
+    const prefix = new Uint16Array(4096);
+    const suffix = new Uint8Array(4096);
+    const stack = new Uint8Array(4097);
+    let size = minCodeSize + 1;
+    let mask = (1 << size) - 1;
+    let next = clear + 2;
+    let old = -1;
+    let first = 0;
+    let acc = 0, bits = 0, p = 0, o = 0;
+
+    while (o < count) {
+        while (bits < size && p < data.length) {
+            acc |= data[p++] << bits;
+            bits += 8;
+        }
+        if (bits < size) break;
+        const code = acc & mask;
+        acc >>>= size;
+        bits -= size;
+
+        if (code === clear) {
+            size = minCodeSize + 1;
+            mask = (1 << size) - 1;
+            next = clear + 2;
+            old = -1;
+            continue;
+        }
+        if (code === eoi) break;
+        if (old === -1) {
+            if (code >= clear) break;
+            out[o++] = first = code;
+            old = code;
+            continue;
+        }
+        if (code > next) break;
+
+        let sp = 0;
+        let c = code;
+        if (code === next) { // KwKwK：新码是旧串加上旧串的首字符
+            stack[sp++] = first;
+            c = old;
+        }
+        while (c >= clear) {
+            stack[sp++] = suffix[c];
+            c = prefix[c];
+        }
+        stack[sp++] = first = c;
+        while (sp && o < count) out[o++] = stack[--sp];
+
+        if (next < 4096) {
+            prefix[next] = old;
+            suffix[next] = first;
+            next++;
+            if (next > mask && size < 12) {
+                size++;
+                mask = (1 << size) - 1;
+            }
+        }
+        old = code;
+    }
+    return out;
+}
+
+// --- BMP (未压缩的 1/4/8/16/24/32 位) ---
+function bmpHeader(buf) {
+    const headerSize = buf.readUInt32LE(14);
+    if (headerSize === 12) return valid({ width: buf.readUInt16LE(18), height: buf.readUInt16LE(20) });
+    if (headerSize < 40 || buf.length < 54) return null;
+    return valid({ width: buf.readInt32LE(18), height: Math.abs(buf.readInt32LE(22)) });
+}
+
+function decodeBmp(buf) {
+    const headerSize = buf.readUInt32LE(14);
+    const core = headerSize === 12;
+    const width = core ? buf.readUInt16LE(18) : buf.readInt32LE(18);
+    const rawHeight = core ? buf.readUInt16LE(20) : buf.readInt32LE(22);
+    const bits = buf.readUInt16LE(core ? 24 : 28);
+    const compression = core ? 0 : buf.readUInt32LE(30);
+    const height = Math.abs(rawHeight);
+    checkSize(width, height);
+    if (compression !== 0 && !(compression === 3 && (bits === 16 || bits === 32))) throw new Error('bmp: unsupported compression');
+
+    let masks = null;
+    if (bits === 16 || bits === 32) {
+        masks = bits === 16 ? [0x7c00, 0x3e0, 0x1f, 0] : [0xff0000, 0xff00, 0xff, 0];
+        if (compression === 3) {
+            masks = [buf.readUInt32LE(54), buf.readUInt32LE(58), buf.readUInt32LE(62), headerSize >= 56 ? buf.readUInt32LE(66) : 0];
+        }
+    } else if (bits !== 24 && bits !== 1 && bits !== 4 && bits !== 8) {
+        throw new Error('bmp: unsupported depth');
+    }
+    const entry = core ? 3 : 4;
+    const paletteStart = 14 + headerSize + (compression === 3 && headerSize === 40 ? 12 : 0);
+    const dataStart = buf.readUInt32LE(10);
+    const stride = Math.ceil(width * bits / 32) * 4;
+    if (dataStart + stride * height > buf.length) throw new Error('bmp: truncated data');
+    const fields = masks && masks.map(maskField);
+
+    const out = new Uint8Array(width * height * 4);
+    for (let y = 0; y < height; y++) {
+        const row = dataStart + (rawHeight < 0 ? y : height - 1 - y) * stride;
+        for (let x = 0; x < width; x++) {
+            const o = (y * width + x) * 4;
+            if (bits <= 8) {
+                const bit = x * bits;
+                const idx = (buf[row + (bit >> 3)] >> (8 - bits - (bit & 7))) & ((1 << bits) - 1);
+                const p = paletteStart + idx * entry;
+                out[o] = buf[p + 2];
+                out[o + 1] = buf[p + 1];
+                out[o + 2] = buf[p];
+                out[o + 3] = 255;
+            } else if (bits === 24) {
+                out[o] = buf[row + x * 3 + 2];
+                out[o + 1] = buf[row + x * 3 + 1];
+                out[o + 2] = buf[row + x * 3];
+                out[o + 3] = 255;
+            } else {
+                const px = bits === 16 ? buf.readUInt16LE(row + x * 2) : buf.readUInt32LE(row + x * 4);
+                for (let c = 0; c < 3; c++) out[o + c] = fields[c](px);
+                out[o + 3] = masks[3] ? fields[3](px) : 255;
+            }
+        }
+    }
+    return { width, height, data: out };
+}
+
+// 位掩码 -> 取出这个分量并放大到 0..255 的函数
+function maskField(mask) {
+    if (!mask) return () => 0;
+    let shift = 0;
+    while (!((mask >>> shift) & 1)) shift++;
+    const max = (mask >>> shift) >>> 0;
+    return px => Math.round((((px & mask) >>> 0) >>> shift) * 255 / max);
+}
+
+// --- JPEG ---
+// 之字形扫描序号 -> 8x8 块内的自然位置
+const ZIGZAG = [
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63
+];
+
+// DCT 基：COS[u * 8 + x] = C(u) / 2 * cos((2x + 1)uπ / 16)，正变换和逆变换共用
+const COS = new Float64Array(64);
+for (let u = 0; u < 8; u++) {
+    for (let x = 0; x < 8; x++) COS[u * 8 + x] = (u ? 1 : Math.SQRT1_2) / 2 * Math.cos((2 * x + 1) * u * Math.PI / 16);
+}
+
+const isSof = m => m >= 0xc0 && m <= 0xcf && m !== 0xc4 && m !== 0xc8 && m !== 0xcc;
+
+// 依次回调每个带长度的段 (marker, 段内容)，回调返回 false 停止；遇到 SOS 停止 (后面是熵编码数据)
+function forEachSegment(buf, fn) {
+    let pos = 2;
+    while (pos + 4 <= buf.length) {
+        if (buf[pos] !== 0xff) return;
+        const marker = buf[pos + 1];
+        if (marker === 0xff) { pos++; continue; }
+        if (marker === 0xd8 || marker === 0x01 || (marker >= 0xd0 && marker <= 0xd7)) { pos += 2; continue; }
+        if (marker === 0xd9 || marker === 0xda) return;
+        const len = buf.readUInt16BE(pos + 2);
+        if (fn(marker, buf.subarray(pos + 4, pos + 2 + len)) === false) return;
+        pos += 2 + len;
+    }
+}
+
+// APP1 里 EXIF 的方向标记 (0x0112)；没有就返回 0
+function exifOrientation(seg) {
+    if (seg.length < 14 || seg.toString('latin1', 0, 6) !== 'Exif\0\0') return 0;
+    const tiff = seg.subarray(6);
+    const le = tiff.toString('latin1', 0, 2) === 'II';
+    const u16 = i => le ? tiff.readUInt16LE(i) : tiff.readUInt16BE(i);
+    const u32 = i => le ? tiff.readUInt32LE(i) : tiff.readUInt32BE(i);
+    const ifd = u32(4);
+    if (ifd + 2 > tiff.length) return 0;
+    const count = u16(ifd);
+    for (let i = 0; i < count; i++) {
+        const entry = ifd + 2 + i * 12;
+        if (entry + 12 > tiff.length) return 0;
+        if (u16(entry) === 0x0112) {
+            const v = u16(entry + 8);
+            return v >= 1 && v <= 8 ? v : 0;
+        }
+    }
+    return 0;
+}
+
+function buildHuffman(counts, values) {
+    const maxcode = new Int32Array(17).fill(-1);
+    const mincode = new Int32Array(17);
+    const valptr = new Int32Array(17);
+    let code = 0, k = 0;
+    for (let len = 1; len <= 16; len++) {
+        valptr[len] = k;
+        mincode[len] = code;
+        code += counts[len - 1];
+        k += counts[len - 1];
+        if (counts[len - 1]) maxcode[len] = code - 1;
+        code <<= 1;
+    }
+    return { maxcode, mincode, valptr, values };
+}
+
+// minSide：调用方最少要多大的图。原图长边是它的 8 倍以上时只解 DC 系数 (每个 8x8 块的平均值)，
+// 得到 1/8 大小的图，省掉反 DCT 和大部分内存
+function decodeJpeg(buf, minSide = Infinity) {
+    const quant = [];
+    const dcTables = [];
+    const acTables = [];
+    let frame = null;
+    let restart = 0;
+    let adobe = -1;
+    let orientation = 1;
+    let scale = 1;
+
+    let pos = 2;
+    while (pos + 4 <= buf.length) {
+        if (buf[pos] !== 0xff) { pos++; continue; }
+        const marker = buf[pos + 1];
+        if (marker === 0xff) { pos++; continue; }
+        if (marker === 0xd8 || marker === 0x01 || marker === 0x00 || (marker >= 0xd0 && marker <= 0xd7)) { pos += 2; continue; }
+        if (marker === 0xd9) break;
+        const len = buf.readUInt16BE(pos + 2);
+        const seg = buf.subarray(pos + 4, pos + 2 + len);
+        pos += 2 + len;
+
+        if (marker === 0xdb) {
+            for (let p = 0; p < seg.length;) {
+                const wide = seg[p] >> 4;
+                const table = new Int32Array(64);
+                const id = seg[p++] & 15;
+                for (let k = 0; k < 64; k++) {
+                    table[ZIGZAG[k]] = wide ? seg.readUInt16BE(p + 2 * k) : seg[p + k];
+                }
+                p += wide ? 128 : 64;
+                quant[id] = table;
+            }
+        } else if (marker === 0xc4) {
+            for (let p = 0; p < seg.length;) {
+                const cls = seg[p] >> 4;
+                const id = seg[p] & 15;
+                const counts = seg.subarray(p + 1, p + 17);
+                const total = counts.reduce((a, b) => a + b, 0);
+                const table = buildHuffman(counts, seg.subarray(p + 17, p + 17 + total));
+                (cls ? acTables : dcTables)[id] = table;
+                p += 17 + total;
+            }
+        } else if (marker === 0xdd) {
+            restart = seg.readUInt16BE(0);
+        } else if (marker === 0xe1) {
+            orientation = exifOrientation(seg) || orientation;
+        } else if (marker === 0xee && seg.toString('latin1', 0, 5) === 'Adobe') {
+            adobe = seg[11];
+        } else if (isSof(marker)) {
+            if (marker !== 0xc0 && marker !== 0xc1 && marker !== 0xc2) throw new Error('jpeg: unsupported coding');
+            frame = setupFrame(seg, marker === 0xc2);
+            if (Math.max(frame.width, frame.height) >= minSide * 8) scale = 8;
+        } else if (marker === 0xda) {
+            if (!frame) throw new Error('jpeg: scan before frame');
+            pos = decodeScan(buf, pos, frame, seg, dcTables, acTables, restart);
+        }
+    }
+    if (!frame) throw new Error('jpeg: no frame');
+
+    const planes = frame.components.map(c => {
+        const table = quant[c.tq];
+        if (!table) throw new Error('jpeg: missing quantization table');
+        return scale === 8 ? dcPlane(c, table) : idctPlane(c, table);
+    });
+    const img = toRgba(frame, planes, scale, adobe);
+    return orientation > 1 ? orient(img, orientation) : img;
+}
+
+function setupFrame(seg, progressive) {
+    if (seg[0] !== 8) throw new Error('jpeg: unsupported precision');
+    const height = seg.readUInt16BE(1);
+    const width = seg.readUInt16BE(3);
+    checkSize(width, height);
+    const components = [];
+    for (let i = 0; i < seg[5]; i++) {
+        const p = 6 + i * 3;
+        components.push({ id: seg[p], h: seg[p + 1] >> 4 || 1, v: seg[p + 1] & 15 || 1, tq: seg[p + 2] });
+    }
+    const hmax = Math.max(...components.map(c => c.h));
+    const vmax = Math.max(...components.map(c => c.v));
+    const mcusX = Math.ceil(width / (8 * hmax));
+    const mcusY = Math.ceil(height / (8 * vmax));
+    for (const c of components) {
+        c.blocksX = Math.ceil(Math.ceil(width * c.h / hmax) / 8);
+        c.blocksY = Math.ceil(Math.ceil(height * c.v / vmax) / 8);
+        c.stride = mcusX * c.h; // 按 MCU 补齐后的每行块数
+        c.coef = new Int16Array(mcusX * c.h * mcusY * c.v * 64);
+        c.pred = 0;
+    }
+    return { width, height, progressive, components, hmax, vmax, mcusX, mcusY };
+}
+
+// 解一个扫描段，返回扫描数据之后下一个 marker 的位置。数据残缺时停在出错的地方，已经解出来的系数照样用
+function decodeScan(buf, pos, frame, seg, dcTables, acTables, restart) {
+    const n = seg[0];
+    const comps = [];
+    for (let i = 0; i < n; i++) {
+        const c = frame.components.find(fc => fc.id === seg[1 + i * 2]);
+        if (!c) throw new Error('jpeg: unknown component');
+        c.dc = dcTables[seg[2 + i * 2] >> 4];
+        c.ac = acTables[seg[2 + i * 2] & 15];
+        comps.push(c);
+    }
+    const ss = seg[1 + n * 2];
+    const se = seg[2 + n * 2];
+    const ah = seg[3 + n * 2] >> 4;
+    const al = seg[3 + n * 2] & 15;
+
+    let p = pos;
+    let bitBuf = 0, bitCount = 0;
+    const readBit = () => {
+        if (!bitCount) {
+            let b = p < buf.length ? buf[p] : 0;
+            if (b === 0xff) {
+                if (buf[p + 1] === 0) p += 2;
+                else b = 0; // 碰到 marker：按规范之后补 0，不前进
+            } else if (p < buf.length) p++;
+            bitBuf = b;
+            bitCount = 8;
+        }
+        return (bitBuf >> --bitCount) & 1;
+    };
+    const receive = (len) => {
+        let v = 0;
+        while (len--) v = (v << 1) | readBit();
+        return v;
+    };
+    const extend = (v, len) => v < 1 << (len - 1) ? v - (1 << len) + 1 : v;
+    const decode = (table) => {
+        if (!table) throw new Error('jpeg: missing huffman table');
+        let code = 0;
+        for (let len = 1; len <= 16; len++) {
+            code = (code << 1) | readBit();
+            if (code <= table.maxcode[len]) return table.values[table.valptr[len] + code - table.mincode[len]];
+        }
+        throw new Error('jpeg: bad huffman code');
+    };
+
+    let eobrun = 0;
+    const decodeBlock = (c, blk) => {
+        const coef = c.coef;
+        if (!frame.progressive) {
+            const t = decode(c.dc);
+            c.pred += t ? extend(receive(t), t) : 0;
+            coef[blk] = c.pred;
+            for (let k = 1; k < 64;) {
+                const rs = decode(c.ac);
+                const s = rs & 15, r = rs >> 4;
+                if (!s) {
+                    if (r < 15) break;
+                    k += 16;
+                    continue;
+                }
+                k += r;
+                if (k > 63) break;
+                coef[blk + ZIGZAG[k]] = extend(receive(s), s);
+                k++;
+            }
+        } else if (ss === 0) {
+            if (ah === 0) {
+                const t = decode(c.dc);
+                c.pred += t ? extend(receive(t), t) : 0;
+                coef[blk] = c.pred * (1 << al);
+            } else if (readBit()) {
+                coef[blk] |= 1 << al;
+            }
+        } else if (ah === 0) {
+            if (eobrun > 0) { eobrun--; return; }
+            for (let k = ss; k <= se;) {
+                const rs = decode(c.ac);
+                const s = rs & 15, r = rs >> 4;
+                if (!s) {
+                    if (r < 15) {
+                        eobrun = (1 << r) - 1 + (r ? receive(r) : 0);
+                        break;
+                    }
+                    k += 16;
+                    continue;
+                }
+                k += r;
+                if (k > 63) break;
+                coef[blk + ZIGZAG[k]] = extend(receive(s), s) * (1 << al);
+                k++;
+            }
+        } else {
+            // AC 逐次逼近的细化扫描 (和 libjpeg 的 decode_mcu_AC_refine 一致)
+            const p1 = 1 << al, m1 = -1 << al;
+            const refine = (z) => {
+                if (readBit() && (coef[z] & p1) === 0) coef[z] += coef[z] >= 0 ? p1 : m1;
+            };
+            let k = ss;
+            if (eobrun <= 0) {
+                for (; k <= se; k++) {
+                    const rs = decode(c.ac);
+                    let r = rs >> 4;
+                    let s = rs & 15;
+                    if (s) {
+                        s = readBit() ? p1 : m1;
+                    } else if (r !== 15) {
+                        eobrun = 1 << r;
+                        if (r) eobrun += receive(r);
+                        break;
+                    }
+                    do {
+                        const z = blk + ZIGZAG[k];
+                        if (coef[z]) refine(z);
+                        else if (--r < 0) break;
+                        k++;
+                    } while (k <= se);
+                    if (s && k <= se) coef[blk + ZIGZAG[k]] = s;
+                }
+            }
+            if (eobrun > 0) {
+                for (; k <= se; k++) {
+                    const z = blk + ZIGZAG[k];
+                    if (coef[z]) refine(z);
+                }
+                eobrun--;
+            }
+        }
+    };
+
+    // 单分量扫描不按 MCU 交错，按这个分量自己的块逐个走
+    const single = comps.length === 1;
+    const total = single ? comps[0].blocksX * comps[0].blocksY : frame.mcusX * frame.mcusY;
+    const resync = () => {
+        bitCount = 0;
+        while (p + 1 < buf.length && !(buf[p] === 0xff && buf[p + 1] >= 0xd0 && buf[p + 1] <= 0xd7)) p++;
+        p += 2;
+        eobrun = 0;
+        comps.forEach(c => { c.pred = 0; });
+    };
+    comps.forEach(c => { c.pred = 0; });
+
+    try {
+        for (let m = 0; m < total; m++) {
+            if (restart && m && m % restart === 0) resync();
+            if (single) {
+                const c = comps[0];
+                const row = Math.floor(m / c.blocksX);
+                const col = m % c.blocksX;
+                decodeBlock(c, (row * c.stride + col) * 64);
+            } else {
+                const mcuRow = Math.floor(m / frame.mcusX);
+                const mcuCol = m % frame.mcusX;
+                for (const c of comps) {
+                    for (let v = 0; v < c.v; v++) {
+                        for (let h = 0; h < c.h; h++) {
+                            decodeBlock(c, ((mcuRow * c.v + v) * c.stride + mcuCol * c.h + h) * 64);
+                        }
+                    }
+                }
+            }
+        }
+    } catch (err) {
+        // 残缺或损坏的数据：到此为止
+    }
+
+    // 跳到下一个不是 RST 的 marker
+    while (p + 1 < buf.length && !(buf[p] === 0xff && buf[p + 1] !== 0 && !(buf[p + 1] >= 0xd0 && buf[p + 1] <= 0xd7))) p++;
+    return p;
+}
+
+// 1/8 解码：每个块只取 DC，换算成块内平均值
+function dcPlane(c, table) {
+    const width = c.stride;
+    const height = c.coef.length / 64 / width;
+    const out = new Uint8ClampedArray(width * height);
+    for (let i = 0; i < out.length; i++) out[i] = Math.round(c.coef[i * 64] * table[0] / 8 + 128);
+    return { width, height, data: out };
+}
+
+function idctPlane(c, table) {
+    const bw = c.stride;
+    const bh = c.coef.length / 64 / bw;
+    const width = bw * 8;
+    const out = new Uint8ClampedArray(width * bh * 8);
+    const block = new Float64Array(64);
+    const tmp = new Float64Array(64);
+    for (let by = 0; by < bh; by++) {
+        for (let bx = 0; bx < bw; bx++) {
+            const base = (by * bw + bx) * 64;
+            let flat = true;
+            for (let i = 0; i < 64; i++) {
+                block[i] = c.coef[base + i] * table[i];
+                if (i && block[i]) flat = false;
+            }
+            const o = by * 8 * width + bx * 8;
+            if (flat) { // 只有 DC 的块 (很常见)：整块一个值
+                const v = block[0] / 8 + 128;
+                for (let y = 0; y < 8; y++) out.fill(Math.round(v), o + y * width, o + y * width + 8);
+                continue;
+            }
+            // 先对每行做一维逆变换，再对每列
+            for (let v = 0; v < 8; v++) {
+                for (let x = 0; x < 8; x++) {
+                    let s = 0;
+                    for (let u = 0; u < 8; u++) s += COS[u * 8 + x] * block[v * 8 + u];
+                    tmp[v * 8 + x] = s;
+                }
+            }
+            for (let x = 0; x < 8; x++) {
+                for (let y = 0; y < 8; y++) {
+                    let s = 0;
+                    for (let v = 0; v < 8; v++) s += COS[v * 8 + y] * tmp[v * 8 + x];
+                    out[o + y * width + x] = Math.round(s + 128);
+                }
+            }
+        }
+    }
+    return { width, height: bh * 8, data: out };
+}
+
+// 分量平面 (可能有色度下采样) -> RGBA，色度按最近邻放大
+function toRgba(frame, planes, scale, adobe) {
+    const width = Math.ceil(frame.width / scale);
+    const height = Math.ceil(frame.height / scale);
+    const out = new Uint8Array(width * height * 4);
+    const n = planes.length;
+    const ids = frame.components.map(c => c.id);
+    // 三分量默认是 YCbCr；Adobe 标记 transform=0 或分量 id 是 'R','G','B' 时是 RGB
+    const rgb = n === 3 && (adobe === 0 || String.fromCharCode(...ids) === 'RGB');
+    const xs = frame.components.map((c, i) => Array.from({ length: width }, (_, x) => Math.min(planes[i].width - 1, Math.floor(x * c.h / frame.hmax))));
+    const ys = frame.components.map((c, i) => y => Math.min(planes[i].height - 1, Math.floor(y * c.v / frame.vmax)));
+    const px = new Float64Array(4);
+
+    for (let y = 0; y < height; y++) {
+        const rows = planes.map((pl, i) => ys[i](y) * pl.width);
+        for (let x = 0; x < width; x++) {
+            for (let i = 0; i < n; i++) px[i] = planes[i].data[rows[i] + xs[i][x]];
+            let r, g, b;
+            if (n === 1) {
+                r = g = b = px[0];
+            } else if (rgb) {
+                [r, g, b] = px;
+            } else {
+                [r, g, b] = ycc(px[0], px[1], px[2]);
+            }
+            if (n === 4) {
+                // CMYK / YCCK：Adobe 存的是反相值，k 也一样
+                if (adobe !== 2) [r, g, b] = [px[0], px[1], px[2]];
+                const k = px[3] / 255;
+                r *= k;
+                g *= k;
+                b *= k;
+            }
+            const o = (y * width + x) * 4;
+            out[o] = clamp(r);
+            out[o + 1] = clamp(g);
+            out[o + 2] = clamp(b);
+            out[o + 3] = 255;
+        }
+    }
+    return { width, height, data: out };
+}
+
+function ycc(y, cb, cr) {
+    return [y + 1.402 * (cr - 128), y - 0.344136 * (cb - 128) - 0.714136 * (cr - 128), y + 1.772 * (cb - 128)];
+}
+
+const clamp = v => v < 0 ? 0 : v > 255 ? 255 : Math.round(v);
+
+// EXIF 方向：把存储的像素转成显示方向
+function orient(img, orientation) {
+    const { width: w, height: h, data } = img;
+    const swap = orientation >= 5;
+    const ow = swap ? h : w;
+    const oh = swap ? w : h;
+    const out = new Uint8Array(data.length);
+    for (let y = 0; y < oh; y++) {
+        for (let x = 0; x < ow; x++) {
+            let sx, sy;
+            switch (orientation) {
+                case 2: sx = w - 1 - x; sy = y; break;
+                case 3: sx = w - 1 - x; sy = h - 1 - y; break;
+                case 4: sx = x; sy = h - 1 - y; break;
+                case 5: sx = y; sy = x; break;
+                case 6: sx = y; sy = h - 1 - x; break;
+                case 7: sx = w - 1 - y; sy = h - 1 - x; break;
+                case 8: sx = w - 1 - y; sy = x; break;
+                default: sx = x; sy = y;
+            }
+            const s = (sy * w + sx) * 4;
+            const o = (y * ow + x) * 4;
+            out[o] = data[s];
+            out[o + 1] = data[s + 1];
+            out[o + 2] = data[s + 2];
+            out[o + 3] = data[s + 3];
+        }
+    }
+    return { width: ow, height: oh, data: out };
+}
+
+function checkSize(width, height) {
+    if (!(width > 0 && height > 0) || width * height > MAX_PIXELS) throw new Error(`image too large or empty: ${width}x${height}`);
+}
+
+// 解码，返回 RGBA 图像；WebP/AVIF 等解不了的格式返回 null，坏文件抛错
+// minSide 是调用方需要的最小边长 (JPEG 可以据此只解 1/8)，要原尺寸就不传
+function decode(buf, minSide) {
+    if (buf.length < 24) return null;
+    if (buf[0] === 0x89 && buf.toString('latin1', 1, 4) === 'PNG') return decodePng(buf);
+    if (buf.toString('latin1', 0, 4) === 'GIF8') return decodeGif(buf);
+    if (buf.toString('latin1', 0, 2) === 'BM') return decodeBmp(buf);
+    if (buf[0] === 0xff && buf[1] === 0xd8) return decodeJpeg(buf, minSide);
+    return null;
+}
+
+// --- 缩放 ---
+// 等比缩到长边不超过 maxSide (本来就小的不放大)；区域平均，按 alpha 加权，透明像素的颜色不会渗进来
+function scale(img, maxSide) {
+    const k = Math.min(1, maxSide / Math.max(img.width, img.height));
+    const width = Math.max(1, Math.round(img.width * k));
+    const height = Math.max(1, Math.round(img.height * k));
+    if (width === img.width && height === img.height) return img;
+
+    const src = img.data;
+    const sw = img.width;
+    const out = new Uint8Array(width * height * 4);
+    const xBounds = Array.from({ length: width + 1 }, (_, x) => Math.floor(x * sw / width));
+    for (let y = 0; y < height; y++) {
+        const y0 = Math.floor(y * img.height / height);
+        const y1 = Math.max(y0 + 1, Math.floor((y + 1) * img.height / height));
+        for (let x = 0; x < width; x++) {
+            const x0 = xBounds[x];
+            const x1 = Math.max(x0 + 1, xBounds[x + 1]);
+            let r = 0, g = 0, b = 0, a = 0;
+            for (let sy = y0; sy < y1; sy++) {
+                for (let sx = x0, s = (sy * sw + x0) * 4; sx < x1; sx++, s += 4) {
+                    const alpha = src[s + 3];
+                    r += src[s] * alpha;
+                    g += src[s + 1] * alpha;
+                    b += src[s + 2] * alpha;
+                    a += alpha;
+                }
+            }
+            const o = (y * width + x) * 4;
+            if (a) {
+                out[o] = Math.round(r / a);
+                out[o + 1] = Math.round(g / a);
+                out[o + 2] = Math.round(b / a);
+                out[o + 3] = Math.round(a / ((y1 - y0) * (x1 - x0)));
+            }
+        }
+    }
+    return { width, height, data: out };
+}
+
+function hasAlpha(img) {
+    for (let i = 3; i < img.data.length; i += 4) {
+        if (img.data[i] < 255) return true;
+    }
+    return false;
+}
+
+// --- JPEG 编码 (baseline，4:2:0，标准量化表和 Huffman 表) ---
+// ITU T.81 附录 K 的示例表：量化表按自然顺序；Huffman 表是 [各长度的码字个数, 符号]
+const LUMA_QUANT = [
+    16, 11, 10, 16, 24, 40, 51, 61, 12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56, 14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77, 24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101, 72, 92, 95, 98, 112, 100, 103, 99
+];
+const CHROMA_QUANT = [
+    17, 18, 24, 47, 99, 99, 99, 99, 18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99, 47, 66, 99, 99, 99, 99, 99, 99,
+    ...new Array(32).fill(99)
+];
+const HUFFMAN_SPECS = [
+    ['00010501010101010100000000000000', '000102030405060708090a0b'],
+    ['0002010303020403050504040000017d', '01020300041105122131410613516107227114328191a1082342b1c11552d1f02433627282090a161718191a25262728292a3435363738393a434445464748494a535455565758595a636465666768696a737475767778797a838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9fa'],
+    ['00030101010101010101010000000000', '000102030405060708090a0b'],
+    ['00020102040403040705040400010277', '000102031104052131061241510761711322328108144291a1b1c109233352f0156272d10a162434e125f11718191a262728292a35363738393a434445464748494a535455565758595a636465666768696a737475767778797a82838485868788898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae2e3e4e5e6e7e8e9eaf2f3f4f5f6f7f8f9fa']
+].map(([bits, values]) => ({ bits: Buffer.from(bits, 'hex'), values: Buffer.from(values, 'hex') }));
+
+// 符号 -> [码字, 码长]
+function huffmanCodes({ bits, values }) {
+    const codes = [];
+    let code = 0, k = 0;
+    for (let len = 1; len <= 16; len++) {
+        for (let i = 0; i < bits[len - 1]; i++) codes[values[k++]] = [code++, len];
+        code <<= 1;
+    }
+    return codes;
+}
+const [DC_LUMA, AC_LUMA, DC_CHROMA, AC_CHROMA] = HUFFMAN_SPECS.map(huffmanCodes);
+
+function scaledQuant(base, quality) {
+    const factor = quality < 50 ? 5000 / quality : 200 - quality * 2;
+    return base.map(q => Math.min(255, Math.max(1, Math.floor((q * factor + 50) / 100))));
+}
+
+// 透明像素按白底合成 (调用方一般会给有透明的图改用 PNG)
+function encodeJpeg(img, quality = 75) {
+    const { width, height, data } = img;
+    const lq = scaledQuant(LUMA_QUANT, quality);
+    const cq = scaledQuant(CHROMA_QUANT, quality);
+
+    const parts = [];
+    const segment = (marker, body) => {
+        const head = Buffer.alloc(4);
+        head.writeUInt16BE(0xff00 | marker, 0);
+        head.writeUInt16BE(body.length + 2, 2);
+        parts.push(head, body);
+    };
+    parts.push(Buffer.from([0xff, 0xd8]));
+    segment(0xe0, Buffer.from([0x4a, 0x46, 0x49, 0x46, 0, 1, 1, 0, 0, 1, 0, 1, 0, 0])); // JFIF 1.01，无缩略图
+    segment(0xdb, Buffer.from([0, ...ZIGZAG.map(z => lq[z]), 1, ...ZIGZAG.map(z => cq[z])]));
+    const sof = Buffer.from([8, 0, 0, 0, 0, 3, 1, 0x22, 0, 2, 0x11, 1, 3, 0x11, 1]);
+    sof.writeUInt16BE(height, 1);
+    sof.writeUInt16BE(width, 3);
+    segment(0xc0, sof);
+    segment(0xc4, Buffer.concat(HUFFMAN_SPECS.map((spec, i) => Buffer.concat([Buffer.from([[0x00, 0x10, 0x01, 0x11][i]]), spec.bits, spec.values]))));
+    segment(0xda, Buffer.from([3, 1, 0x00, 2, 0x11, 3, 0x11, 0, 63, 0]));
+
+    // 熵编码输出，0xff 后面补 0x00
+    const bytes = [];
+    let acc = 0, accBits = 0;
+    const put = (code, len) => {
+        acc = (acc << len) | code;
+        accBits += len;
+        while (accBits >= 8) {
+            const b = (acc >> (accBits - 8)) & 0xff;
+            bytes.push(b);
+            if (b === 0xff) bytes.push(0);
+            accBits -= 8;
+        }
+        acc &= (1 << accBits) - 1;
+    };
+
+    const block = new Float64Array(64);
+    const tmp = new Float64Array(64);
+    const preds = [0, 0, 0];
+    const encodeBlock = (comp, quantTable, dcCodes, acCodes) => {
+        // 二维 DCT：先行后列
+        for (let y = 0; y < 8; y++) {
+            for (let u = 0; u < 8; u++) {
+                let s = 0;
+                for (let x = 0; x < 8; x++) s += COS[u * 8 + x] * block[y * 8 + x];
+                tmp[y * 8 + u] = s;
+            }
+        }
+        const q = new Int32Array(64);
+        for (let u = 0; u < 8; u++) {
+            for (let v = 0; v < 8; v++) {
+                let s = 0;
+                for (let y = 0; y < 8; y++) s += COS[v * 8 + y] * tmp[y * 8 + u];
+                q[v * 8 + u] = Math.round(s / quantTable[v * 8 + u]);
+            }
+        }
+        const diff = q[0] - preds[comp];
+        preds[comp] = q[0];
+        const dcSize = bitLength(diff);
+        put(...dcCodes[dcSize]);
+        if (dcSize) put(diff < 0 ? diff + (1 << dcSize) - 1 : diff, dcSize);
+
+        let run = 0;
+        for (let k = 1; k < 64; k++) {
+            const v = q[ZIGZAG[k]];
+            if (!v) { run++; continue; }
+            while (run > 15) { put(...acCodes[0xf0]); run -= 16; }
+            const size = bitLength(v);
+            put(...acCodes[(run << 4) | size]);
+            put(v < 0 ? v + (1 << size) - 1 : v, size);
+            run = 0;
+        }
+        if (run) put(...acCodes[0x00]);
+    };
+
+    const ycbcr = (x, y) => {
+        const o = (Math.min(y, height - 1) * width + Math.min(x, width - 1)) * 4;
+        const a = data[o + 3] / 255;
+        const r = data[o] * a + 255 * (1 - a);
+        const g = data[o + 1] * a + 255 * (1 - a);
+        const b = data[o + 2] * a + 255 * (1 - a);
+        return [
+            0.299 * r + 0.587 * g + 0.114 * b,
+            -0.168736 * r - 0.331264 * g + 0.5 * b + 128,
+            0.5 * r - 0.418688 * g - 0.081312 * b + 128
+        ];
+    };
+
+    const mcu = new Float64Array(16 * 16 * 3);
+    for (let my = 0; my < height; my += 16) {
+        for (let mx = 0; mx < width; mx += 16) {
+            for (let y = 0; y < 16; y++) {
+                for (let x = 0; x < 16; x++) mcu.set(ycbcr(mx + x, my + y), (y * 16 + x) * 3);
+            }
+            for (let by = 0; by < 2; by++) {
+                for (let bx = 0; bx < 2; bx++) {
+                    for (let i = 0; i < 64; i++) block[i] = mcu[((by * 8 + (i >> 3)) * 16 + bx * 8 + (i & 7)) * 3] - 128;
+                    encodeBlock(0, lq, DC_LUMA, AC_LUMA);
+                }
+            }
+            // 色度：2x2 像素取平均
+            for (let c = 1; c <= 2; c++) {
+                for (let i = 0; i < 64; i++) {
+                    const o = ((i >> 3) * 2 * 16 + (i & 7) * 2) * 3 + c;
+                    block[i] = (mcu[o] + mcu[o + 3] + mcu[o + 48] + mcu[o + 51]) / 4 - 128;
+                }
+                encodeBlock(c, cq, DC_CHROMA, AC_CHROMA);
+            }
+        }
+    }
+    if (accBits) put((1 << (8 - accBits)) - 1, 8 - accBits); // 最后不满一字节用 1 补齐
+    parts.push(Buffer.from(bytes), Buffer.from([0xff, 0xd9]));
+    return Buffer.concat(parts);
+}
+
+function bitLength(v) {
+    let n = 0;
+    for (v = Math.abs(v); v; v >>= 1) n++;
+    return n;
+}
+
+// --- PNG 编码 (8 位 RGB 或 RGBA，每行挑压缩效果最好的过滤方式) ---
+const CRC_TABLE = new Int32Array(256).map((_, n) => {
+    let c = n;
+    for (let k = 0; k < 8; k++) c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    return c;
+});
+
+function crc32(buf) {
+    let c = -1;
+    for (let i = 0; i < buf.length; i++) c = CRC_TABLE[(c ^ buf[i]) & 0xff] ^ (c >>> 8);
+    return (c ^ -1) >>> 0;
+}
+
+function encodePng(img, alpha = hasAlpha(img)) {
+    const { width, height, data } = img;
+    const channels = alpha ? 4 : 3;
+    const rowBytes = width * channels;
+    const raw = Buffer.alloc((rowBytes + 1) * height);
+    const prev = new Uint8Array(rowBytes);
+    const cur = new Uint8Array(rowBytes);
+    const candidates = Array.from({ length: 5 }, () => new Uint8Array(rowBytes));
+
+    for (let y = 0; y < height; y++) {
+        for (let x = 0; x < width; x++) {
+            for (let c = 0; c < channels; c++) cur[x * channels + c] = data[(y * width + x) * 4 + c];
+        }
+        let best = 0, bestScore = Infinity;
+        for (let f = 0; f < 5; f++) {
+            const out = candidates[f];
+            let score = 0;
+            for (let i = 0; i < rowBytes; i++) {
+                const a = i >= channels ? cur[i - channels] : 0;
+                const b = y ? prev[i] : 0;
+                const c = i >= channels && y ? prev[i - channels] : 0;
+                out[i] = cur[i] - (f === 0 ? 0 : f === 1 ? a : f === 2 ? b : f === 3 ? (a + b) >> 1 : paeth(a, b, c));
+                score += out[i] < 128 ? out[i] : 256 - out[i];
+            }
+            if (score < bestScore) { best = f; bestScore = score; }
+        }
+        raw[y * (rowBytes + 1)] = best;
+        raw.set(candidates[best], y * (rowBytes + 1) + 1);
+        prev.set(cur);
+    }
+
+    const chunk = (type, body) => {
+        const head = Buffer.alloc(8);
+        head.writeUInt32BE(body.length, 0);
+        head.write(type, 4, 'latin1');
+        const crc = Buffer.alloc(4);
+        crc.writeUInt32BE(crc32(Buffer.concat([head.subarray(4), body])), 0);
+        return Buffer.concat([head, body, crc]);
+    };
+    const ihdr = Buffer.alloc(13);
+    ihdr.writeUInt32BE(width, 0);
+    ihdr.writeUInt32BE(height, 4);
+    ihdr[8] = 8;
+    ihdr[9] = alpha ? 6 : 2;
+    return Buffer.concat([
+        Buffer.from([0x89, 0x50, 0x4e, 0x47, 0x0d, 0x0a, 0x1a, 0x0a]),
+        chunk('IHDR', ihdr),
+        chunk('IDAT', zlib.deflateSync(raw, { level: 9 })),
+        chunk('IEND', Buffer.alloc(0))
+    ]);
+}
+
+module.exports = { MAX_PIXELS, dimensions, decode, scale, hasAlpha, encodeJpeg, encodePng };
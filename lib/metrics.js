@@ -0,0 +1,103 @@
+// 极简的 Prometheus 指标：计数器、仪表、直方图，/metrics 输出文本格式
+const metrics = [];
+
+function labelStr(labels) {
+    const keys = Object.keys(labels);
+    if (!keys.length) return '';
+    return '{' + keys.map(k => `${k}="${String(labels[k]).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n')}"`).join(',') + '}';
+}
+
+class Counter {
+    constructor(name, help) {
+        this.name = name;
+        this.help = help;
+        this.values = new Map(); // 标签串 -> 值
+    }
+
+    inc(labels = {}, n = 1) {
+        const key = labelStr(labels);
+        this.values.set(key, (this.values.get(key) || 0) + n);
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} counter`];
+        for (const [key, v] of this.values) lines.push(`${this.name}${key} ${v}`);
+        return lines.join('\n');
+    }
+}
+
+// 值在抓取时由 collect() 现算，返回数字或 [[labels, value], ...]
+class Gauge {
+    constructor(name, help, collect) {
+        this.name = name;
+        this.help = help;
+        this.collect = collect;
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} gauge`];
+        const v = this.collect();
+        if (Array.isArray(v)) v.forEach(([labels, value]) => lines.push(`${this.name}${labelStr(labels)} ${value}`));
+        else lines.push(`${this.name} ${v}`);
+        return lines.join('\n');
+    }
+}
+
+class Histogram {
+    constructor(name, help, buckets) {
+        this.name = name;
+        this.help = help;
+        this.buckets = buckets;
+        this.series = new Map(); // 标签串 -> { labels, counts, sum, count }
+    }
+
+    observe(labels, value) {
+        const key = labelStr(labels);
+        let s = this.series.get(key);
+        if (!s) {
+            s = { labels, counts: new Array(this.buckets.length).fill(0), sum: 0, count: 0 };
+            this.series.set(key, s);
+        }
+        for (let i = 0; i < this.buckets.length; i++) if (value <= this.buckets[i]) s.counts[i]++;
+        s.sum += value;
+        s.count++;
+    }
+
+    // 计时辅助：返回一个结束函数，调用时记录经过的秒数
+    startTimer(labels = {}) {
+        const start = process.hrtime.bigint();
+        return () => this.observe(labels, Number(process.hrtime.bigint() - start) / 1e9);
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+        for (const s of this.series.values()) {
+            this.buckets.forEach((le, i) => lines.push(`${this.name}_bucket${labelStr({ ...s.labels, le })} ${s.counts[i]}`));
+            lines.push(`${this.name}_bucket${labelStr({ ...s.labels, le: '+Inf' })} ${s.count}`);
+            lines.push(`${this.name}_sum${labelStr(s.labels)} ${s.sum}`);
+            lines.push(`${this.name}_count${labelStr(s.labels)} ${s.count}`);
+        }
+        return lines.join('\n');
+    }
+}
+
+const LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5];
+
+function counter(name, help) { const m = new Counter(name, help); metrics.push(m); return m; }
+function gauge(name, help, collect) { const m = new Gauge(name, help, collect); metrics.push(m); return m; }
+function histogram(name, help, buckets = LATENCY_BUCKETS) { const m = new Histogram(name, help, buckets); metrics.push(m); return m; }
+
+function render() {
+    return metrics.map(m => m.render()).join('\n') + '\n';
+}
+
+// GET /metrics
+function serve(req, res) {
+    res.set('Content-Type', 'text/plain; version=0.0.4; charset=utf-8');
+    res.send(render());
+}
+
+// 所有模块共用的数据库耗时直方图
+const dbQuerySeconds = histogram('chat_db_query_duration_seconds', 'SQLite query latency by query name');
+
+module.exports = { counter, gauge, histogram, render, serve, dbQuerySeconds, LATENCY_BUCKETS };
@@ -0,0 +1,18 @@
+const path = require('path');
+const WorkerPool = require('./worker-pool');
+
+const pool = new WorkerPool(path.join(__dirname, 'hash-worker.js'), {
+    size: parseInt(process.env.HASH_THREADS, 10) || undefined,
+    maxQueue: parseInt(process.env.HASH_QUEUE_MAX, 10) || 200
+});
+
+// 都返回 Promise；排队满时 reject 的错误带 code === 'EBUSY'
+function hash(password) {
+    return pool.run({ op: 'hash', password: String(password) });
+}
+
+function compare(password, hash) {
+    return pool.run({ op: 'compare', password: String(password), hash: String(hash) });
+}
+
+module.exports = { hash, compare, pool };
@@ -0,0 +1,73 @@
+const EventEmitter = require('events');
+
+// 在线状态：记录 socket -> 用户名，对外只发增量 (join/leave)
+// 同一个时间窗口内的变化会合并成一批，每批带一个递增的 seq，客户端发现断号时再拉全量
+// 'delta' 事件的内容是 { seq, ops } 增量，或者变化太多时的 { seq, users } 全量快照
+class Presence extends EventEmitter {
+    constructor(opts = {}) {
+        super();
+        this.batchMs = opts.batchMs || 50;
+        this.snapshotOver = opts.snapshotOver || 50; // 一批超过这么多条变化就改发全量快照
+        this.sockets = new Map(); // socketId -> username
+        this.counts = new Map();  // username -> 在线连接数 (同一个人可能开多个标签页)
+        this.seq = 0;
+        this.dirty = new Map();   // username -> 本窗口开始时是否在线
+        this.timer = null;
+    }
+
+    add(socketId, name) {
+        if (this.sockets.has(socketId)) this.remove(socketId);
+        this.touch(name);
+        this.sockets.set(socketId, name);
+        this.counts.set(name, (this.counts.get(name) || 0) + 1);
+    }
+
+    // 返回该 socket 对应的用户名 (没登录过返回 undefined)
+    remove(socketId) {
+        const name = this.sockets.get(socketId);
+        if (name === undefined) return undefined;
+        this.touch(name);
+        this.sockets.delete(socketId);
+        const n = this.counts.get(name) - 1;
+        if (n > 0) this.counts.set(name, n);
+        else this.counts.delete(name);
+        return name;
+    }
+
+    nameOf(socketId) {
+        return this.sockets.get(socketId);
+    }
+
+    get size() {
+        return this.sockets.size;
+    }
+
+    snapshot(cb) {
+        const snap = { seq: this.seq, users: [...this.counts.keys()] };
+        if (cb) cb(snap);
+        return snap;
+    }
+
+    touch(name) {
+        if (!this.dirty.has(name)) this.dirty.set(name, this.counts.has(name));
+        if (!this.timer) this.timer = setTimeout(() => this.flush(), this.batchMs);
+    }
+
+    flush() {
+        this.timer = null;
+        const ops = [];
+        for (const [name, wasOnline] of this.dirty) {
+            const online = this.counts.has(name);
+            // 窗口内上线又下线 (或反过来) 的直接抵消掉
+            if (online !== wasOnline) ops.push([online ? 'join' : 'leave', name]);
+        }
+        this.dirty.clear();
+        if (!ops.length) return;
+        this.seq++;
+        // 变化比在线人数的一半还多 (重启后大家同时回来)：发全量列表比逐条增量还省，客户端也只用重建一次
+        if (ops.length > Math.max(this.snapshotOver, this.counts.size / 2)) return this.emit('delta', this.snapshot());
+        this.emit('delta', { seq: this.seq, ops });
+    }
+}
+
+module.exports = Presence;
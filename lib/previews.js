@@ -0,0 +1,69 @@
+const path = require('path');
+const WorkerPool = require('./worker-pool');
+const attachments = require('./attachments');
+const store = require('./store');
+const bus = require('./cluster-bus');
+
+// 图片消息的预览 (缩略图、模糊占位图、尺寸) 由服务器在 worker 线程里生成，见 thumb-worker.js
+// 客户端只上传 JPEG/PNG/GIF，服务器都解得了，不收客户端做的缩略图；尺寸一律从原图文件头读
+const BACKFILL_BATCH = 50;
+
+const pool = new WorkerPool(path.join(__dirname, 'thumb-worker.js'), {
+    size: parseInt(process.env.THUMB_THREADS, 10) || 2,
+    maxQueue: parseInt(process.env.THUMB_QUEUE_MAX, 10) || 100
+});
+
+function storeThumb(buf, mime) {
+    return new Promise((resolve, reject) => attachments.store(buf, mime, (err, ref) => err ? reject(err) : resolve(ref)));
+}
+
+// ref 是已经存好的原图 (/attachments/<name>)
+// 返回 Promise<meta | null>，从不 reject：生成不了就是 null，消息照常发，接收方退回显示原图
+async function make(ref) {
+    try {
+        const name = typeof ref === 'string' && ref.startsWith(attachments.URL_PREFIX) ? ref.slice(attachments.URL_PREFIX.length) : null;
+        if (!name) return null;
+        const res = await pool.run({ file: attachments.filePath(name) });
+        if (!res) return null;
+        const meta = { width: res.width, height: res.height };
+        if (res.thumb) meta.thumb = await storeThumb(Buffer.from(res.thumb.buffer, res.thumb.byteOffset, res.thumb.byteLength), res.mime);
+        if (res.blur) meta.blur = res.blur;
+        return meta;
+    } catch (err) {
+        if (err.code !== 'EBUSY') console.error('[previews] 生成预览失败:', err.message);
+        return null;
+    }
+}
+
+// 补生成：预览功能上线前发的图片、migrate.py 从 data: URL 导出的图片、当时生成失败的图片都没有 meta
+// 启动后在后台按 id 顺序过一遍，每补好一条回调 onUpdate(row, meta) (用来更新热缓存)
+// 只跑一遍：补不出来的 (文件不在了、格式不认识) 不反复重试
+async function backfill(onUpdate) {
+    let after = 0;
+    let total = 0;
+    try {
+        for (;;) {
+            const rows = await store.imagesWithoutMeta(after, BACKFILL_BATCH);
+            if (!rows.length) break;
+            for (const row of rows) {
+                after = row.id;
+                const meta = await make(row.content);
+                if (!meta) continue;
+                await store.setMessageMeta(row.id, JSON.stringify(meta));
+                onUpdate(row, meta);
+                total++;
+            }
+        }
+        if (total) console.log(`[previews] 给 ${total} 张老图片补上了预览`);
+    } catch (err) {
+        console.error('[previews] 补生成预览失败:', err.message);
+    }
+}
+
+function start(onUpdate) {
+    // 集群模式下和归档一样，只由主进程指定的那个 worker (CHAT_ARCHIVER=1) 做
+    if (bus.enabled && process.env.CHAT_ARCHIVER !== '1') return;
+    setTimeout(() => backfill(onUpdate), 10 * 1000).unref();
+}
+
+module.exports = { make, start, pool };
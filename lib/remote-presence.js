@@ -0,0 +1,39 @@
+const EventEmitter = require('events');
+const bus = require('./cluster-bus');
+
+// 集群模式下的在线状态：真正的 Presence 在主进程里，这里只记本 worker 的连接并转发变化
+// 接口和 Presence 一致，snapshot 需要走一次 IPC，所以只支持回调
+class RemotePresence extends EventEmitter {
+    constructor() {
+        super();
+        this.sockets = new Map(); // 本 worker 上的 socketId -> username
+        bus.on('presence delta', batch => this.emit('delta', batch));
+    }
+
+    add(socketId, name) {
+        this.sockets.set(socketId, name);
+        bus.send('presence', { op: 'add', socketId, name });
+    }
+
+    remove(socketId) {
+        const name = this.sockets.get(socketId);
+        if (name === undefined) return undefined;
+        this.sockets.delete(socketId);
+        bus.send('presence', { op: 'remove', socketId });
+        return name;
+    }
+
+    nameOf(socketId) {
+        return this.sockets.get(socketId);
+    }
+
+    get size() {
+        return this.sockets.size;
+    }
+
+    snapshot(cb) {
+        bus.request('presence snapshot', null, cb);
+    }
+}
+
+module.exports = RemotePresence;
@@ -0,0 +1,60 @@
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+
+// 会话令牌：登录成功后发给客户端，重连时用 resume 出示
+// 格式 base64url(JSON {u, exp}) + '.' + base64url(HMAC-SHA256)，验证只算一次 HMAC，不查库、不跑 bcrypt
+const TTL = (Number(process.env.SESSION_TTL_DAYS) || 7) * 24 * 3600 * 1000;
+const KEY_FILE = process.env.SESSION_KEY_FILE || path.join(__dirname, '..', 'session.key');
+
+// 密钥：SESSION_SECRET 环境变量 (至少 32 个字符的随机串，比如 openssl rand -hex 32 的输出)
+// 换了密钥所有令牌都会失效、所有客户端要重新登录，所以线上必须配置成固定值：
+// Render 这类平台每次部署都是一块新磁盘，落到本地文件的密钥每次部署都会变，正好触发一次全员重连风暴
+// 所以 NODE_ENV=production 时没配 SESSION_SECRET 直接拒绝启动；本地开发才退回生成 session.key 文件
+function loadSecret() {
+    if (process.env.SESSION_SECRET) return Buffer.from(process.env.SESSION_SECRET);
+    if (process.env.NODE_ENV === 'production') {
+        throw new Error('SESSION_SECRET is required when NODE_ENV=production (tokens signed with a per-disk key are invalidated by every redeploy)');
+    }
+    console.warn(`[session] 没有设置 SESSION_SECRET，令牌密钥存在 ${KEY_FILE}；这个文件丢了 (比如重新部署) 所有人都要重新登录`);
+    try {
+        fs.writeFileSync(KEY_FILE, crypto.randomBytes(32).toString('hex'), { flag: 'wx', mode: 0o600 });
+    } catch (err) {
+        if (err.code !== 'EEXIST') throw err;
+    }
+    return Buffer.from(fs.readFileSync(KEY_FILE, 'utf8').trim(), 'hex');
+}
+
+const secret = loadSecret();
+
+function sign(body) {
+    return crypto.createHmac('sha256', secret).update(body).digest('base64url');
+}
+
+function issue(username) {
+    const body = Buffer.from(JSON.stringify({ u: username, exp: Date.now() + TTL })).toString('base64url');
+    return body + '.' + sign(body);
+}
+
+// 返回用户名；签名不对、格式不对或者过期了都返回 null
+function verify(token) {
+    if (typeof token !== 'string' || token.length > 512) return null;
+    const dot = token.indexOf('.');
+    if (dot <= 0) return null;
+
+    const body = token.slice(0, dot);
+    const mac = Buffer.from(token.slice(dot + 1), 'base64url');
+    const expected = Buffer.from(sign(body), 'base64url');
+    if (mac.length !== expected.length || !crypto.timingSafeEqual(mac, expected)) return null;
+
+    let payload;
+    try {
+        payload = JSON.parse(Buffer.from(body, 'base64url').toString('utf8'));
+    } catch (err) {
+        return null;
+    }
+    if (typeof payload.u !== 'string' || !(payload.exp > Date.now())) return null;
+    return payload.u;
+}
+
+module.exports = { issue, verify };
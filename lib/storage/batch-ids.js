@@ -0,0 +1,22 @@
+// 一批消息 ON CONFLICT DO NOTHING 插入之后，把 RETURNING 回来的 id 分回批里的每一行
+// rows 是插入的行 (按批内顺序)，inserted 是 RETURNING 的 { id, user, cid }，顺序不保证
+// 返回 { results, dups }：results[i] 是 { id, duplicate: false } 或 null；dups 是冲突被跳过的行的下标，要另外查回原来的 id
+// 序列按批内顺序取号，所以新插入的 id 从小到大依次对应批里真正插进去的行：
+// 没有 cid 的一定插进去了；有 cid 的看 RETURNING 里有没有，同一批里重复的只有第一条算
+function claimIds(rows, inserted) {
+    const key = (user, cid) => JSON.stringify([user, cid]); // 用户名和 cid 都可能含任意字符，不能简单拼接
+    const fresh = new Set(inserted.filter(r => r.cid !== null).map(r => key(r.user, r.cid)));
+    const ids = inserted.map(r => r.id).sort((a, b) => a - b);
+
+    const results = new Array(rows.length).fill(null);
+    const dups = [];
+    let next = 0;
+    rows.forEach((r, i) => {
+        if (!r.cid) return (results[i] = { id: ids[next++], duplicate: false });
+        if (fresh.delete(key(r.user, r.cid))) results[i] = { id: ids[next++], duplicate: false };
+        else dups.push(i);
+    });
+    return { results, dups };
+}
+
+module.exports = { claimIds };
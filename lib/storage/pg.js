@@ -0,0 +1,194 @@
+const { Pool, types } = require('pg');
+const WriteQueue = require('../write-queue');
+const metrics = require('../metrics');
+const { snippet } = require('./snippet');
+const { claimIds } = require('./batch-ids');
+
+// PostgreSQL 存储：数据不在实例的本地磁盘上，重启/重新部署不会丢，多个实例可以共用一个库
+// 连接串来自 DATABASE_URL (sslmode 等参数直接写在连接串里)，连接池大小 PG_POOL_MAX
+// 对外接口和 ./sqlite.js 一致，见 ../store.js
+
+// BIGINT / BIGSERIAL 默认按字符串返回；id 和 ts 都在 2^53 以内，直接转成数字，和 SQLite 后端行为一致
+types.setTypeParser(types.builtins.INT8, v => parseInt(v, 10));
+
+const pool = new Pool({
+    connectionString: process.env.DATABASE_URL,
+    max: parseInt(process.env.PG_POOL_MAX, 10) || 10,
+    idleTimeoutMillis: 30000,
+    connectionTimeoutMillis: 5000
+});
+pool.on('error', err => console.error('[db] 空闲连接出错:', err.message));
+
+let trigram = false; // pg_trgm 装上了没有，决定搜索能不能按相似度排序
+
+// "user" 在 PostgreSQL 里是保留字，列名要加引号
+const ready = (async () => {
+    await pool.query("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)");
+    await pool.query(`CREATE TABLE IF NOT EXISTS messages (
+        id BIGSERIAL PRIMARY KEY, "user" TEXT, content TEXT, time TEXT, type TEXT,
+        room TEXT NOT NULL DEFAULT 'lobby', ts BIGINT, meta TEXT, cid TEXT)`);
+    await pool.query("CREATE INDEX IF NOT EXISTS idx_messages_room_id ON messages (room, id)");
+    await pool.query("CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts)");
+    await pool.query(`CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_user_cid ON messages ("user", cid) WHERE cid IS NOT NULL`);
+
+    // 搜索用 trigram 索引加速 ILIKE (中文没有空格，按词切分的 tsvector 不适用)
+    // 托管库上没有建扩展的权限也没关系，只是搜索退回顺序扫描
+    try {
+        await pool.query("CREATE EXTENSION IF NOT EXISTS pg_trgm");
+        trigram = true;
+        await pool.query(`CREATE INDEX IF NOT EXISTS idx_messages_content_trgm ON messages USING gin (content gin_trgm_ops)
+            WHERE COALESCE(type, 'text') = 'text'`);
+    } catch (err) {
+        console.warn('[db] pg_trgm 不可用，搜索不走索引:', err.message);
+    }
+})();
+ready.catch(err => console.error('[db] 初始化失败:', err.message));
+
+// 每个 name 对应一条固定的 SQL：pg 会在每个连接上第一次用到时 prepare，之后直接执行
+async function query(name, text, values) {
+    await ready;
+    const end = metrics.dbQuerySeconds.startTimer({ query: name });
+    try {
+        return (await pool.query({ name, text, values })).rows;
+    } finally {
+        end();
+    }
+}
+
+// --- 用户 ---
+async function findUser(username) {
+    return (await query('user_lookup', "SELECT username, password FROM users WHERE username = $1", [username]))[0];
+}
+
+// 用户名已存在时 reject 的错误带 code = 'EEXIST'
+function createUser(username, hash) {
+    return query('user_insert', "INSERT INTO users (username, password) VALUES ($1, $2)", [username, hash]).catch(err => {
+        if (err.code === '23505') err.code = 'EEXIST'; // unique_violation
+        throw err;
+    });
+}
+
+// --- 消息读取：返回的行都是 { id, user, content, time, type, ts, meta } ---
+const MESSAGE_COLUMNS = 'id, "user", content, time, type, ts, meta';
+
+function latestMessages(room, limit) {
+    return query('history_latest', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE room = $1 ORDER BY id DESC LIMIT $2`, [room, limit]);
+}
+
+function messagesBefore(room, beforeId, limit) {
+    return query('history_before', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE room = $1 AND id < $2 ORDER BY id DESC LIMIT $3`, [room, beforeId, limit]);
+}
+
+function messagesSince(room, sinceId, limit) {
+    return query('history_since', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE room = $1 AND id > $2 ORDER BY id LIMIT $3`, [room, sinceId, limit]);
+}
+
+// 多个实例 (或多个连接) 同时写时，id 是插入时取的号、行是提交时才看得见的：
+// 小号的批可能比大号的批晚提交，客户端按 "id > since_id" 补齐会永远漏掉它 (直播时它照常会广播，漏的只是断线期间的)
+// 所以补齐时再把 since_id 之前一小段重查一遍，客户端按 id 去重；范围按 id 和时间都封顶，走 (room, id) 索引
+const LATE_WINDOW_IDS = 10000;
+const LATE_WINDOW_MS = 10 * 1000;
+
+function lateMessages(room, sinceId) {
+    return query('history_late', `SELECT ${MESSAGE_COLUMNS} FROM messages
+        WHERE room = $1 AND id < $2 AND id > $2 - $3 AND ts >= (SELECT ts FROM messages WHERE id = $2) - $4
+        ORDER BY id`, [room, sinceId, LATE_WINDOW_IDS, LATE_WINDOW_MS]);
+}
+
+// 数组参数让任意个 id 都用同一条预编译语句
+function messagesByIds(ids) {
+    return query('history_backfill', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE id = ANY($1::bigint[])`, [ids]);
+}
+
+// 搜索：所有词都要出现 (ILIKE ALL)；片段在这边截取
+// 有 pg_trgm 时按 similarity 排序 (关键词占整条消息的比例越大越靠前，和 SQLite 的 bm25 一样偏向短消息)，同分的新消息在前
+// 没有 pg_trgm 就只能按时间倒序，结果集合一样，只是排序和 SQLite 后端不同
+async function searchMessages(room, terms, limit, offset) {
+    await ready; // 初始化完才知道有没有 pg_trgm
+    const patterns = terms.map(t => '%' + t.replace(/[\\%_]/g, c => '\\' + c) + '%');
+    const where = `WHERE room = $1 AND COALESCE(type, 'text') = 'text' AND content ILIKE ALL($2::text[])`;
+    const rows = await (trigram
+        ? query('search_ranked', `SELECT id, "user", time, content FROM messages ${where}
+            ORDER BY similarity(content, $5) DESC, id DESC LIMIT $3 OFFSET $4`, [room, patterns, limit, offset, terms.join(' ')])
+        : query('search', `SELECT id, "user", time, content FROM messages ${where}
+            ORDER BY id DESC LIMIT $3 OFFSET $4`, [room, patterns, limit, offset]));
+    return rows.map(r => ({ id: r.id, user: r.user, time: r.time, snippet: snippet(r.content, terms[0]) }));
+}
+
+// --- 写入：一批消息一条语句、一次往返 ---
+// 每列一个数组参数，unnest 展开成多行，语句文本和批大小无关，可以一直复用同一条预编译语句
+// (user, cid) 冲突的行跳过；序列按 ord 顺序取号，所以新插入的行的 id 和它们在批里的顺序一致 (见 ./batch-ids.js)
+const INSERT_BATCH = `INSERT INTO messages ("user", content, time, type, room, ts, meta, cid)
+    SELECT u, c, ti, ty, r, ts, m, cid
+    FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::bigint[], $7::text[], $8::text[])
+        WITH ORDINALITY AS t(u, c, ti, ty, r, ts, m, cid, ord)
+    ORDER BY ord
+    ON CONFLICT DO NOTHING
+    RETURNING id, "user", cid`;
+
+// 回调结果和 rows 一一对应：{ id, duplicate }
+function insertMessages(rows, cb) {
+    const cols = [[], [], [], [], [], [], [], []];
+    rows.forEach(r => {
+        [r.user, r.content, r.time, r.type, r.room, r.ts, r.meta || null, r.cid || null].forEach((v, i) => cols[i].push(v));
+    });
+
+    query('message_batch', INSERT_BATCH, cols).then(async inserted => {
+        const { results, dups } = claimIds(rows, inserted);
+
+        // 重发的消息很少，逐条查回原来的 id
+        await Promise.all(dups.map(async i => {
+            const found = await query('message_by_cid', `SELECT id FROM messages WHERE "user" = $1 AND cid = $2`, [rows[i].user, rows[i].cid]);
+            results[i] = found.length ? { id: found[0].id, duplicate: true } : null;
+        }));
+        return results;
+    }).then(results => cb(null, results), cb); // cb 自己抛的错不能再绕回 cb
+}
+
+// 写到远程数据库的往返比本地 SQLite 慢，批攒得稍微久一点
+const messageQueue = new WriteQueue(insertMessages, {
+    interval: parseInt(process.env.WRITE_FLUSH_MS, 10) || 10,
+    maxBatch: parseInt(process.env.WRITE_BATCH, 10) || 500,
+    maxPending: parseInt(process.env.WRITE_QUEUE_MAX, 10) || 10000
+});
+messageQueue.on('error', err => console.error('[db] 批量写入失败:', err.message));
+
+// --- 归档 ---
+// 没有 ts 的老消息 (从 SQLite 导过来、没补 ts 的) 比所有有 ts 的都旧，先归档它们
+async function expiredMessages(cutoff, limit) {
+    const legacy = await query('archive_select_legacy', `SELECT id, "user", content, time, type, room, ts, meta FROM messages WHERE ts IS NULL ORDER BY id LIMIT $1`, [limit]);
+    if (legacy.length) return legacy;
+    return query('archive_select', `SELECT id, "user", content, time, type, room, ts, meta FROM messages WHERE ts < $1 ORDER BY ts LIMIT $2`, [cutoff, limit]);
+}
+
+async function deleteMessages(ids) {
+    await query('archive_delete', "DELETE FROM messages WHERE id = ANY($1::bigint[])", [ids]);
+}
+
+// 空间回收交给 autovacuum
+function reclaimSpace() {
+    return Promise.resolve();
+}
+
+// --- 图片预览补生成 ---
+function imagesWithoutMeta(afterId, limit) {
+    return query('preview_select', "SELECT id, room, content FROM messages WHERE type = 'image' AND meta IS NULL AND id > $1 ORDER BY id LIMIT $2", [afterId, limit]);
+}
+
+function setMessageMeta(id, meta) {
+    return query('preview_update', "UPDATE messages SET meta = $1 WHERE id = $2 AND meta IS NULL", [meta, id]);
+}
+
+function close(cb) {
+    messageQueue.close(() => pool.end().then(() => cb(), cb));
+}
+
+module.exports = {
+    kind: 'pg',
+    findUser, createUser,
+    latestMessages, messagesBefore, messagesSince, lateMessages, messagesByIds, searchMessages,
+    messageQueue, insertMessages,
+    expiredMessages, deleteMessages, reclaimSpace,
+    imagesWithoutMeta, setMessageMeta,
+    close
+};
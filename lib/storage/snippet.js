@@ -0,0 +1,24 @@
+// 搜索结果里高亮片段的首尾标记 (控制字符，客户端转义后换成 <mark>)
+const HL_START = '\u0002';
+const HL_END = '\u0003';
+
+// 没有全文索引可用时手动截取片段：以第一个词第一次出现的位置为中心，前后各留 12 个字符，所有出现处加高亮
+function snippet(content, term) {
+    const lower = content.toLowerCase();
+    const needle = term.toLowerCase();
+    const i = Math.max(0, lower.indexOf(needle));
+    const from = Math.max(0, i - 12);
+    const to = i + term.length + 12;
+    const text = (from > 0 ? '…' : '') + content.slice(from, to) + (to < content.length ? '…' : '');
+
+    let out = '';
+    let pos = 0;
+    const hay = text.toLowerCase();
+    for (let j = hay.indexOf(needle); j !== -1; j = hay.indexOf(needle, pos)) {
+        out += text.slice(pos, j) + HL_START + text.slice(j, j + term.length) + HL_END;
+        pos = j + term.length;
+    }
+    return out + text.slice(pos);
+}
+
+module.exports = { HL_START, HL_END, snippet };
@@ -0,0 +1,243 @@
+const sqlite3 = require('sqlite3').verbose();
+const WriteQueue = require('../write-queue');
+const metrics = require('../metrics');
+const { snippet } = require('./snippet');
+
+// SQLite 存储：单机部署的默认选择，库文件在本地磁盘上 (DB_FILE，默认 chat.db)
+// 对外接口和 ./pg.js 一致，见 ../store.js
+
+// 初始化数据库
+const db = new sqlite3.Database(process.env.DB_FILE || 'chat.db');
+db.configure('busyTimeout', 5000);
+
+let insertStmt;
+
+db.serialize(() => {
+    // 删除后的空闲页可以用 incremental_vacuum 归还，不用整库 VACUUM (必须在建表和切 WAL 之前)
+    // 新库立即生效；已经有表的老库要整库 VACUUM 一次才会切过去，否则 reclaimSpace() 什么都不做
+    db.run("PRAGMA auto_vacuum = INCREMENTAL");
+    db.get("PRAGMA auto_vacuum", (err, row) => {
+        if (err || !row || row.auto_vacuum === 2) return;
+        // 集群模式下只让归档的那个 worker 做，其它 worker 不去抢写锁
+        if (process.env.CHAT_CLUSTER === '1' && process.env.CHAT_ARCHIVER !== '1') return;
+        console.log('[db] 老库切换到 auto_vacuum=INCREMENTAL，整理一次数据库 (库大的话要一会儿) ...');
+        const start = Date.now();
+        db.run("VACUUM", (err) => {
+            if (err) console.error('[db] VACUUM 失败，下次启动再试 (也可以停服后运行 python migrate.py):', err.message);
+            else console.log(`[db] VACUUM 完成，用时 ${((Date.now() - start) / 1000).toFixed(1)} 秒`);
+        });
+    });
+    // WAL：写不阻塞读；synchronous=NORMAL 在 WAL 下只在检查点时 fsync，掉电最多丢最后几个事务
+    db.run("PRAGMA journal_mode = WAL");
+    db.run("PRAGMA synchronous = NORMAL");
+
+    // 强制 username 为主键 (PRIMARY KEY)，确保唯一性
+    db.run("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)");
+    db.run("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT, content TEXT, time TEXT, type TEXT)");
+
+    // 后来加的列：老库上补一次，已存在就忽略
+    addColumn('messages', "room TEXT NOT NULL DEFAULT 'lobby'");
+    // ts：毫秒时间戳，可以排序和按时间范围查询 (time 只是给人看的 "14:05")
+    addColumn('messages', "ts INTEGER");
+    // meta：图片消息的缩略图引用、模糊占位图和尺寸 (JSON)，文字消息为空
+    addColumn('messages', "meta TEXT");
+    // cid：客户端生成的幂等键，断线重发同一条消息只会存一次
+    addColumn('messages', "cid TEXT");
+    db.run("CREATE INDEX IF NOT EXISTS idx_messages_room_id ON messages (room, id)");
+    db.run("CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts)");
+    db.run("CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_user_cid ON messages (user, cid) WHERE cid IS NOT NULL");
+
+    // 全文检索：外部内容表，只索引文字消息，由触发器和 messages 保持同步
+    // trigram 分词可以匹配中文子串 (中文没有空格，unicode61 会把一整句当成一个词)
+    // 建表、补索引、建触发器在同一个事务里，以插入触发器是否存在为准：有触发器就说明已有的文字消息都补进去了
+    // 没有 (新库、老库第一次升级、上次做到一半) 就清空索引从头补一遍，补完才建触发器，不会漏也不会重复
+    const FTS_READY = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'messages_fts_ai'";
+    db.exec(`BEGIN;
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content = 'messages', content_rowid = 'id', tokenize = 'trigram');
+        INSERT INTO messages_fts (messages_fts) SELECT 'delete-all' WHERE NOT EXISTS (${FTS_READY});
+        INSERT INTO messages_fts (rowid, content) SELECT id, content FROM messages
+            WHERE COALESCE(type, 'text') = 'text' AND NOT EXISTS (${FTS_READY});
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages WHEN COALESCE(new.type, 'text') = 'text' BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages WHEN COALESCE(old.type, 'text') = 'text' BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content, type ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) SELECT 'delete', old.id, old.content WHERE COALESCE(old.type, 'text') = 'text';
+            INSERT INTO messages_fts (rowid, content) SELECT new.id, new.content WHERE COALESCE(new.type, 'text') = 'text';
+        END;
+        COMMIT;`, (err) => {
+        if (!err) return;
+        // 比如 SQLite 太老没有 trigram：整个事务回滚，消息照常收发，只是搜索不可用
+        console.error('[db] 全文索引初始化失败，搜索不可用:', err.message);
+        db.run("ROLLBACK", () => {});
+    });
+
+    // 常驻的预编译语句，每条消息不再 prepare/finalize 一次
+    // (user, cid) 冲突时什么都不做，批量写入后再查回已有的 id
+    insertStmt = db.prepare("INSERT INTO messages (user, content, time, type, room, ts, meta, cid) VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING");
+});
+
+function addColumn(table, def) {
+    db.run(`ALTER TABLE ${table} ADD COLUMN ${def}`, (err) => {
+        if (err && !err.message.includes('duplicate column')) console.error(`[db] 添加列失败 ${table}.${def}:`, err.message);
+    });
+}
+
+// 带耗时统计的查询，返回 Promise；name 是指标里的 query 标签
+function query(name, method, sql, params) {
+    const end = metrics.dbQuerySeconds.startTimer({ query: name });
+    return new Promise((resolve, reject) => {
+        db[method](sql, params, function (err, result) {
+            end();
+            if (err) reject(err);
+            else resolve(method === 'run' ? { lastID: this.lastID, changes: this.changes } : result);
+        });
+    });
+}
+
+const get = (name, sql, params) => query(name, 'get', sql, params);
+const all = (name, sql, params) => query(name, 'all', sql, params);
+const run = (name, sql, params) => query(name, 'run', sql, params);
+
+// --- 用户 ---
+function findUser(username) {
+    return get('user_lookup', "SELECT username, password FROM users WHERE username = ?", [username]);
+}
+
+// 用户名已存在时 reject 的错误带 code = 'EEXIST'
+function createUser(username, hash) {
+    return run('user_insert', "INSERT INTO users (username, password) VALUES (?, ?)", [username, hash]).catch(err => {
+        if (err.code === 'SQLITE_CONSTRAINT') err.code = 'EEXIST';
+        throw err;
+    });
+}
+
+// --- 消息读取：返回的行都是 { id, user, content, time, type, ts, meta } ---
+const MESSAGE_COLUMNS = 'id, user, content, time, type, ts, meta';
+
+// 最新的 limit 条 / id < beforeId 的 limit 条，按 id 倒序；走 (room, id) 索引
+function latestMessages(room, limit) {
+    return all('history', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE room = ? ORDER BY id DESC LIMIT ?`, [room, limit]);
+}
+
+function messagesBefore(room, beforeId, limit) {
+    return all('history', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE room = ? AND id < ? ORDER BY id DESC LIMIT ?`, [room, beforeId, limit]);
+}
+
+// id > sinceId 的 limit 条，按 id 升序 (断线补齐)
+function messagesSince(room, sinceId, limit) {
+    return all('history_since', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE room = ? AND id > ? ORDER BY id LIMIT ?`, [room, sinceId, limit]);
+}
+
+// SQLite 只有一个写连接，id 的顺序就是提交的顺序，不会有晚提交的小号 (见 pg.js)
+function lateMessages() {
+    return Promise.resolve([]);
+}
+
+function messagesByIds(ids) {
+    return all('history_backfill', `SELECT ${MESSAGE_COLUMNS} FROM messages WHERE id IN (${ids.map(() => '?').join(',')})`, ids);
+}
+
+// 全文搜索：trigram 索引只能用 3 个字符以上的词，短词用 LIKE 补充过滤
+// 返回 [{ id, user, time, snippet }]，按相关度排序
+function searchMessages(room, terms, limit, offset) {
+    const long = terms.filter(t => [...t].length >= 3);
+    const short = terms.filter(t => [...t].length < 3);
+    const likes = short.map(t => '%' + t.replace(/[\\%_]/g, c => '\\' + c) + '%');
+    const likeSql = short.map(() => " AND m.content LIKE ? ESCAPE '\\'").join('');
+
+    if (long.length) {
+        const match = long.map(t => '"' + t.replace(/"/g, '""') + '"').join(' AND ');
+        return all('search', `SELECT m.id, m.user, m.time, snippet(messages_fts, 0, char(2), char(3), '…', 24) AS snippet
+            FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ? AND m.room = ?${likeSql}
+            ORDER BY rank LIMIT ? OFFSET ?`, [match, room, ...likes, limit, offset]);
+    }
+
+    // 全是短词：没法走索引，只能从新到旧扫描当前房间，按时间排序
+    return all('search_scan', `SELECT m.id, m.user, m.time, m.content AS snippet FROM messages m
+        WHERE m.room = ? AND COALESCE(m.type, 'text') = 'text'${likeSql}
+        ORDER BY m.id DESC LIMIT ? OFFSET ?`, [room, ...likes, limit, offset]).then(rows => rows.map(r => ({ ...r, snippet: snippet(r.snippet, short[0]) })));
+}
+
+// 一批消息放进同一个事务里：一次 COMMIT，一次落盘
+// 回调结果和 rows 一一对应：{ id, duplicate }，duplicate 表示同一个 cid 之前已经存过
+function insertMessages(rows, cb) {
+    const end = metrics.dbQuerySeconds.startTimer({ query: 'message_batch' });
+    const results = new Array(rows.length).fill(null);
+    const dups = [];
+    db.serialize(() => {
+        db.run("BEGIN");
+        rows.forEach((r, i) => {
+            insertStmt.run(r.user, r.content, r.time, r.type, r.room, r.ts, r.meta || null, r.cid || null, function (err) {
+                if (err) return;
+                if (this.changes) results[i] = { id: this.lastID, duplicate: false };
+                else dups.push(i);
+            });
+        });
+        db.run("COMMIT", (err) => {
+            end();
+            if (err) return db.run("ROLLBACK", () => cb(err));
+            if (!dups.length) return cb(null, results);
+
+            // 重发的消息很少，逐条查回原来的 id 就够了
+            Promise.all(dups.map(i => get('message_by_cid', "SELECT id FROM messages WHERE user = ? AND cid = ?", [rows[i].user, rows[i].cid])
+                .then(row => { results[i] = row ? { id: row.id, duplicate: true } : null; })))
+                .then(() => cb(null, results), cb);
+        });
+    });
+}
+
+const messageQueue = new WriteQueue(insertMessages, {
+    interval: parseInt(process.env.WRITE_FLUSH_MS, 10) || 5,
+    maxBatch: parseInt(process.env.WRITE_BATCH, 10) || 500,
+    maxPending: parseInt(process.env.WRITE_QUEUE_MAX, 10) || 10000
+});
+messageQueue.on('error', err => console.error('[db] 批量写入失败:', err.message));
+
+// --- 归档 ---
+// 没有 ts 的是加 ts 列之前的老消息 (没跑过 migrate.py 补 ts)，比所有有 ts 的都旧，先归档它们
+async function expiredMessages(cutoff, limit) {
+    const legacy = await all('archive_select_legacy', "SELECT id, user, content, time, type, room, ts, meta FROM messages WHERE ts IS NULL ORDER BY id LIMIT ?", [limit]);
+    if (legacy.length) return legacy;
+    return all('archive_select', "SELECT id, user, content, time, type, room, ts, meta FROM messages WHERE ts < ? ORDER BY ts LIMIT ?", [cutoff, limit]);
+}
+
+// 分块删除，单条 SQL 的参数个数有上限
+async function deleteMessages(ids) {
+    for (let i = 0; i < ids.length; i += 500) {
+        const chunk = ids.slice(i, i + 500);
+        await run('archive_delete', `DELETE FROM messages WHERE id IN (${chunk.map(() => '?').join(',')})`, chunk);
+    }
+}
+
+// 归还空闲页 (库在启动时已经切到 auto_vacuum=INCREMENTAL，见上面；VACUUM 失败的话空闲页留着给新数据复用)
+function reclaimSpace() {
+    return run('archive_vacuum', "PRAGMA incremental_vacuum(1000)", []);
+}
+
+// --- 图片预览补生成 ---
+// 还没有 meta 的图片消息，按 id 升序分页
+function imagesWithoutMeta(afterId, limit) {
+    return all('preview_select', "SELECT id, room, content FROM messages WHERE type = 'image' AND meta IS NULL AND id > ? ORDER BY id LIMIT ?", [afterId, limit]);
+}
+
+function setMessageMeta(id, meta) {
+    return run('preview_update', "UPDATE messages SET meta = ? WHERE id = ? AND meta IS NULL", [meta, id]);
+}
+
+function close(cb) {
+    messageQueue.close(() => insertStmt.finalize(() => db.close(cb)));
+}
+
+module.exports = {
+    kind: 'sqlite',
+    findUser, createUser,
+    latestMessages, messagesBefore, messagesSince, lateMessages, messagesByIds, searchMessages,
+    messageQueue, insertMessages,
+    expiredMessages, deleteMessages, reclaimSpace,
+    imagesWithoutMeta, setMessageMeta,
+    close
+};
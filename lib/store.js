@@ -0,0 +1,16 @@
+// 存储后端在启动时选定：STORAGE=sqlite|pg；没指定时有 DATABASE_URL 就用 PostgreSQL，否则用本地 SQLite
+// 两个实现的接口相同：
+//   findUser(username) / createUser(username, hash)     用户名已存在时 reject，err.code = 'EEXIST'
+//   latestMessages(room, limit) / messagesBefore(room, beforeId, limit)   id 倒序
+//   messagesSince(room, sinceId, limit)                  id 升序
+//   lateMessages(room, sinceId)                          sinceId 之前晚提交、补齐时可能漏掉的行，id 升序
+//   messagesByIds(ids) / searchMessages(room, terms, limit, offset)
+//   messageQueue (写后队列) / insertMessages(rows, cb)
+//   expiredMessages(cutoff, limit) / deleteMessages(ids) / reclaimSpace()   归档用
+//   imagesWithoutMeta(afterId, limit) / setMessageMeta(id, meta)          补生成图片预览用
+//   close(cb)
+const backend = process.env.STORAGE || (process.env.DATABASE_URL ? 'pg' : 'sqlite');
+
+if (backend !== 'sqlite' && backend !== 'pg') throw new Error(`unknown STORAGE: ${backend}`);
+
+module.exports = require(`./storage/${backend}`);
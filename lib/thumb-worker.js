@@ -0,0 +1,45 @@
+const fs = require('fs');
+const { parentPort } = require('worker_threads');
+const codec = require('./image-codec');
+
+// 在 worker 线程里给存好的原图生成预览，主线程的事件循环不受影响
+// 输入 { file }：原图路径
+// 输出 { width, height, thumb, mime, blur, animated } 或 null (原图连尺寸都读不出来)
+const THUMB_SIDE = 320;
+const BLUR_SIDE = 16;
+const THUMB_QUALITY = 70;
+
+parentPort.on('message', ({ file }) => {
+    try {
+        parentPort.postMessage({ result: preview(fs.readFileSync(file)) });
+    } catch (err) {
+        parentPort.postMessage({ error: err.message });
+    }
+});
+
+function preview(buf) {
+    const size = codec.dimensions(buf);
+    if (!size) return null;
+    const { width, height } = size;
+
+    let img = null;
+    try {
+        img = codec.decode(buf, THUMB_SIDE);
+    } catch (err) {
+        img = null; // 坏文件、超大图或不支持的变种：当成解不了
+    }
+    // 解不了的 (老客户端传的 WebP/AVIF) 只给尺寸，接收方照常显示原图
+    if (!img) return { width, height };
+
+    const small = codec.scale(img, THUMB_SIDE);
+    const blur = dataUrl(codec.encodePng(codec.scale(small, BLUR_SIDE)));
+    // 动图不做静态缩略图 (会只剩第一帧)，只给尺寸和占位图，接收方照常显示原图
+    if (img.animated) return { width, height, blur, animated: true };
+    const alpha = codec.hasAlpha(small);
+    const thumb = alpha ? codec.encodePng(small, true) : codec.encodeJpeg(small, THUMB_QUALITY);
+    return { width, height, thumb, mime: alpha ? 'image/png' : 'image/jpeg', blur };
+}
+
+function dataUrl(png) {
+    return 'data:image/png;base64,' + png.toString('base64');
+}
@@ -0,0 +1,42 @@
+// 令牌桶：每秒补充 rate 个令牌，最多攒 burst 个；拿不到令牌就说明发得太快了
+class TokenBucket {
+    constructor(rate, burst) {
+        this.rate = rate;
+        this.burst = burst;
+        this.tokens = burst;
+        this.last = Date.now();
+    }
+
+    take(n = 1) {
+        const now = Date.now();
+        this.tokens = Math.min(this.burst, this.tokens + (now - this.last) / 1000 * this.rate);
+        this.last = now;
+        if (this.tokens < n) return false;
+        this.tokens -= n;
+        return true;
+    }
+}
+
+// 按 key (用户名) 分组的令牌桶，长时间不用的自动清掉
+class BucketMap {
+    constructor(rate, burst, idleMs = 10 * 60 * 1000) {
+        this.rate = rate;
+        this.burst = burst;
+        this.buckets = new Map();
+        setInterval(() => {
+            const cutoff = Date.now() - idleMs;
+            for (const [key, b] of this.buckets) if (b.last < cutoff) this.buckets.delete(key);
+        }, idleMs).unref();
+    }
+
+    take(key, n = 1) {
+        let b = this.buckets.get(key);
+        if (!b) {
+            b = new TokenBucket(this.rate, this.burst);
+            this.buckets.set(key, b);
+        }
+        return b.take(n);
+    }
+}
+
+module.exports = { TokenBucket, BucketMap };
@@ -0,0 +1,123 @@
+const fs = require('fs');
+const crypto = require('crypto');
+const cluster = require('cluster');
+const { performance } = require('perf_hooks');
+const session = require('./session');
+
+// 流量录制：设置了 TRACE_FILE 才打开，每个收到的 socket 事件追加一行 JSONL，replay.py 可以按原来的节奏重放
+// 一行: { t: 距录制开始的毫秒数, s: 连接编号, ev: 事件名, ack: 是否带回调, bytes: 负载大小, args: 脱敏后的参数 }
+// 脱敏：密码/令牌不落盘；用户名换成带盐哈希的化名；消息正文、搜索词只留长度；二进制只留字节数
+// 集群模式下每个 worker 写自己的文件 (TRACE_FILE.<worker id>)；TRACE_SALT 固定后化名在各 worker 和多次录制之间一致
+const FILE = process.env.TRACE_FILE;
+const MAX_BUFFER = 8 * 1024 * 1024; // 磁盘跟不上时最多在内存里攒这么多，再多就丢 (录制不能拖慢服务)
+const SALT = process.env.TRACE_SALT || crypto.randomBytes(16).toString('hex');
+
+// 这些字段本身不敏感，原样保留 (房间名、分页参数、图片尺寸等)
+const KEEP = new Set(['room', 'type', 'limit', 'before_id', 'since_id', 'offset', 'size', 'width', 'height']);
+
+let out = null;
+let start = 0;
+let nextSocket = 0;
+let dropped = 0;
+const prefix = cluster.isWorker ? cluster.worker.id + '-' : '';
+
+function open() {
+    const file = cluster.isWorker ? `${FILE}.${cluster.worker.id}` : FILE;
+    out = fs.createWriteStream(file, { flags: 'a' });
+    out.on('error', err => {
+        console.error('[trace] 写入失败，停止录制:', err.message);
+        out = null;
+    });
+    start = performance.now();
+    write({ t: 0, ev: '$start', at: Date.now(), pid: process.pid });
+    console.log(`[trace] 正在录制 socket 事件到 ${file}`);
+}
+
+function write(entry) {
+    if (!out) return;
+    if (out.writableLength > MAX_BUFFER) return dropped++;
+    if (dropped) {
+        out.write(JSON.stringify({ t: entry.t, ev: '$dropped', n: dropped }) + '\n');
+        dropped = 0;
+    }
+    out.write(JSON.stringify(entry) + '\n');
+}
+
+function now() {
+    return Math.round((performance.now() - start) * 10) / 10;
+}
+
+function pseudonym(name) {
+    if (typeof name !== 'string' || !name) return name;
+    return 'u' + crypto.createHmac('sha256', SALT).update(name).digest('hex').slice(0, 10);
+}
+
+// 负载大小按线上的 JSON 长度估算，二进制按字节数
+function sizeOf(value) {
+    if (value === null || value === undefined || typeof value === 'function') return 0;
+    if (Buffer.isBuffer(value) || ArrayBuffer.isView(value)) return value.byteLength;
+    if (value instanceof ArrayBuffer) return value.byteLength;
+    if (typeof value === 'string') return Buffer.byteLength(value) + 2;
+    if (Array.isArray(value)) return value.reduce((n, v) => n + sizeOf(v) + 1, 2);
+    if (typeof value === 'object') return Object.entries(value).reduce((n, [k, v]) => n + k.length + 4 + sizeOf(v), 2);
+    return String(value).length;
+}
+
+// 文字消息：指令保留指令名 (/search、/roll 的分布本身就是负载特征)，其余只留长度
+function redactText(text) {
+    if (text.startsWith('/')) {
+        const cmd = text.split(/\s/, 1)[0].slice(0, 16);
+        return { $cmd: cmd, $len: text.length };
+    }
+    return { $len: text.length };
+}
+
+function redact(event, value, key) {
+    if (value === null || value === undefined || typeof value === 'number' || typeof value === 'boolean') return value;
+    if (Buffer.isBuffer(value) || ArrayBuffer.isView(value) || value instanceof ArrayBuffer) return { $bytes: value.byteLength };
+    if (typeof value === 'string') {
+        if (key === 'password') return '<redacted>';
+        if (key === 'username') return pseudonym(value);
+        if (key === 'msg' || event === 'chat message' && key === undefined) return redactText(value);
+        if (KEEP.has(key)) return value.slice(0, 64);
+        return { $len: value.length };
+    }
+    if (Array.isArray(value)) return value.map(v => redact(event, v));
+    if (typeof value === 'object') {
+        const copy = {};
+        for (const [k, v] of Object.entries(value)) {
+            // 令牌换成它代表的用户的化名，重放时给同一个合成账号发令牌
+            if (k === 'token') copy.user = pseudonym(session.verify(v));
+            else copy[k] = redact(event, v, k);
+        }
+        return copy;
+    }
+    return null;
+}
+
+// 在其它中间件 (限流) 之前挂上，被限流丢掉的事件也会录下来
+function attach(socket) {
+    if (!out) return;
+    const s = prefix + (nextSocket++);
+    write({ t: now(), s, ev: '$connect' });
+
+    socket.use((packet, next) => {
+        const [event, ...args] = packet;
+        const ack = typeof args[args.length - 1] === 'function';
+        if (ack) args.pop();
+        write({ t: now(), s, ev: event, ack, bytes: sizeOf(args), args: args.map(a => redact(event, a)) });
+        next();
+    });
+    socket.on('disconnect', reason => write({ t: now(), s, ev: '$disconnect', reason }));
+}
+
+function close(cb) {
+    if (!out) return cb();
+    const stream = out;
+    out = null;
+    stream.end(cb);
+}
+
+if (FILE) open();
+
+module.exports = { enabled: !!FILE, attach, close };
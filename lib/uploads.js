@@ -0,0 +1,171 @@
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+const { pipeline, finished, Transform } = require('stream');
+const attachments = require('./attachments');
+
+// 分块上传：客户端先通过 socket 拿到上传 id，再用 PUT /uploads/:id?offset=N 一块一块传
+// 状态全部在磁盘上 (<id>.json + <id>.part)，集群里哪个 worker 收到请求都能接着写，断线后 HEAD 查进度续传
+const TMP = path.join(attachments.ROOT, 'tmp');
+const CHUNK_SIZE = 256 * 1024;
+const MAX_SIZE = Number(process.env.UPLOAD_MAX_BYTES) || 20 * 1024 * 1024;
+const TTL = 24 * 3600 * 1000; // 没传完的临时文件保留一天
+const ID_RE = /^[0-9a-f]{32}$/;
+const HASH_RE = /^[0-9a-f]{64}$/;
+
+const metaPath = id => path.join(TMP, id + '.json');
+const partPath = id => path.join(TMP, id + '.part');
+
+function readMeta(id, cb) {
+    if (!ID_RE.test(id)) return cb(null, null);
+    fs.readFile(metaPath(id), 'utf8', (err, text) => {
+        if (err) return cb(err.code === 'ENOENT' ? null : err, null);
+        cb(null, JSON.parse(text));
+    });
+}
+
+function offsetOf(id, cb) {
+    fs.stat(partPath(id), (err, st) => cb(err, st && st.size));
+}
+
+// 登记一次上传，回调返回 id；sha256 是客户端算好的整体哈希 (不支持 WebCrypto 的环境可以不传)
+function create({ user, size, sha256 }, cb) {
+    if (!Number.isInteger(size) || size <= 0) return cb(new Error('invalid size'));
+    if (size > MAX_SIZE) return cb(new Error('too large'));
+    if (sha256 != null && !HASH_RE.test(sha256)) return cb(new Error('invalid hash'));
+
+    const id = crypto.randomBytes(16).toString('hex');
+    fs.mkdir(TMP, { recursive: true }, (err) => {
+        if (err) return cb(err);
+        fs.writeFile(partPath(id), '', { flag: 'wx' }, (err) => {
+            if (err) return cb(err);
+            const meta = { user, size, sha256: sha256 || null, created: Date.now() };
+            fs.writeFile(metaPath(id), JSON.stringify(meta), (err) => cb(err, id));
+        });
+    });
+}
+
+// HEAD /uploads/:id —— 续传前查询服务器已经收到多少字节
+function head(req, res) {
+    readMeta(req.params.id, (err, meta) => {
+        if (err || !meta) return res.sendStatus(err ? 500 : 404);
+        offsetOf(req.params.id, (err, offset) => {
+            if (err) return res.sendStatus(404);
+            res.set({ 'Upload-Offset': offset, 'Upload-Length': meta.size, 'Cache-Control': 'no-store' });
+            res.status(204).end();
+        });
+    });
+}
+
+// PUT /uploads/:id?offset=N —— 请求体直接流进文件，内存占用和文件大小无关
+function put(req, res) {
+    const id = req.params.id;
+    const offset = Number(req.query.offset);
+
+    readMeta(id, (err, meta) => {
+        if (err || !meta) return res.sendStatus(err ? 500 : 404);
+        offsetOf(id, (err, current) => {
+            if (err) return res.sendStatus(404);
+            res.set('Upload-Offset', current);
+            // 偏移对不上 (重复发送或者漏了一块)：告诉客户端正确的位置，让它从那里接着传
+            if (offset !== current) return res.sendStatus(409);
+
+            const declared = Number(req.get('content-length'));
+            const limit = Math.min(CHUNK_SIZE, meta.size - offset);
+            if (declared > limit) return res.sendStatus(413);
+
+            // 从 offset 处覆盖写：同一块被重发两次也只是写入相同的字节
+            // 中途断线的话，已经落盘的部分照样算数，HEAD 会报告新的 offset
+            // 没带 content-length (chunked) 的请求体边收边数，超过 limit 的那一段根本不往文件里写
+            let received = 0;
+            const cap = new Transform({
+                transform(chunk, enc, cb) {
+                    received += chunk.length;
+                    if (received > limit) return cb(Object.assign(new Error('chunk too large'), { code: 'ETOOBIG' }));
+                    cb(null, chunk);
+                }
+            });
+            const out = fs.createWriteStream(partPath(id), { flags: 'r+', start: offset });
+            // req 不放进 pipeline：出错时 pipeline 会销毁 req，连带把连接断掉，413 就发不出去了
+            req.pipe(cap);
+            finished(req, (err) => { if (err) cap.destroy(err); });
+            pipeline(cap, out, (err) => {
+                if (err && err.code === 'ETOOBIG') {
+                    // 超长的块整块作废：前面已经落盘的部分截掉，进度退回这一块开始的地方；剩下的请求体读掉丢弃
+                    req.unpipe(cap);
+                    req.resume();
+                    return fs.truncate(partPath(id), offset, (err) => {
+                        res.set({ 'Upload-Offset': offset, Connection: 'close' });
+                        res.sendStatus(err ? 500 : 413);
+                    });
+                }
+                if (res.headersSent) return;
+                if (err) return res.sendStatus(500);
+                res.set('Upload-Offset', offset + received);
+                res.status(204).end();
+            });
+        });
+    });
+}
+
+function discard(id) {
+    fs.unlink(metaPath(id), () => {});
+    fs.unlink(partPath(id), () => {});
+}
+
+// 全部到齐后校验长度和哈希，再移进附件目录；回调返回附件引用
+function complete(id, user, cb) {
+    readMeta(id, (err, meta) => {
+        if (err) return cb(err);
+        if (!meta || meta.user !== user) return cb(new Error('unknown upload'));
+
+        offsetOf(id, (err, size) => {
+            if (err) return cb(err);
+            if (size !== meta.size) return cb(new Error('incomplete'));
+
+            // 流式算哈希，顺便留下文件头用来识别类型
+            const hash = crypto.createHash('sha256');
+            let header = null;
+            fs.createReadStream(partPath(id))
+                .on('data', (chunk) => {
+                    if (!header) header = chunk.subarray(0, 16);
+                    hash.update(chunk);
+                })
+                .on('error', cb)
+                .on('end', () => {
+                    const digest = hash.digest('hex');
+                    if (meta.sha256 && digest !== meta.sha256) {
+                        discard(id);
+                        return cb(new Error('hash mismatch'));
+                    }
+                    const mime = attachments.sniff(header);
+                    if (!mime) {
+                        discard(id);
+                        return cb(new Error('unsupported type'));
+                    }
+                    attachments.adopt(partPath(id), digest, mime, (err, ref) => {
+                        if (err) return cb(err);
+                        fs.unlink(metaPath(id), () => {});
+                        cb(null, ref);
+                    });
+                });
+        });
+    });
+}
+
+// 定期清理放弃了的上传
+function sweep() {
+    fs.readdir(TMP, (err, files) => {
+        if (err) return;
+        const now = Date.now();
+        for (const file of files) {
+            const full = path.join(TMP, file);
+            fs.stat(full, (err, st) => {
+                if (!err && now - st.mtimeMs > TTL) fs.unlink(full, () => {});
+            });
+        }
+    });
+}
+setInterval(sweep, 3600 * 1000).unref();
+
+module.exports = { CHUNK_SIZE, MAX_SIZE, create, head, put, complete };
@@ -0,0 +1,80 @@
+const os = require('os');
+const { Worker } = require('worker_threads');
+
+// 固定大小的 worker 线程池：CPU 密集的活 (bcrypt 等) 放到这里，主线程只负责收发
+class WorkerPool {
+    constructor(file, opts = {}) {
+        this.file = file;
+        this.size = opts.size || (os.availableParallelism ? os.availableParallelism() : os.cpus().length);
+        this.maxQueue = opts.maxQueue || 100; // 排队上限，超过直接拒绝，避免请求无限堆积
+        this.queue = [];
+        this.idle = [];
+        this.tasks = new Map(); // worker -> 正在执行的任务
+        for (let i = 0; i < this.size; i++) this.spawn();
+    }
+
+    get pending() { return this.queue.length; }
+
+    spawn() {
+        const worker = new Worker(this.file);
+        worker.unref();
+        worker.on('message', (msg) => {
+            const task = this.tasks.get(worker);
+            this.tasks.delete(worker);
+            if (task) {
+                if (msg.error) task.reject(new Error(msg.error));
+                else task.resolve(msg.result);
+            }
+            this.release(worker);
+        });
+        worker.on('error', (err) => {
+            const task = this.tasks.get(worker);
+            this.tasks.delete(worker);
+            if (task) task.reject(err);
+        });
+        worker.on('exit', () => {
+            // 线程意外退出：从空闲列表移除并补一个新的
+            this.idle = this.idle.filter(w => w !== worker);
+            if (this.tasks.has(worker)) {
+                this.tasks.get(worker).reject(new Error('worker exited'));
+                this.tasks.delete(worker);
+            }
+            if (!this.closed) this.spawn();
+        });
+        this.release(worker);
+    }
+
+    release(worker) {
+        const next = this.queue.shift();
+        if (next) {
+            this.tasks.set(worker, next);
+            worker.postMessage(next.data);
+        } else {
+            this.idle.push(worker);
+        }
+    }
+
+    run(data) {
+        return new Promise((resolve, reject) => {
+            const task = { data, resolve, reject };
+            const worker = this.idle.pop();
+            if (worker) {
+                this.tasks.set(worker, task);
+                return worker.postMessage(data);
+            }
+            if (this.queue.length >= this.maxQueue) {
+                const err = new Error('worker pool busy');
+                err.code = 'EBUSY';
+                return reject(err);
+            }
+            this.queue.push(task);
+        });
+    }
+
+    close() {
+        this.closed = true;
+        return Promise.all([...this.idle, ...this.tasks.keys()].map(w => w.terminate()));
+    }
+}
+
+module.exports = WorkerPool;
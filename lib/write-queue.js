@@ -0,0 +1,55 @@
+const EventEmitter = require('events');
+
+// 写后队列：消息先进内存队列，凑够一批或到时间后一次性交给 writeBatch 落库
+// writeBatch(items, cb(err, results)) 需要保证 results[i] 对应 items[i]
+class WriteQueue extends EventEmitter {
+    constructor(writeBatch, opts = {}) {
+        super();
+        this.writeBatch = writeBatch;
+        this.interval = opts.interval || 5;        // 最多攒多少毫秒
+        this.maxBatch = opts.maxBatch || 500;      // 每个事务最多多少条
+        this.maxPending = opts.maxPending || 10000; // 队列上限，超过就拒绝写入
+        this.pending = [];
+        this.timer = null;
+        this.flushing = false;
+    }
+
+    get size() { return this.pending.length; }
+    get full() { return this.pending.length >= this.maxPending; }
+
+    // 队列满时返回 false，由调用方决定怎么告诉客户端
+    push(item, cb) {
+        if (this.full) return false;
+        this.pending.push({ item, cb });
+        if (this.pending.length >= this.maxBatch) this.flush();
+        else if (!this.timer) this.timer = setTimeout(() => this.flush(), this.interval);
+        return true;
+    }
+
+    flush() {
+        if (this.timer) { clearTimeout(this.timer); this.timer = null; }
+        if (this.flushing || !this.pending.length) return;
+
+        this.flushing = true;
+        const batch = this.pending.splice(0, this.maxBatch);
+        this.writeBatch(batch.map(b => b.item), (err, results) => {
+            this.flushing = false;
+            if (err) this.emit('error', err);
+            batch.forEach((b, i) => { if (b.cb) b.cb(err, results && results[i]); });
+
+            // 写的过程中又积压了一批，立刻接着写
+            if (this.pending.length >= this.maxBatch) setImmediate(() => this.flush());
+            else if (this.pending.length && !this.timer) this.timer = setTimeout(() => this.flush(), this.interval);
+            else if (!this.pending.length) this.emit('drain');
+        });
+    }
+
+    // 关机时调用：把剩下的全部写完再回调
+    close(cb) {
+        if (!this.pending.length && !this.flushing) return cb();
+        this.once('drain', cb);
+        this.flush();
+    }
+}
+
+module.exports = WriteQueue;
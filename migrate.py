@@ -0,0 +1,283 @@
+"""老 chat.db 数据迁移：把内联的 base64 图片拆成附件文件，给没有 ts 的老消息补上毫秒时间戳。
+
+服务器可以一直开着：库是 WAL 模式，这里每批只开一个很短的写事务，批与批之间让出写锁。
+按 id 倒序分批 (keyset，不用 OFFSET)，内存里最多同时有一批的元数据和一张图片。
+进度 (游标、时间锚点、计数) 和每批的改动在同一个事务里写进 migrations 表，中断后重跑会从断点继续。
+
+ts 的推算：老消息只有 "14:05" 这样的本地时间，没有日期。从最新的消息往回走，
+每条老消息取 "比后一条早、且最接近它的那个 HH:MM"，所以假设相邻两条消息间隔不超过一天。
+时间字符串是服务器按它的时区生成的，迁移时要用同样的时区 (TZ=...) 运行。
+
+用法:
+    python migrate.py                     # 迁移 chat.db (或 DB_FILE)
+    python migrate.py --batch 200 --pause 100
+    python migrate.py --restart           # 忽略断点，从头再来
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+NAME = "inline-images-and-ts"
+URL_PREFIX = "/attachments/"
+
+# 和 lib/attachments.js 的 MIME_EXT 一致
+MIME_EXT = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/avif": "avif",
+    "image/bmp": "bmp",
+}
+DATA_URL_RE = re.compile(r"^data:([\w.+-]+/[\w.+-]+);base64,")
+CLOCK_RE = re.compile(r"(\d{1,2}):(\d{2})")
+PM_RE = re.compile(r"PM|下午|晚上", re.I)
+AM_RE = re.compile(r"AM|上午|凌晨|早上", re.I)
+
+
+# ================= 图片 =================
+def sniff(buf):
+    """按文件头识别图片类型，规则和 lib/attachments.js 的 sniff() 一样。"""
+    if len(buf) < 12:
+        return None
+    if buf[0] == 0x89 and buf[1:4] == b"PNG":
+        return "image/png"
+    if buf[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if buf[:4] == b"GIF8":
+        return "image/gif"
+    if buf[:4] == b"RIFF" and buf[8:12] == b"WEBP":
+        return "image/webp"
+    if buf[4:8] == b"ftyp" and buf[8:12] in (b"avif", b"avis"):
+        return "image/avif"
+    if buf[:2] == b"BM":
+        return "image/bmp"
+    return None
+
+
+def store_image(upload_dir, data_url):
+    """解码 data URL 存成按哈希命名的文件，返回 (引用, 写入字节数)；不是能识别的图片返回 (None, 0)。
+
+    文件名就是内容哈希，重复写是无害的：这一批没提交就中断的话，下次重跑会得到同一个文件。
+    """
+    m = DATA_URL_RE.match(data_url)
+    if not m:
+        return None, 0
+    try:
+        buf = base64.b64decode(data_url[m.end():], validate=False)
+    except (binascii.Error, ValueError):
+        return None, 0
+    # 不信任声明的 mime，以文件头为准
+    mime = sniff(buf)
+    if mime not in MIME_EXT:
+        return None, 0
+
+    name = "%s.%s" % (hashlib.sha256(buf).hexdigest(), MIME_EXT[mime])
+    dest = os.path.join(upload_dir, name[:2], name)
+    if os.path.exists(dest):
+        return URL_PREFIX + name, 0
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = "%s.%d.migrate.tmp" % (dest, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(buf)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, dest)
+    return URL_PREFIX + name, len(buf)
+
+
+# ================= 时间 =================
+def parse_clock(text):
+    """"14:05" / "02:05 PM" / "下午2:05" -> 当天的第几分钟；解析不了返回 None。"""
+    m = CLOCK_RE.search(text or "")
+    if not m:
+        return None
+    hour, minute = int(m.group(1)), int(m.group(2))
+    if PM_RE.search(text) and hour < 12:
+        hour += 12
+    elif AM_RE.search(text) and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def guess_ts(clock, anchor_ms):
+    """anchor 之前 (含同一分钟) 最近的那个 HH:MM，按本地时区换算成毫秒。"""
+    anchor = datetime.fromtimestamp(anchor_ms / 1000)
+    guess = anchor.replace(hour=clock // 60, minute=clock % 60, second=0, microsecond=0)
+    if guess > anchor:
+        guess -= timedelta(days=1)
+    return int(guess.timestamp() * 1000)
+
+
+# ================= 数据库 =================
+def connect(path):
+    # timeout：服务器正在写时等它的事务结束，而不是直接报 database is locked
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    # 服务器还没升级过的老库：补上后来加的列 (和 lib/storage/sqlite.js 的 addColumn 一致)
+    for column in ("room TEXT NOT NULL DEFAULT 'lobby'", "ts INTEGER", "meta TEXT", "cid TEXT"):
+        try:
+            conn.execute("ALTER TABLE messages ADD COLUMN " + column)
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e):
+                raise
+    conn.execute("""CREATE TABLE IF NOT EXISTS migrations (
+        name TEXT PRIMARY KEY, cursor INTEGER, anchor INTEGER,
+        rows INTEGER NOT NULL DEFAULT 0, images INTEGER NOT NULL DEFAULT 0, ts_filled INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0, updated_at INTEGER)""")
+    return conn
+
+
+def load_checkpoint(conn, restart):
+    if restart:
+        conn.execute("DELETE FROM migrations WHERE name = ?", (NAME,))
+    row = conn.execute("SELECT cursor, anchor, rows, images, ts_filled, done FROM migrations WHERE name = ?", (NAME,)).fetchone()
+    if row:
+        return dict(zip(("cursor", "anchor", "rows", "images", "ts_filled", "done"), row))
+    # 第一次运行：从现在最大的 id 往回走；之后服务器新写的行本来就有 ts，也不会有内联图片
+    top = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+    state = {"cursor": top + 1, "anchor": int(time.time() * 1000), "rows": 0, "images": 0, "ts_filled": 0, "done": 0}
+    conn.execute("INSERT INTO migrations (name, cursor, anchor, updated_at) VALUES (?, ?, ?, ?)",
+                 (NAME, state["cursor"], state["anchor"], state["anchor"]))
+    return state
+
+
+def migrate_batch(conn, state, opts):
+    """处理 id < cursor 的下一批，返回这一批的行数 (0 表示走完了)。"""
+    # 只取元数据和“是不是内联图片”，内容本身按需一条条读，内存不随批大小涨
+    # 只有图片消息才算内联图片：文字消息恰好以 data: 开头也是用户发的原文，不能改
+    rows = conn.execute("""SELECT id, time, ts, substr(content, 1, 5) = 'data:' AND COALESCE(type, 'text') = 'image' FROM messages
+        WHERE id < ? ORDER BY id DESC LIMIT ?""", (state["cursor"], opts.batch)).fetchall()
+    if not rows:
+        return 0
+
+    updates = []  # (content 或 None, ts 或 None, id)
+    anchor = state["anchor"]
+    images = ts_filled = 0
+    written = 0
+    for row_id, text_time, ts, inline in rows:
+        new_content = None
+        if inline:
+            (content,) = conn.execute("SELECT content FROM messages WHERE id = ?", (row_id,)).fetchone()
+            ref, size = store_image(opts.uploads, content)
+            if ref:
+                new_content = ref
+                images += 1
+                written += size
+            del content
+
+        new_ts = None
+        if ts is not None:
+            anchor = min(anchor, ts)
+        else:
+            clock = parse_clock(text_time)
+            # 解析不了的就和后一条算同一时间
+            new_ts = guess_ts(clock, anchor) if clock is not None else anchor
+            anchor = new_ts
+            ts_filled += 1
+
+        if new_content is not None or new_ts is not None:
+            updates.append((new_content, new_ts, row_id))
+
+    # 文件都落盘之后再开写事务，事务里只有几百条 UPDATE，持锁时间很短
+    state["cursor"] = rows[-1][0]
+    state["anchor"] = anchor
+    state["rows"] += len(rows)
+    state["images"] += images
+    state["ts_filled"] += ts_filled
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("UPDATE messages SET content = COALESCE(?, content), ts = COALESCE(?, ts) WHERE id = ?", updates)
+        conn.execute("""UPDATE migrations SET cursor = ?, anchor = ?, rows = ?, images = ?, ts_filled = ?, updated_at = ?
+            WHERE name = ?""", (state["cursor"], anchor, state["rows"], state["images"], state["ts_filled"], int(time.time() * 1000), NAME))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    state["written"] = state.get("written", 0) + written
+    return len(rows)
+
+
+def reclaim(conn):
+    """图片搬走后的空闲页还给文件系统：auto_vacuum=INCREMENTAL 的库一点点还。
+
+    还是 auto_vacuum=NONE 的老库要整库 VACUUM 一次才能切过去 (服务器启动时也会做)，顺便就把空闲页都还了；
+    VACUUM 期间服务器写不进去，库大的话最好停服再跑。
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        print("   老库切换到 auto_vacuum=INCREMENTAL，整库 VACUUM ...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return
+    while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+        conn.execute("PRAGMA incremental_vacuum(2000)")
+        time.sleep(0.01)
+
+
+def run(opts):
+    if not os.path.exists(opts.db):
+        sys.exit(f"❌ 找不到数据库 {opts.db}")
+    conn = connect(opts.db)
+    state = load_checkpoint(conn, opts.restart)
+    if state["done"]:
+        print("✅ 已经迁移过了 (用 --restart 可以重新跑一遍)")
+        return
+    total = conn.execute("SELECT COUNT(*) FROM messages WHERE id < ?", (state["cursor"],)).fetchone()[0]
+    if state["rows"]:
+        print(f"↩️  从断点继续：已处理 {state['rows']} 行，剩 {total} 行")
+    else:
+        print(f"🚚 开始迁移 {opts.db}：共 {total} 行")
+
+    start = last_report = time.perf_counter()
+    done_here = 0
+    while True:
+        n = migrate_batch(conn, state, opts)
+        if not n:
+            break
+        done_here += n
+        now = time.perf_counter()
+        if now - last_report >= opts.report or done_here >= total:
+            rate = done_here / (now - start)
+            eta = (total - done_here) / rate if rate else 0
+            print(f"   {done_here}/{total} 行  {rate:,.0f} 行/秒  图片 {state['images']} 张 "
+                  f"({state.get('written', 0) / 1e6:.1f} MB)  补 ts {state['ts_filled']} 行  剩约 {eta:.0f} 秒")
+            last_report = now
+        # 让出写锁，服务器的写后队列可以插进来
+        if opts.pause:
+            time.sleep(opts.pause / 1000)
+
+    conn.execute("UPDATE migrations SET done = 1, updated_at = ? WHERE name = ?", (int(time.time() * 1000), NAME))
+    elapsed = time.perf_counter() - start
+    print(f"✅ 迁移完成：{done_here} 行，用时 {elapsed:.1f} 秒 ({done_here / elapsed if elapsed else 0:,.0f} 行/秒)，"
+          f"拆出图片 {state['images']} 张，补 ts {state['ts_filled']} 行")
+
+    print("🧹 回收空闲页 ...")
+    reclaim(conn)
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    conn.close()
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="迁移老 chat.db：拆出内联图片、补 ts")
+    p.add_argument("--db", default=os.environ.get("DB_FILE", os.path.join(ROOT, "chat.db")), help="数据库文件")
+    p.add_argument("--uploads", default=os.environ.get("UPLOAD_DIR", os.path.join(ROOT, "uploads")), help="附件目录 (和服务器的 UPLOAD_DIR 一致)")
+    p.add_argument("--batch", type=int, default=500, help="每批多少行 (一个事务)")
+    p.add_argument("--pause", type=int, default=20, help="每批之间停多少毫秒，给服务器让出写锁")
+    p.add_argument("--report", type=float, default=2.0, help="每隔多少秒打印一次进度")
+    p.add_argument("--restart", action="store_true", help="忽略断点，从头开始")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,526 @@
+// 重连退避：起步 2 秒、随机抖动拉满 (0~4 秒)、逐次翻倍到 30 秒封顶
+// 服务器重启时所有人同时掉线，抖动把重连摊开，不会在同一瞬间一起打过来
+const socket = io({ reconnectionDelay: 2000, reconnectionDelayMax: 30000, randomizationFactor: 1 });
+let isRegisterMode = false; // 默认是登录模式
+let myName = "";
+
+// --- 初始化：检查本地缓存 ---
+window.onload = () => {
+    const savedTheme = localStorage.getItem('theme');
+    if (savedTheme === 'dark') document.body.setAttribute('data-theme', 'dark');
+
+    const savedUser = localStorage.getItem('chatUser');
+    if (savedUser) {
+        // 如果有缓存，自动填入用户名，并保持在登录模式
+        document.getElementById('auth-user').value = savedUser;
+        document.getElementById('auth-title').textContent = "欢迎回来 " + savedUser;
+    } else {
+        // 没有缓存，可能是新用户，但不自动切换，等待用户选择
+        document.getElementById('auth-title').textContent = "WebChat 登录";
+    }
+};
+
+function toggleMode() {
+    isRegisterMode = !isRegisterMode;
+    const title = document.getElementById('auth-title');
+    const btn = document.getElementById('btn-action');
+    const switchBtn = document.getElementById('btn-switch');
+    const err = document.getElementById('auth-error');
+
+    err.textContent = ""; // 清空报错
+
+    if (isRegisterMode) {
+        title.textContent = "创建新账号";
+        btn.textContent = "注 册";
+        switchBtn.textContent = "已有账号？去登录";
+    } else {
+        title.textContent = "WebChat 登录";
+        btn.textContent = "登 录";
+        switchBtn.textContent = "没有账号？去注册";
+    }
+}
+
+function submitAuth() {
+    const u = document.getElementById('auth-user').value.trim();
+    const p = document.getElementById('auth-pass').value.trim();
+    if (!u || !p) return showErr("账号和密码不能为空");
+
+    const event = isRegisterMode ? 'register' : 'login';
+    socket.emit(event, { username: u, password: p });
+}
+
+function showErr(msg) {
+    const err = document.getElementById('auth-error');
+    err.textContent = msg;
+    // 简单的抖动动画
+    err.style.transform = "translateX(5px)";
+    setTimeout(() => err.style.transform = "translateX(0)", 100);
+}
+
+socket.on('register_response', res => {
+    if (res.success) {
+        alert("✅ 注册成功！现在请直接登录。");
+        toggleMode(); // 切换回登录界面
+        // 自动填入刚才注册的密码，方便登录
+        document.getElementById('auth-pass').value = ""; 
+    } else {
+        showErr(res.msg);
+    }
+});
+
+socket.on('login_response', onLoggedIn);
+
+function onLoggedIn(res) {
+    if (res.success) {
+        myName = res.username;
+        localStorage.setItem('chatUser', myName); // 记住用户名
+        localStorage.setItem('chatToken', res.token); // 重连和刷新页面时用它免密恢复
+        document.getElementById('auth-overlay').style.display = 'none';
+        document.getElementById('main-app').style.display = 'flex';
+        // 断线后重新登录：回到原来的房间，只补缺的消息，不清空重来
+        if (currentRoom) restoreSession(res.room);
+        else enterRoom(res.room);
+    } else {
+        showErr(res.msg); // 显示详细错误（如账号不存在）
+    }
+}
+
+function logout() {
+    localStorage.removeItem('chatUser');
+    localStorage.removeItem('chatToken');
+    location.reload();
+}
+
+function toggleTheme() {
+    const isDark = document.body.getAttribute('data-theme') === 'dark';
+    const newTheme = isDark ? 'light' : 'dark';
+    document.body.setAttribute('data-theme', newTheme);
+    localStorage.setItem('theme', newTheme);
+}
+
+// --- 聊天核心 ---
+const form = document.getElementById('input-area');
+const input = document.getElementById('input');
+const msgs = document.getElementById('messages');
+
+// 消息区是虚拟列表：条目类型 message / system / search
+const list = new MessageList(msgs, renderItem, {
+    estimate: item => item.kind === 'message' && item.data.type === 'image' ? imageHeight(item.data) + 40 : item.kind === 'system' ? 30 : 70,
+    onTop: () => loadHistory(),
+    onTrim: () => {
+        // 旧条目被丢掉了：游标改成现在最旧的一条，往上滚还能重新加载回来
+        const first = list.find((kind, data) => kind === 'message' && typeof data.id === 'number');
+        if (first) { oldestId = first.id; hasMore = true; }
+    }
+});
+
+// 有尺寸的图片可以算出准确的显示高度，虚拟列表不用等加载完再修正
+function imageHeight(data) {
+    const meta = data.meta;
+    // 气泡大约 300px 宽，缩略图按比例缩放，高度不超过 240px
+    return meta && meta.width ? Math.round(Math.min(240, 300 * meta.height / meta.width)) : 240;
+}
+
+function renderItem(kind, data) {
+    if (kind === 'system') return renderSystem(data);
+    if (kind === 'search') return renderSearch(data);
+    return renderMessage(data);
+}
+
+// --- 发送：每条消息带一个客户端生成的 cid，先乐观地显示出来，服务器确认后换成正式的 id ---
+// 没确认的消息留在 outbox 里，重新登录后用同一个 cid 重发，服务器按 cid 去重
+const outbox = new Map(); // cid -> { msg, type, room }
+
+function newCid() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+}
+
+function sendMessage(cid) {
+    const entry = outbox.get(cid);
+    socket.emit('chat message', { msg: entry.msg, type: entry.type, cid }, res => {
+        // 没登录 (断线后会话丢了) 就留着，等重新登录后再发
+        if (!res.success && res.msg === '请先登录') return;
+        outbox.delete(cid);
+        if (res.success) confirmMessage(cid, res.id);
+        else list.update((kind, d) => d.cid === cid, { pending: false, failed: res.msg });
+    });
+}
+
+function confirmMessage(cid, id) {
+    seenIds.add(id);
+    if (id > newestId) newestId = id;
+    list.update((kind, d) => kind === 'message' && d.cid === cid, { id, pending: false });
+}
+
+function flushOutbox() {
+    outbox.forEach((entry, cid) => { if (entry.room === currentRoom) sendMessage(cid); });
+}
+
+form.addEventListener('submit', (e) => {
+    e.preventDefault();
+    const text = input.value;
+    if (!text) return;
+    input.value = '';
+    const cid = newCid();
+    outbox.set(cid, { msg: text, type: 'text', room: currentRoom });
+    // 指令不是消息，不做乐观显示
+    if (!text.startsWith('/')) list.append('message', { user: myName, text, type: 'text', ts: Date.now(), room: currentRoom, cid, pending: true });
+    sendMessage(cid);
+});
+
+// --- 图片发送 ---
+// 先在 Worker 里缩到 1600px 以内并转成 jpeg (有透明的转 png)，再以二进制发出去，不走 base64
+const IMAGE_MAX_BYTES = 5 * 1024 * 1024;
+const fileInput = document.getElementById('file-input');
+let imageWorker = null;
+let imageJobs = 0;
+const imagePending = new Map();
+
+function compressInWorker(file) {
+    if (!imageWorker) {
+        imageWorker = new Worker(fileInput.dataset.worker);
+        imageWorker.onmessage = ({ data }) => {
+            const job = imagePending.get(data.id);
+            imagePending.delete(data.id);
+            if (job) data.error ? job.reject(new Error(data.error)) : job.resolve(data);
+        };
+    }
+    return new Promise((resolve, reject) => {
+        const id = ++imageJobs;
+        imagePending.set(id, { resolve, reject });
+        imageWorker.postMessage({ id, file });
+    });
+}
+
+// 老浏览器没有 OffscreenCanvas：退回主线程 canvas，仍然比原图小得多
+function compressOnMainThread(file) {
+    return new Promise((resolve, reject) => {
+        const img = new Image();
+        const url = URL.createObjectURL(file);
+        img.onerror = () => { URL.revokeObjectURL(url); reject(new Error('decode failed')); };
+        img.onload = () => {
+            URL.revokeObjectURL(url);
+            const scale = Math.min(1, 1600 / Math.max(img.naturalWidth, img.naturalHeight));
+            const canvas = document.createElement('canvas');
+            canvas.width = Math.round(img.naturalWidth * scale);
+            canvas.height = Math.round(img.naturalHeight * scale);
+            canvas.getContext('2d').drawImage(img, 0, 0, canvas.width, canvas.height);
+            canvas.toBlob(blob => {
+                if (!blob) return reject(new Error('encode failed'));
+                blob.arrayBuffer().then(buf => resolve({ buf, mime: blob.type }));
+            }, 'image/jpeg', 0.8);
+        };
+        img.src = url;
+    });
+}
+
+function compressImage(file) {
+    // 动图重新编码会丢帧，原样发送
+    if (file.type === 'image/gif') return file.arrayBuffer().then(buf => ({ buf, mime: file.type }));
+    if (typeof OffscreenCanvas === 'undefined' || !fileInput.dataset.worker) return compressOnMainThread(file);
+    return compressInWorker(file).catch(() => compressOnMainThread(file));
+}
+
+// --- 分块上传 ---
+// 每块单独 PUT，失败了先 HEAD 问服务器收到了多少，再从那里续传；全部传完后服务器校验哈希才发消息
+function emitAck(event, data) {
+    return new Promise((resolve, reject) => {
+        socket.timeout(15000).emit(event, data, (err, res) => err ? reject(err) : resolve(res));
+    });
+}
+
+async function sha256Hex(buf) {
+    // WebCrypto 只在 https / localhost 下可用，拿不到就不带哈希，服务器照样会算
+    if (!window.crypto || !crypto.subtle) return undefined;
+    const digest = new Uint8Array(await crypto.subtle.digest('SHA-256', buf));
+    return Array.from(digest, b => b.toString(16).padStart(2, '0')).join('');
+}
+
+const sleep = ms => new Promise(r => setTimeout(r, ms));
+
+async function uploadImage(buf) {
+    const init = await emitAck('upload init', { size: buf.byteLength, sha256: await sha256Hex(buf) });
+    if (!init.success) throw new Error(init.msg);
+
+    const url = `/uploads/${init.id}`;
+    let offset = 0;
+    let failures = 0;
+    while (offset < buf.byteLength) {
+        try {
+            const res = await fetch(`${url}?offset=${offset}`, {
+                method: 'PUT',
+                body: buf.slice(offset, offset + init.chunkSize)
+            });
+            // 409 说明服务器那边的进度和我们不一致，按它给的 offset 继续
+            if (!res.ok && res.status !== 409) throw new Error('HTTP ' + res.status);
+            offset = Number(res.headers.get('Upload-Offset'));
+            failures = 0;
+        } catch (err) {
+            if (++failures > 5) throw err;
+            await sleep(Math.min(1000 * 2 ** failures, 15000));
+            const res = await fetch(url, { method: 'HEAD' }).catch(() => null);
+            if (res && res.ok) offset = Number(res.headers.get('Upload-Offset'));
+        }
+    }
+
+    const done = await emitAck('upload complete', { id: init.id, cid: newCid() });
+    if (!done.success) throw new Error(done.msg);
+}
+
+fileInput.addEventListener('change', function() {
+    const file = this.files[0];
+    this.value = '';
+    if (!file) return;
+    compressImage(file).then(({ buf }) => {
+        if (buf.byteLength > IMAGE_MAX_BYTES) return alert('图片太大了 (压缩后仍超过 5MB)');
+        // 缩略图、占位图、尺寸都由服务器生成
+        return uploadImage(buf).catch(err => alert('图片发送失败: ' + err.message));
+    }, () => alert('图片无法读取'));
+});
+
+// 有 ts 就按本地时区显示，不是今天的消息带上日期；老消息只有 time 字符串
+function formatTime(data) {
+    if (!data.ts) return data.time || '';
+    const d = new Date(data.ts);
+    const hm = d.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+    return d.toDateString() === new Date().toDateString() ? hm : `${d.getMonth() + 1}-${d.getDate()} ${hm}`;
+}
+
+// 有缩略图就只加载缩略图，尺寸提前占好、先铺一层模糊占位；点开才加载原图
+// 动图只有尺寸和占位图，没有缩略图 (静态缩略图会只剩第一帧)，直接显示原图
+function renderImage(data) {
+    const meta = data.meta;
+    if (!meta || !meta.width) return `<img src="${escapeHtml(data.text)}" data-full="${escapeHtml(data.text)}" loading="lazy">`;
+    const style = `aspect-ratio: ${meta.width} / ${meta.height}; width: ${Math.round(240 * meta.width / meta.height)}px;`
+        + (meta.blur ? ` background-image: url('${escapeHtml(meta.blur)}');` : '');
+    return `<img class="thumb" src="${escapeHtml(meta.thumb || data.text)}" data-full="${escapeHtml(data.text)}" loading="lazy" decoding="async" style="${style}">`;
+}
+
+msgs.addEventListener('click', e => {
+    if (e.target.dataset.full) window.open(e.target.dataset.full);
+});
+
+function renderMessage(data) {
+    const li = document.createElement('li');
+    const isMe = data.user === myName;
+    li.className = `msg-row ${isMe ? 'right' : 'left'}${data.pending ? ' pending' : ''}${data.failed ? ' failed' : ''}`;
+    if (data.failed) li.title = '发送失败: ' + data.failed;
+    li.innerHTML = `
+        <div class="avatar">${escapeHtml(data.user[0].toUpperCase())}</div>
+        <div>
+            <div class="meta">${!isMe ? escapeHtml(data.user) : ''} ${formatTime(data)}</div>
+            <div class="bubble">
+                ${data.type==='image' ? renderImage(data) : escapeHtml(data.text)}
+            </div>
+        </div>`;
+    return li;
+}
+
+// 已经显示过的消息 id：广播和断线补齐可能会重叠
+let seenIds = new Set();
+let newestId = 0;
+
+function receiveMessage(data) {
+    if (seenIds.has(data.id)) return;
+    // 自己发的消息已经乐观显示过了，广播先于 ack 到达时就在这里确认
+    if (data.cid && data.user === myName && outbox.has(data.cid)) {
+        outbox.delete(data.cid);
+        return confirmMessage(data.cid, data.id);
+    }
+    seenIds.add(data.id);
+    if (data.id > newestId) newestId = data.id;
+    list.append('message', data);
+}
+
+socket.on('chat message', data => {
+    if (data.room !== currentRoom) return;
+    receiveMessage(data);
+});
+
+// 每次连上 (包括刚打开页面) 先用令牌恢复会话；恢复后从 newestId 往后补齐
+// 令牌无效或过期才退回登录框
+socket.on('connect', resume);
+
+function resume() {
+    const token = localStorage.getItem('chatToken');
+    if (!token || !socket.connected) return;
+    socket.emit('resume', { token, room: currentRoom }, res => {
+        if (res.success) return onLoggedIn(res);
+        // 服务器忙 (准入队列满了)：令牌没问题，按建议的时间加随机抖动再试
+        if (res.busy) return setTimeout(resume, jitter(res.retry_ms));
+        localStorage.removeItem('chatToken');
+        if (myName) document.getElementById('auth-title').textContent = '登录已过期，请重新登录';
+        document.getElementById('auth-overlay').style.display = 'flex';
+    });
+}
+
+// 在 [ms/2, ms*3/2) 之间随机
+function jitter(ms) {
+    return ms * (0.5 + Math.random());
+}
+
+function restoreSession(room) {
+    const done = () => catchUp(() => flushOutbox());
+    if (room === currentRoom) return done();
+    socket.emit('join room', { room: currentRoom }, res => {
+        if (res.success) done();
+        else enterRoom(res.room || room);
+    });
+}
+
+function catchUp(cb) {
+    if (!newestId) return cb();
+    socket.emit('history', { since_id: newestId, limit: 200 }, res => {
+        if (!res.success || res.room !== currentRoom) return cb();
+        res.messages.forEach(([id, user, text, type, time, ts, meta]) => receiveMessage({ id, user, text, type, time, ts, meta }));
+        if (res.has_more) catchUp(cb);
+        else cb();
+    });
+}
+
+// --- 房间 ---
+let currentRoom = null;
+let rooms = JSON.parse(localStorage.getItem('chatRooms') || '["lobby"]');
+
+function renderRooms() {
+    const list = document.getElementById('room-list');
+    list.textContent = '';
+    rooms.forEach(r => {
+        const li = document.createElement('li');
+        li.textContent = `# ${r}`;
+        if (r === currentRoom) li.className = 'active';
+        li.onclick = () => switchRoom(r);
+        list.appendChild(li);
+    });
+}
+
+// 切到新房间：清空消息区，历史游标从头开始
+function enterRoom(room) {
+    currentRoom = room;
+    if (!rooms.includes(room)) {
+        rooms.push(room);
+        localStorage.setItem('chatRooms', JSON.stringify(rooms));
+    }
+    list.clear();
+    seenIds = new Set();
+    newestId = 0;
+    oldestId = null;
+    hasMore = true;
+    loadingHistory = false;
+    document.getElementById('chat-title').textContent = `# ${room} (${myName})`;
+    renderRooms();
+    loadHistory();
+}
+
+function switchRoom(room) {
+    if (room === currentRoom) return;
+    socket.emit('join room', { room }, res => {
+        if (res.success) enterRoom(res.room);
+        else alert(res.msg);
+    });
+}
+
+function promptRoom() {
+    const room = (prompt('输入房间名') || '').trim();
+    if (room) switchRoom(room);
+}
+
+// --- 历史消息：进入房间后取最新一页，滚到顶部时再按游标往前翻 ---
+let oldestId = null;
+let hasMore = true;
+let loadingHistory = false;
+
+function loadHistory() {
+    if (loadingHistory || !hasMore) return;
+    loadingHistory = true;
+    socket.emit('history', { before_id: oldestId, limit: 50 }, res => {
+        loadingHistory = false;
+        if (!res.success || res.room !== currentRoom) return;
+        hasMore = res.has_more;
+        if (!res.messages.length) return;
+
+        oldestId = res.messages[0][0];
+        res.messages.forEach(([id]) => { seenIds.add(id); if (id > newestId) newestId = id; });
+        // 整页插到最前面，虚拟列表负责保持当前可见位置不跳动
+        list.prepend('message', res.messages.map(([id, user, text, type, time, ts, meta]) => ({ id, user, text, type, time, ts, meta })));
+    });
+}
+
+// --- 搜索结果 (/search 关键词)：片段里 \u0002...\u0003 之间是命中的词 ---
+function escapeHtml(str) {
+    return String(str).replace(/[&<>"']/g, c => ({ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[c]));
+}
+
+function renderSearch(res) {
+    const li = document.createElement('li');
+    li.className = 'search-results';
+    li.innerHTML = res.results.length
+        ? `<div class="meta">🔍 “${escapeHtml(res.q)}” 的搜索结果</div>` + res.results.map(([id, user, time, snippet]) =>
+            `<div class="search-hit"><b>${escapeHtml(user)}</b> <span class="meta">${escapeHtml(time)}</span><br>${escapeHtml(snippet).replace(/\u0002/g, '<mark>').replace(/\u0003/g, '</mark>')}</div>`).join('')
+        : `<div class="meta">🔍 没有找到 “${escapeHtml(res.q)}”</div>`;
+    if (res.next_offset !== null) {
+        const more = document.createElement('button');
+        more.className = 'btn-link auth-btn';
+        more.textContent = '更多结果';
+        more.onclick = () => {
+            const offset = res.next_offset;
+            res.next_offset = null; // 条目可能被回收后重新渲染，按钮不要再出现
+            more.remove();
+            socket.emit('search', { q: res.q, offset }, next => { if (next.success) list.append('search', next); });
+        };
+        li.appendChild(more);
+    }
+    return li;
+}
+
+socket.on('search results', res => list.append('search', res));
+
+function renderSystem(msg) {
+    const li = document.createElement('li');
+    li.className = 'system-row';
+    li.textContent = msg;
+    return li;
+}
+
+socket.on('system', msg => list.append('system', msg));
+
+// --- 在线列表：登录时拿全量，之后按 seq 应用增量，断号就重新同步 ---
+const userList = document.getElementById('user-list');
+const userItems = new Map();
+let presenceSeq = -1;
+let presenceSyncing = false;
+
+function addUser(name) {
+    if (userItems.has(name)) return;
+    const li = document.createElement('li');
+    li.textContent = `👤 ${name}`;
+    userItems.set(name, li);
+    userList.appendChild(li);
+}
+
+function removeUser(name) {
+    const li = userItems.get(name);
+    if (li) { li.remove(); userItems.delete(name); }
+}
+
+function applySnapshot(snap) {
+    presenceSyncing = false;
+    presenceSeq = snap.seq;
+    userItems.clear();
+    userList.textContent = '';
+    snap.users.forEach(addUser);
+}
+
+socket.on('presence snapshot', applySnapshot);
+
+socket.on('presence', batch => {
+    if (!myName || presenceSeq < 0 || presenceSyncing) return;
+    if (batch.seq <= presenceSeq) return;
+    if (batch.seq !== presenceSeq + 1) {
+        presenceSyncing = true;
+        return socket.emit('presence sync', applySnapshot);
+    }
+    presenceSeq = batch.seq;
+    batch.ops.forEach(([op, name]) => op === 'join' ? addUser(name) : removeUser(name));
+});
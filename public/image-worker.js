@@ -0,0 +1,38 @@
+// --- 图片压缩 (Web Worker) ---
+// 解码、缩放、重新编码都在这里做，主线程不卡；结果以 ArrayBuffer 转移回去，不拷贝
+// 只输出 JPEG (有透明的输出 PNG)：缩略图和占位图由服务器生成，它只解得了 JPEG/PNG/GIF/BMP
+const MAX_SIDE = 1600;
+const QUALITY = 0.8;
+
+function transparent(ctx, width, height) {
+    const data = ctx.getImageData(0, 0, width, height).data;
+    for (let i = 3; i < data.length; i += 4) {
+        if (data[i] < 255) return true;
+    }
+    return false;
+}
+
+self.onmessage = async ({ data: { id, file } }) => {
+    try {
+        const bitmap = await createImageBitmap(file);
+        const scale = Math.min(1, MAX_SIDE / Math.max(bitmap.width, bitmap.height));
+        const width = Math.round(bitmap.width * scale);
+        const height = Math.round(bitmap.height * scale);
+
+        const canvas = new OffscreenCanvas(width, height);
+        const ctx = canvas.getContext('2d');
+        ctx.drawImage(bitmap, 0, 0, width, height);
+        bitmap.close();
+
+        // 只有 PNG/WebP 这类可能带透明的才逐像素检查，JPEG 不用看
+        const alpha = file.type !== 'image/jpeg' && transparent(ctx, width, height);
+        const blob = await canvas.convertToBlob(alpha ? { type: 'image/png' } : { type: 'image/jpeg', quality: QUALITY });
+        // 原图本来就是 JPEG/PNG、没缩放、还更小的话，直接用原图
+        const original = scale === 1 && (file.type === 'image/jpeg' || file.type === 'image/png') && file.size <= blob.size;
+        const out = original ? file : blob;
+        const buf = await out.arrayBuffer();
+        self.postMessage({ id, buf, mime: out.type, width, height }, [buf]);
+    } catch (err) {
+        self.postMessage({ id, error: String(err && err.message || err) });
+    }
+};
@@ -0,0 +1,213 @@
+// 虚拟滚动的消息列表：DOM 里只保留可视区域上下各一段缓冲的行，其余用上下两个占位元素撑开高度
+// 新消息先进队列，每帧 (requestAnimationFrame) 统一插入一次；行高由 ResizeObserver 异步量出来，不主动读布局
+class MessageList {
+    constructor(el, renderItem, opts = {}) {
+        this.el = el;
+        this.renderItem = renderItem;
+        this.estimate = opts.estimate || (() => 60); // 还没量过的行先按估计高度算
+        this.overscan = opts.overscan || 800;       // 可视区域上下各多渲染多少像素
+        this.maxItems = opts.maxItems || 3000;      // 停在底部时最多保留多少条，多了从最旧的开始丢
+        this.onTop = opts.onTop || (() => {});      // 滚到顶部附近时回调 (加载更早的历史)
+        this.onTrim = opts.onTrim || (() => {});    // 丢弃旧条目后回调
+
+        this.items = [];
+        this.byKey = new Map();   // key -> item
+        this.heights = new Map(); // key -> 实测高度
+        this.nodes = new Map();   // key -> 当前渲染出来的元素
+        this.offsets = new Map(); // key -> 渲染时的纵向位置
+        this.total = 0;
+        this.scrollTop = 0;
+        this.viewport = 0;
+        this.stick = true;        // 是否贴在底部 (新消息来了自动滚到底)
+        this.pendingAppend = [];
+        this.pendingPrepend = [];
+        this.frame = 0;
+        this.seq = 0;
+
+        this.topPad = document.createElement('li');
+        this.bottomPad = document.createElement('li');
+        this.topPad.className = this.bottomPad.className = 'vpad';
+        el.append(this.topPad, this.bottomPad);
+
+        this.ro = new ResizeObserver(entries => this.onResize(entries));
+        this.ro.observe(el);
+        el.addEventListener('scroll', () => {
+            this.scrollTop = el.scrollTop;
+            this.stick = this.scrollTop + this.viewport >= this.total - 40;
+            if (this.scrollTop < 200) this.onTop();
+            this.schedule();
+        }, { passive: true });
+    }
+
+    heightOf(item) {
+        const h = this.heights.get(item.key);
+        return h === undefined ? this.estimate(item) : h;
+    }
+
+    wrap(kind, data) {
+        const item = { key: 'k' + (++this.seq), kind, data };
+        this.byKey.set(item.key, item);
+        return item;
+    }
+
+    append(kind, data) {
+        this.pendingAppend.push(this.wrap(kind, data));
+        this.schedule();
+    }
+
+    // 一页历史 (按时间升序) 插到最前面
+    prepend(kind, list) {
+        this.pendingPrepend = list.map(d => this.wrap(kind, d)).concat(this.pendingPrepend);
+        this.schedule();
+    }
+
+    clear() {
+        this.nodes.forEach(node => { this.ro.unobserve(node); node.remove(); });
+        this.nodes.clear();
+        this.heights.clear();
+        this.offsets.clear();
+        this.items = [];
+        this.byKey.clear();
+        this.pendingAppend = [];
+        this.pendingPrepend = [];
+        this.total = 0;
+        this.stick = true;
+        this.schedule();
+    }
+
+    // 找到第一条满足条件的数据 (用于丢弃旧条目后重新确定历史游标)
+    find(fn) {
+        const item = this.items.find(it => fn(it.kind, it.data));
+        return item && item.data;
+    }
+
+    // 原地更新一条数据 (比如乐观渲染的消息收到了确认)，只重建这一行；从最新的往前找
+    update(fn, patch) {
+        const all = this.items.concat(this.pendingAppend);
+        for (let i = all.length - 1; i >= 0; i--) {
+            const item = all[i];
+            if (!fn(item.kind, item.data)) continue;
+            Object.assign(item.data, patch);
+            const node = this.nodes.get(item.key);
+            if (node) {
+                this.ro.unobserve(node);
+                node.remove();
+                this.nodes.delete(item.key);
+            }
+            this.schedule();
+            return true;
+        }
+        return false;
+    }
+
+    schedule() {
+        if (!this.frame) this.frame = requestAnimationFrame(() => this.flush());
+    }
+
+    flush() {
+        this.frame = 0;
+        let scrolled = false;
+
+        if (this.pendingPrepend.length) {
+            const added = this.pendingPrepend;
+            this.pendingPrepend = [];
+            let h = 0;
+            added.forEach(it => { h += this.heightOf(it); });
+            this.items = added.concat(this.items);
+            this.total += h;
+            // 不在底部时把滚动位置往下挪同样的高度，用户看到的内容不动
+            if (!this.stick) { this.scrollTop += h; scrolled = true; }
+        }
+
+        if (this.pendingAppend.length) {
+            this.pendingAppend.forEach(it => { this.total += this.heightOf(it); });
+            this.items.push(...this.pendingAppend);
+            this.pendingAppend = [];
+        }
+
+        if (this.stick && this.items.length > this.maxItems) {
+            const removed = this.items.splice(0, this.items.length - this.maxItems);
+            removed.forEach(it => {
+                this.total -= this.heightOf(it);
+                this.heights.delete(it.key);
+                this.byKey.delete(it.key);
+            });
+            this.onTrim(removed);
+        }
+
+        if (this.stick) {
+            this.scrollTop = Math.max(0, this.total - this.viewport);
+            scrolled = true;
+        }
+        this.render();
+        if (scrolled) this.el.scrollTop = this.scrollTop;
+    }
+
+    render() {
+        const start = this.scrollTop - this.overscan;
+        const end = this.scrollTop + this.viewport + this.overscan;
+        const items = this.items;
+        let y = 0;
+        let i = 0;
+        for (; i < items.length; i++) {
+            const h = this.heightOf(items[i]);
+            if (y + h > start) break;
+            y += h;
+        }
+        const top = y;
+        const visible = new Set();
+        this.offsets.clear();
+        let prev = this.topPad;
+        for (; i < items.length && y < end; i++) {
+            const item = items[i];
+            visible.add(item.key);
+            this.offsets.set(item.key, y);
+            y += this.heightOf(item);
+
+            let node = this.nodes.get(item.key);
+            if (!node) {
+                node = this.renderItem(item.kind, item.data);
+                node.dataset.key = item.key;
+                this.nodes.set(item.key, node);
+                this.ro.observe(node);
+            }
+            if (prev.nextSibling !== node) this.el.insertBefore(node, prev.nextSibling);
+            prev = node;
+        }
+
+        this.nodes.forEach((node, key) => {
+            if (visible.has(key)) return;
+            this.ro.unobserve(node);
+            node.remove();
+            this.nodes.delete(key);
+        });
+        this.topPad.style.height = top + 'px';
+        this.bottomPad.style.height = Math.max(0, this.total - y) + 'px';
+    }
+
+    onResize(entries) {
+        let shift = 0;
+        for (const entry of entries) {
+            if (entry.target === this.el) {
+                this.viewport = entry.contentRect.height;
+                continue;
+            }
+            const key = entry.target.dataset.key;
+            if (!this.nodes.has(key)) continue;
+            const h = entry.borderBoxSize ? entry.borderBoxSize[0].blockSize : entry.target.offsetHeight;
+            const item = this.byKey.get(key);
+            if (!item) continue;
+            const old = this.heightOf(item);
+            if (h === old) continue;
+            this.heights.set(key, h);
+            this.total += h - old;
+            // 可视区域上方的行变高/变矮了：滚动位置跟着挪，避免内容跳动
+            if ((this.offsets.get(key) || 0) < this.scrollTop) shift += h - old;
+        }
+        if (shift && !this.stick) {
+            this.scrollTop += shift;
+            this.el.scrollTop = this.scrollTop;
+        }
+        this.schedule();
+    }
+}
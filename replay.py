@@ -0,0 +1,364 @@
+"""按录下来的流量 (TRACE_FILE) 重放：每个录到的连接对应一个 Socket.IO 客户端，按原来的时间间隔发同样形状的事件。
+
+录制是脱敏过的，重放时补成等长的合成数据：
+  - 化名用户在重放前批量注册成合成账号 (密码统一)，resume 用提前登录拿到的令牌
+  - 文字消息按原长度填充，指令保留指令名 (/search、/roll ...)
+  - upload init 之后按录到的大小用 HTTP 分块传一张假图片，upload complete 不带缩略图 (客户端这里只发文本帧)
+
+速度：--speed 1 (原速) / 10 (十倍速) / max (不等待，每个连接内部仍保持先后顺序)。
+登录、注册、恢复会等服务器回复再继续，否则后面的事件会因为“请先登录”全部失败。
+
+用法:
+    python replay.py trace.jsonl                       # 起一个临时服务器，原速重放
+    python replay.py trace.jsonl.* --speed 10          # 集群模式录的多个文件一起放
+    python replay.py trace.jsonl --speed max --port 3000   # 打到已经在跑的服务器上
+"""
+import argparse
+import asyncio
+import glob
+import json
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import bench
+from sio_client import SocketIOClient, http_request
+
+HOST = "127.0.0.1"
+PASSWORD = "replay-pass"
+RESPONSE_EVENTS = {"register": "register_response", "login": "login_response"}
+
+
+# ================= 读取录制 =================
+def load_trace(paths):
+    """返回 {连接编号: [事件, ...]}，时间统一成相对最早一个文件开始的毫秒数。"""
+    sessions = defaultdict(list)
+    for path in paths:
+        offset = None
+        run = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # 服务器被强杀时最后一行可能只写了一半
+                if entry["ev"] == "$start":
+                    # 同一个文件里可能有多次启动 (追加写)，每段按各自的开始时间对齐
+                    # 连接编号每次启动都从 0 开始，要带上是第几段
+                    offset = entry["at"]
+                    run += 1
+                    continue
+                if "s" not in entry or offset is None:
+                    continue
+                entry["t"] += offset
+                sessions[(path, run, entry["s"])].append(entry)
+
+    if not sessions:
+        return {}
+    t0 = min(e["t"] for events in sessions.values() for e in events)
+    for events in sessions.values():
+        for e in events:
+            e["t"] -= t0
+        events.sort(key=lambda e: e["t"])
+    return dict(sessions)
+
+
+def users_in(sessions):
+    """(需要提前注册的化名, 需要令牌的化名)"""
+    registered, needed, resumed = set(), set(), set()
+    for events in sessions.values():
+        for e in events:
+            arg = e.get("args", [None])[0] if e.get("args") else None
+            if not isinstance(arg, dict):
+                continue
+            if e["ev"] == "register" and isinstance(arg.get("username"), str):
+                registered.add(arg["username"])
+            elif e["ev"] == "login" and isinstance(arg.get("username"), str):
+                needed.add(arg["username"])
+            elif e["ev"] == "resume" and arg.get("user"):
+                resumed.add(arg["user"])
+    return (needed | resumed) - registered, resumed
+
+
+# ================= 把脱敏的参数补成合成数据 =================
+def filler(n):
+    # 随机小写字母加空格，搜索索引和压缩率都比全是同一个字母更接近真实文本
+    return "".join(random.choice(string.ascii_lowercase + " ") for _ in range(max(0, n)))
+
+
+def restore(value):
+    if isinstance(value, list):
+        return [restore(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "$cmd" in value:
+        cmd = value["$cmd"]
+        rest = value.get("$len", len(cmd)) - len(cmd) - 1
+        return cmd + (" " + filler(rest) if rest > 0 else "")
+    if "$len" in value:
+        return filler(value["$len"])
+    if "$bytes" in value:
+        return None  # 二进制附件发不了，去掉
+    return {k: restore(v) for k, v in value.items() if not (isinstance(v, dict) and "$bytes" in v)}
+
+
+# ================= 重放 =================
+class Replayer:
+    def __init__(self, port, sessions, opts):
+        self.port = port
+        self.sessions = sessions
+        self.opts = opts
+        self.speed = 0 if opts.speed == "max" else float(opts.speed)
+        self.tag = "r%d" % random.randrange(1 << 24)
+        self.tokens = {}
+        self.cids = 0
+        self.latency = defaultdict(list)  # 事件 -> 服务器回复耗时 (毫秒)
+        self.failed = defaultdict(int)
+        self.sent = defaultdict(int)
+        self.skipped = defaultdict(int)
+        self.lag = []                     # 实际发出时间比计划晚了多少 (毫秒)，太大说明重放机器跟不上
+        self.start = None
+
+    def username(self, pseudo):
+        return "%s-%s" % (pseudo, self.tag)
+
+    def new_cid(self):
+        self.cids += 1
+        return "%s-%08d" % (self.tag, self.cids)
+
+    def client(self):
+        return SocketIOClient(HOST, self.port)
+
+    # --- 准备账号 ---
+    async def prepare(self):
+        accounts, resumed = users_in(self.sessions)
+        sem = asyncio.Semaphore(self.opts.concurrency)
+        failed = 0
+
+        async def one(pseudo):
+            nonlocal failed
+            client = self.client()
+            async with sem:
+                try:
+                    await client.connect()
+                    # 先挂上等回复的处理函数再发，回复来得再快也不会错过
+                    reply = client.wait_for("register_response", 60)
+                    await client.emit("register", {"username": self.username(pseudo), "password": PASSWORD})
+                    await reply
+                    if pseudo in resumed:
+                        reply = client.wait_for("login_response", 60)
+                        await client.emit("login", {"username": self.username(pseudo), "password": PASSWORD})
+                        res = await reply
+                        if res.get("success"):
+                            self.tokens[pseudo] = res["token"]
+                        else:
+                            failed += 1
+                except Exception:
+                    failed += 1
+                finally:
+                    await client.close()
+
+        await asyncio.gather(*(one(p) for p in sorted(accounts)))
+        print(f"👥 准备了 {len(accounts)} 个合成账号，{len(self.tokens)} 个令牌" + (f"，{failed} 个失败" if failed else ""))
+
+    # --- 调度 ---
+    async def at(self, t):
+        if self.speed:
+            delay = self.start + t / 1000 / self.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.lag.append(max(0.0, -delay) * 1000)
+
+    def track(self, event, coro, pending):
+        async def run():
+            t = time.perf_counter()
+            try:
+                res = await coro
+                self.latency[event].append((time.perf_counter() - t) * 1000)
+                if isinstance(res, dict) and res.get("success") is False:
+                    self.failed[event] += 1
+            except Exception:
+                self.failed[event] += 1
+        task = asyncio.create_task(run())
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        return task
+
+    async def run_session(self, events):
+        client = self.client()
+        uploads = []     # 已经传完、等 upload complete 的上传 id
+        pending = set()  # 还没收到 ack 的请求
+        connected = False
+        try:
+            for e in events:
+                await self.at(e["t"])
+                ev = e["ev"]
+                if ev == "$disconnect":
+                    break
+                # 录制时缓冲满了丢掉的可能正好是 $connect，那就在第一个事件之前连上
+                if not connected:
+                    t = time.perf_counter()
+                    try:
+                        await client.connect()
+                    except Exception:
+                        self.failed["$connect"] += 1
+                        return
+                    self.latency["$connect"].append((time.perf_counter() - t) * 1000)
+                    connected = True
+                if ev.startswith("$"):
+                    continue
+                await self.send(client, ev, e, uploads, pending)
+        finally:
+            # 断开前等已经发出去的请求回来，不然最后几个请求都算失败
+            if pending:
+                await asyncio.wait(pending, timeout=60)
+            await client.close()
+
+    async def send(self, client, ev, e, uploads, pending):
+        args = restore(e.get("args", []))
+        arg = args[0] if args and isinstance(args[0], dict) else None
+        self.sent[ev] += 1
+
+        if ev in RESPONSE_EVENTS:
+            if arg is None or not isinstance(arg.get("username"), str):
+                self.skipped[ev] += 1
+                return
+            arg["username"] = self.username(e["args"][0]["username"])
+            arg["password"] = PASSWORD
+            t = time.perf_counter()
+            reply = client.wait_for(RESPONSE_EVENTS[ev], 60)
+            await client.emit(ev, arg)
+            try:
+                res = await reply
+                self.latency[ev].append((time.perf_counter() - t) * 1000)
+                if not res.get("success"):
+                    self.failed[ev] += 1
+            except Exception:
+                self.failed[ev] += 1
+            return
+
+        if ev == "resume":
+            token = arg and self.tokens.get(arg.pop("user", None))
+            if not token:
+                self.skipped[ev] += 1
+                return
+            arg["token"] = token
+            await self.track(ev, client.call(ev, arg, timeout=60), pending)
+            return
+
+        if ev == "upload init":
+            # 拿到 id 之后才能传，和客户端一样先等 ack
+            await self.track(ev, self.upload(client, arg or {}, uploads), pending)
+            return
+
+        if ev == "upload complete":
+            if not uploads:
+                self.skipped[ev] += 1
+                return
+            data = {"id": uploads.pop(0), "width": arg and arg.get("width"), "height": arg and arg.get("height")}
+            if arg and arg.get("cid"):
+                data["cid"] = self.new_cid()
+            self.track(ev, client.call(ev, data, timeout=60), pending)
+            return
+
+        if ev == "chat message" and arg and arg.get("cid"):
+            arg["cid"] = self.new_cid()
+        if e.get("ack"):
+            self.track(ev, client.call(ev, *args, timeout=60), pending)
+        else:
+            await client.emit(ev, *args)
+
+    async def upload(self, client, arg, uploads):
+        size = arg.get("size") if isinstance(arg.get("size"), int) else 100 * 1024
+        init = await client.call("upload init", {"size": size}, timeout=60)
+        if not init or not init.get("success"):
+            return init
+        body = bench.fake_png(size)
+        offset = 0
+        while offset < len(body):
+            status, headers, _ = await http_request(HOST, self.port, "PUT", "/uploads/%s?offset=%d" % (init["id"], offset),
+                                                    body[offset: offset + init["chunkSize"]])
+            if status not in (204, 409):
+                return {"success": False}
+            offset = int(headers["upload-offset"])
+        uploads.append(init["id"])
+        return init
+
+    async def run(self):
+        await self.prepare()
+        print(f"▶️  重放 {len(self.sessions)} 个连接，速度 {self.opts.speed}")
+        self.start = time.perf_counter()
+        await asyncio.gather(*(self.run_session(events) for events in self.sessions.values()))
+        elapsed = time.perf_counter() - self.start
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        events = {}
+        for ev in sorted(set(self.sent) | set(self.latency)):
+            events[ev] = dict(bench.summary(self.latency[ev]), sent=self.sent.get(ev, 0),
+                              failed=self.failed.get(ev, 0), skipped=self.skipped.get(ev, 0))
+        total = sum(self.sent.values())
+        return {
+            "sockets": len(self.sessions),
+            "speed": self.opts.speed,
+            "seconds": round(elapsed, 3),
+            "events": total,
+            "events_per_sec": round(total / elapsed, 1) if elapsed else None,
+            "lag_p50_ms": bench.percentile(self.lag, 50),
+            "lag_p99_ms": bench.percentile(self.lag, 99),
+            "by_event": events,
+        }
+
+
+def main():
+    p = argparse.ArgumentParser(description="重放录制的 socket 流量")
+    p.add_argument("traces", nargs="+", help="TRACE_FILE 录下来的文件 (可以用通配符)")
+    p.add_argument("--speed", default="1", help="1 / 10 / max，或者任意倍数")
+    p.add_argument("--port", type=int, help="打到已经在跑的服务器 (127.0.0.1:PORT)；不给就起一个临时的")
+    p.add_argument("--concurrency", type=int, default=200, help="准备账号时同时进行的注册/登录数")
+    p.add_argument("--out", help="结果 JSON 另存到这个文件")
+    opts = p.parse_args()
+    if opts.speed != "max":
+        try:
+            if float(opts.speed) <= 0:
+                raise ValueError
+        except ValueError:
+            sys.exit("--speed 只能是正数或 max")
+
+    paths = sorted({f for pattern in opts.traces for f in (glob.glob(pattern) or [pattern])})
+    sessions = load_trace(paths)
+    if not sessions:
+        sys.exit("录制文件里没有连接")
+    print(f"📼 读取了 {len(paths)} 个文件，{len(sessions)} 个连接，{sum(len(v) for v in sessions.values())} 个事件")
+
+    proc = workdir = None
+    port = opts.port
+    if port:
+        # 重放的连接都来自本机，目标服务器要按 IP 放宽登录限流，否则一分钟只有 30 次登录能过
+        print("ℹ️  目标服务器需要用 TRUST_PROXY_HOPS=0 LOGIN_IP_LIMIT=1000000 启动，否则登录会被按 IP 限流")
+    else:
+        workdir = tempfile.mkdtemp(prefix="chat-replay-")
+        port = bench.free_port()
+        proc = bench.start_server(workdir, port)
+    try:
+        result = asyncio.run(Replayer(port, sessions, opts).run())
+    finally:
+        if proc:
+            bench.stop_server(proc)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if opts.out:
+        with open(opts.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
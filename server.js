@@ -3,126 +3,567 @@ const app = express();
 const http = require('http');
 const server = http.createServer(app);
 const { Server } = require("socket.io");
-const io = new Server(server, { maxHttpBufferSize: 5e7 });
-const sqlite3 = require('sqlite3').verbose();
-const bcrypt = require('bcryptjs');
+const bus = require('./lib/cluster-bus');
+// 集群模式 (cluster.js) 下换成跨进程广播的 adapter
+// 附件走 HTTP 分块上传，socket 上只有文字和控制消息，帧上限压到 64KB
+const io = new Server(server, { maxHttpBufferSize: 64 * 1024, adapter: bus.enabled ? require('./lib/cluster-adapter') : undefined });
+const passwords = require('./lib/passwords');
+const AttemptLimiter = require('./lib/attempt-limiter');
+const Presence = require('./lib/presence');
+const Backpressure = require('./lib/backpressure');
+const { TokenBucket, BucketMap } = require('./lib/token-bucket');
+const RemotePresence = require('./lib/remote-presence');
+const attachments = require('./lib/attachments');
+const uploads = require('./lib/uploads');
+const session = require('./lib/session');
+const HistoryCache = require('./lib/history-cache');
+const Admission = require('./lib/admission');
+const assets = require('./lib/assets');
+const store = require('./lib/store');
+const metrics = require('./lib/metrics');
+const archive = require('./lib/archive');
+const trace = require('./lib/trace');
+const previews = require('./lib/previews');
+const { monitorEventLoopDelay } = require('perf_hooks');
 
-// 初始化数据库
-const db = new sqlite3.Database('chat.db');
+app.get('/', assets.serveHtml);
+app.get('/assets/:name', assets.serveAsset);
+app.get('/attachments/:name', attachments.serve);
+app.head('/uploads/:id', uploads.head);
+app.put('/uploads/:id', uploads.put);
+app.get('/metrics', metrics.serve);
 
-db.serialize(() => {
-    // 强制 username 为主键 (PRIMARY KEY)，确保唯一性
-    db.run("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT)");
-    db.run("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT, content TEXT, time TEXT, type TEXT)");
+// 在线列表只广播增量，批量窗口内的变化合并成一帧
+// 集群模式下在线状态由主进程统一维护，每个 worker 收到增量后只发给自己的连接
+const PRESENCE_BATCH_MS = parseInt(process.env.PRESENCE_BATCH_MS, 10) || 50;
+const presence = bus.enabled ? new RemotePresence() : new Presence({ batchMs: PRESENCE_BATCH_MS });
+// 一批变化太多 (比如重启后所有人同时回来) 时 Presence 直接给全量快照，广播一份列表比逐条增量便宜
+presence.on('delta', batch => backpressure.emit(io.local, batch.users ? 'presence snapshot' : 'presence', batch));
+
+// 刚登录/恢复的连接需要一份全量在线列表：攒一个批量窗口一起发，重连风暴时快照只取一次、只序列化一次
+// 窗口内如果已经广播过全量快照，这些连接也都收到了，不用再单独发
+const snapshotWaiters = new Set();
+let snapshotTimer = null;
+
+function sendSnapshotSoon(socketId) {
+    snapshotWaiters.add(socketId);
+    if (snapshotTimer) return;
+    snapshotTimer = setTimeout(() => {
+        snapshotTimer = null;
+        const ids = [...snapshotWaiters];
+        snapshotWaiters.clear();
+        if (ids.length) presence.snapshot(snap => io.local.to(ids).emit('presence snapshot', snap));
+    }, PRESENCE_BATCH_MS);
+}
+presence.on('delta', batch => { if (batch.users) snapshotWaiters.clear(); });
+
+// 每个房间最新的一段消息缓存在内存里；集群模式下每个 worker 各有一份，别的 worker 写入的消息通过 bus 同步过来
+// bus 只覆盖同一个集群里的 worker：用 Postgres 时通常是多个实例写同一个库，别的实例写入的消息这里收不到，缓存会漏消息
+// 所以 pg 默认不开，确定只有一个实例 (或一个集群) 在写时可以用 HISTORY_CACHE=1 打开
+const historyCache = new HistoryCache({
+    seed: (room, n) => store.latestMessages(room, n),
+    fetch: (ids) => store.messagesByIds(ids)
+}, {
+    enabled: store.kind !== 'pg' || process.env.HISTORY_CACHE === '1',
+    perRoom: parseInt(process.env.HISTORY_CACHE_ROWS, 10) || 500,
+    maxBytes: parseInt(process.env.HISTORY_CACHE_BYTES, 10) || 32 * 1024 * 1024
+});
+bus.on('history append', ({ room, row }) => historyCache.append(room, row));
+bus.on('history meta', ({ room, id, meta }) => historyCache.update(room, id, { meta }));
+
+// 跟不上的连接收不到在线增量，等它追上后会发现 seq 断号，自己拉一次全量
+const backpressure = new Backpressure(io);
+
+// 入站限流：每个连接一套令牌桶，同一用户的多个连接再共用一套；文字和图片分开算 (每秒速率, 突发上限)
+const userTextBuckets = new BucketMap(10, 20);
+const userImageBuckets = new BucketMap(1, 5);
+
+// --- 监控指标 ---
+const eventsTotal = metrics.counter('chat_socket_events_total', 'Inbound socket events by event name');
+const handlerSeconds = metrics.histogram('chat_handler_duration_seconds', 'Socket handler latency by handler');
+const fanoutRecipients = metrics.histogram('chat_fanout_recipients', 'Local sockets reached per chat message broadcast', [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]);
+const fanoutBytes = metrics.counter('chat_fanout_bytes_total', 'Approximate bytes sent by broadcasts');
+const loopDelay = monitorEventLoopDelay({ resolution: 10 });
+loopDelay.enable();
+
+metrics.gauge('chat_connections', 'Connected sockets', () => io.engine.clientsCount);
+metrics.gauge('chat_online_users', 'Logged-in sockets', () => presence.size);
+metrics.gauge('chat_history_cache_bytes', 'Approximate memory held by the hot history cache', () => historyCache.bytes);
+const historyRequests = metrics.counter('chat_history_requests_total', 'History pages by where they were served from');
+metrics.gauge('chat_admission_queue_length', 'Logins and resumes waiting for admission', () => admission.pending);
+metrics.gauge('chat_write_queue_length', 'Messages waiting to be written to the database', () => store.messageQueue.size);
+// 事件循环延迟：每次抓取后清零，反映的是两次抓取之间的情况
+metrics.gauge('nodejs_eventloop_lag_seconds', 'Event loop delay since last scrape', () => {
+    const v = [
+        [{ stat: 'mean' }, (loopDelay.mean || 0) / 1e9],
+        [{ stat: 'p99' }, loopDelay.percentile(99) / 1e9],
+        [{ stat: 'max' }, loopDelay.max / 1e9]
+    ];
+    loopDelay.reset();
+    return v;
+});
+metrics.gauge('nodejs_memory_bytes', 'Process memory usage', () => {
+    const m = process.memoryUsage();
+    return [[{ type: 'rss' }, m.rss], [{ type: 'heap_used' }, m.heapUsed], [{ type: 'heap_total' }, m.heapTotal], [{ type: 'external' }, m.external]];
+});
+
+// 包一层 socket 事件处理函数，记录从收到事件到处理完 (返回的 Promise 结束) 的耗时
+function timed(name, fn) {
+    return (...args) => {
+        const end = handlerSeconds.startTimer({ handler: name });
+        let result;
+        try {
+            result = fn(...args);
+        } catch (err) {
+            end();
+            return console.error(`[${name}] 处理出错:`, err);
+        }
+        Promise.resolve(result).catch(err => console.error(`[${name}] 处理出错:`, err)).finally(end);
+    };
+}
+
+const SEARCH_PAGE = 20;
+const SEARCH_MAX_OFFSET = 200;
+const HISTORY_PAGE = 50;   // 默认每页条数
+const HISTORY_MAX = 200;   // 单页上限
+const DEFAULT_ROOM = 'lobby';
+const ROOM_RE = /^[\w\u4e00-\u9fa5-]{1,32}$/;
+
+// 房间在 Socket.IO 里加前缀，避免和 socket.id (每个连接自带的私有房间) 撞名
+function roomKey(room) {
+    return 'room:' + room;
+}
+
+// 登录/注册尝试限流：按 IP 和按用户名分别计数
+// 准入控制：登录/恢复同时最多处理这么多个，其余排队；拒绝时建议客户端等多久 (客户端会再加随机抖动)
+const admission = new Admission({
+    concurrency: parseInt(process.env.ADMISSION_CONCURRENCY, 10) || 16,
+    maxQueue: parseInt(process.env.ADMISSION_QUEUE_MAX, 10) || 2000
 });
+const ADMISSION_RETRY_MS = 3000;
+// 每个 IP 每分钟的注册/登录次数；压测、重放时所有连接都来自本机，用 LOGIN_IP_LIMIT 调高
+const ipLimiter = new AttemptLimiter({ limit: parseInt(process.env.LOGIN_IP_LIMIT, 10) || 30, windowMs: 60 * 1000 });
+const userLimiter = new AttemptLimiter({ limit: 5, windowMs: 60 * 1000 });
 
-app.get('/', (req, res) => { res.sendFile(__dirname + '/index.html'); });
+// 真实 IP：x-forwarded-for 最左边几项是客户端自己能随便填的，只有我们自己的代理追加在右边的才可信
+// TRUST_PROXY_HOPS = 前面有几层可信代理 (Render 是一层，默认 1)；直接对外提供服务时设成 0，只看 TCP 连接的地址
+const TRUST_PROXY_HOPS = process.env.TRUST_PROXY_HOPS !== undefined ? parseInt(process.env.TRUST_PROXY_HOPS, 10) || 0 : 1;
 
-const onlineUsers = {};
+function clientIp(socket) {
+    const fwd = socket.handshake.headers['x-forwarded-for'];
+    if (!TRUST_PROXY_HOPS || !fwd) return socket.handshake.address;
+    const hops = fwd.split(',').map(s => s.trim()).filter(Boolean);
+    // 项数比代理层数还少，说明请求没经过全部代理，头是伪造的
+    if (hops.length < TRUST_PROXY_HOPS) return socket.handshake.address;
+    return hops[hops.length - TRUST_PROXY_HOPS];
+}
+
+function hashErrorMsg(err) {
+    return err.code === 'EBUSY' ? '服务器繁忙，请稍后再试' : '服务器内部错误';
+}
+
+// 消息幂等键的格式 (客户端一般用 crypto.randomUUID())
+const CID_RE = /^[\w-]{8,64}$/;
 
 io.on('connection', (socket) => {
+    const buckets = {
+        events: new TokenBucket(20, 40),
+        text: new TokenBucket(5, 10),
+        image: new TokenBucket(0.5, 3)
+    };
+    let lastSlowWarning = 0;
+
+    // 录制 (TRACE_FILE) 要在限流之前挂上，才能录到客户端实际发了什么
+    trace.attach(socket);
+
+    // 所有事件的总闸：超速的直接丢掉，带 ack 的告诉客户端一声
+    socket.use(([event, ...args], next) => {
+        // 只统计注册过的事件名，避免客户端乱发事件把标签撑爆
+        eventsTotal.inc({ event: socket.listenerCount(event) ? event : 'unknown' });
+        if (buckets.events.take()) return next();
+        const ack = args[args.length - 1];
+        if (typeof ack === 'function') ack({ success: false, msg: '操作太频繁，请稍后再试' });
+    });
     
     // --- 注册逻辑 (修复版) ---
-    socket.on('register', (data) => {
-        const { username, password } = data;
+    socket.on('register', timed('register', async (data) => {
+        const { username, password } = data || {};
         
         // 1. 先检查是否为空
         if (!username || !password) {
             return socket.emit('register_response', { success: false, msg: '账号密码不能为空' });
         }
+        if (!ipLimiter.hit(clientIp(socket))) {
+            return socket.emit('register_response', { success: false, msg: '尝试次数过多，请稍后再试' });
+        }
 
-        // 2. 尝试插入数据库
-        const hash = bcrypt.hashSync(password, 10);
-        const stmt = db.prepare("INSERT INTO users (username, password) VALUES (?, ?)");
-        
-        stmt.run(username, hash, function(err) {
-            if (err) {
-                // 如果报错包含 UNIQUE constraint，说明用户名已存在
-                if (err.message.includes('UNIQUE')) {
-                    socket.emit('register_response', { success: false, msg: '该用户名已被占用，请换一个' });
-                } else {
-                    socket.emit('register_response', { success: false, msg: '注册失败，服务器内部错误' });
-                }
-            } else {
-                socket.emit('register_response', { success: true, msg: '注册成功！请登录' });
+        // 2. 在 worker 线程里算哈希，再尝试插入数据库
+        let hash;
+        try {
+            hash = await passwords.hash(password);
+        } catch (err) {
+            return socket.emit('register_response', { success: false, msg: '注册失败，' + hashErrorMsg(err) });
+        }
+
+        try {
+            await store.createUser(username, hash);
+        } catch (err) {
+            // 用户名已存在
+            if (err.code === 'EEXIST') {
+                return socket.emit('register_response', { success: false, msg: '该用户名已被占用，请换一个' });
             }
-        });
-        stmt.finalize();
-    });
+            return socket.emit('register_response', { success: false, msg: '注册失败，服务器内部错误' });
+        }
+        socket.emit('register_response', { success: true, msg: '注册成功！请登录' });
+    }));
 
     // --- 登录逻辑 (修复版) ---
-    socket.on('login', (data) => {
-        const { username, password } = data;
+    // 登录和恢复都要先过准入队列；排不上的告诉客户端过一会儿再试
+    socket.on('login', timed('login', (data) => admission.run(() => login(data)).catch(err => {
+        if (err.code !== 'EBUSY') throw err;
+        socket.emit('login_response', { success: false, busy: true, retry_ms: ADMISSION_RETRY_MS, msg: '服务器繁忙，请稍后再试' });
+    })));
+
+    async function login(data) {
+        // 排队期间连接可能已经断开
+        if (!socket.connected) return;
+        const { username, password } = data || {};
+        if (!username || !password) {
+            return socket.emit('login_response', { success: false, msg: '账号密码不能为空' });
+        }
+        if (!ipLimiter.hit(clientIp(socket)) || !userLimiter.hit(username)) {
+            return socket.emit('login_response', { success: false, msg: '尝试次数过多，请稍后再试' });
+        }
         
-        db.get("SELECT * FROM users WHERE username = ?", [username], (err, row) => {
-            if (err) {
-                return socket.emit('login_response', { success: false, msg: '数据库查询错误' });
-            }
+        let row;
+        try {
+            row = await store.findUser(username);
+        } catch (err) {
+            return socket.emit('login_response', { success: false, msg: '数据库查询错误' });
+        }
             
-            // 🌟 关键修复：区分账号不存在和密码错误
-            if (!row) {
-                // 找不到用户 -> 说明可能是 Render 重启导致数据丢失，或者是新用户
-                return socket.emit('login_response', { success: false, msg: '账号不存在 (可能已被重置)，请重新注册' });
-            }
+        // 🌟 关键修复：区分账号不存在和密码错误
+        if (!row) {
+            // 找不到用户 -> 说明可能是 Render 重启导致数据丢失，或者是新用户
+            return socket.emit('login_response', { success: false, msg: '账号不存在 (可能已被重置)，请重新注册' });
+        }
             
-            if (!bcrypt.compareSync(password, row.password)) {
-                return socket.emit('login_response', { success: false, msg: '密码错误' });
-            }
+        let ok;
+        try {
+            ok = await passwords.compare(password, row.password);
+        } catch (err) {
+            return socket.emit('login_response', { success: false, msg: '登录失败，' + hashErrorMsg(err) });
+        }
+        if (!ok) {
+            return socket.emit('login_response', { success: false, msg: '密码错误' });
+        }
+        // 校验期间连接可能已经断开
+        if (!socket.connected) return;
 
-            // 登录成功
-            onlineUsers[socket.id] = username;
-            socket.emit('login_response', { success: true, username: username });
-            
-            io.emit('system', `${username} 上线了`);
-            io.emit('update user list', Object.values(onlineUsers));
+        // 登录成功：顺便发一个会话令牌，之后重连用 resume 就不用再输密码
+        userLimiter.reset(username);
+        startSession(username, DEFAULT_ROOM);
+        socket.emit('login_response', { success: true, username: username, room: DEFAULT_ROOM, token: session.issue(username) });
+        
+        backpressure.emit(io.to(roomKey(DEFAULT_ROOM)), 'system', `${username} 上线了`);
+    }
 
-            // 加载历史消息
-            db.all("SELECT user, content, time, type FROM messages ORDER BY id ASC LIMIT 50", (err, rows) => {
-                if (rows) rows.forEach(r => socket.emit('chat message', { user: r.user, text: r.content, type: r.type || 'text', time: r.time }));
-            });
+    // --- 断线重连 / 刷新页面：出示登录时拿到的令牌，只验 HMAC，不查库也不跑 bcrypt ---
+    // 请求: { token, room }  返回: { success, username, room, token } (令牌顺便续期)
+    // 重连不广播 "上线了"：部署重启时所有人同时重连，不要刷屏
+    socket.on('resume', timed('resume', (data, ack) => {
+        if (typeof ack !== 'function') return;
+        return admission.run(() => {
+            if (!socket.connected) return;
+            const username = session.verify(data && data.token);
+            if (!username) return ack({ success: false, msg: '登录已过期，请重新登录' });
+
+            const room = data.room && ROOM_RE.test(data.room) ? data.room : DEFAULT_ROOM;
+            if (!presence.nameOf(socket.id)) startSession(username, room);
+            ack({ success: true, username, room: socket.data.room, token: session.issue(username) });
+        }).catch(err => {
+            if (err.code !== 'EBUSY') throw err;
+            ack({ success: false, busy: true, retry_ms: ADMISSION_RETRY_MS, msg: '服务器繁忙，请稍后再试' });
         });
+    }));
+
+    // 新会话要一份全量在线列表，攒一批一起发
+    function startSession(username, room) {
+        presence.add(socket.id, username);
+        joinRoom(socket, room);
+        sendSnapshotSoon(socket.id);
+    }
+
+    // --- 房间：每个连接同一时间只在一个房间里，广播只发给该房间 ---
+    function joinRoom(socket, room) {
+        if (socket.data.room) socket.leave(roomKey(socket.data.room));
+        socket.data.room = room;
+        socket.join(roomKey(room));
+    }
+
+    socket.on('join room', (data, ack) => {
+        const name = presence.nameOf(socket.id);
+        const room = data && typeof data.room === 'string' ? data.room.trim() : '';
+        const reply = typeof ack === 'function' ? ack : () => {};
+        if (!name) return reply({ success: false, msg: '请先登录' });
+        if (!ROOM_RE.test(room)) return reply({ success: false, msg: '房间名只能包含字母、数字、中文、_ 和 -，最长 32 个字符' });
+        if (room === socket.data.room) return reply({ success: true, room });
+
+        const prev = socket.data.room;
+        joinRoom(socket, room);
+        if (prev) backpressure.emit(io.to(roomKey(prev)), 'system', `${name} 离开了房间`);
+        backpressure.emit(socket.to(roomKey(room)), 'system', `${name} 进入了房间`);
+        reply({ success: true, room });
+    });
+
+    // 离开当前房间 = 回到大厅
+    socket.on('leave room', (ack) => {
+        const name = presence.nameOf(socket.id);
+        const reply = typeof ack === 'function' ? ack : () => {};
+        if (!name) return reply({ success: false, msg: '请先登录' });
+        if (socket.data.room === DEFAULT_ROOM) return reply({ success: true, room: DEFAULT_ROOM });
+
+        const prev = socket.data.room;
+        joinRoom(socket, DEFAULT_ROOM);
+        backpressure.emit(io.to(roomKey(prev)), 'system', `${name} 离开了房间`);
+        reply({ success: true, room: DEFAULT_ROOM });
     });
 
+    // --- 历史消息 (按房间 + id 游标分页，一次 ack 返回一整页) ---
+    // 请求: { before_id, limit }，不带 before_id 时返回当前房间最新一页
+    //       { since_id, limit } 断线重连后补齐：只返回 id 比 since_id 大的，has_more 表示后面还有
+    // 返回: { success, room, has_more, messages: [[id, user, content, type, time, ts, meta], ...] } (按 id 升序)
+    // 库里的翻完了再从归档段里接着往前翻
+    socket.on('history', timed('history', async (opts, ack) => {
+        if (typeof ack !== 'function') return;
+        if (!presence.nameOf(socket.id)) return ack({ success: false, msg: '请先登录' });
+
+        opts = opts || {};
+        const room = socket.data.room;
+        const limit = Math.min(Math.max(parseInt(opts.limit, 10) || HISTORY_PAGE, 1), HISTORY_MAX);
+        const beforeId = parseInt(opts.before_id, 10);
+        const sinceId = parseInt(opts.since_id, 10);
+
+        if (sinceId > 0) {
+            let rows, late;
+            try {
+                [rows, late] = await Promise.all([store.messagesSince(room, sinceId, limit + 1), store.lateMessages(room, sinceId)]);
+            } catch (err) {
+                return ack({ success: false, msg: '数据库查询错误' });
+            }
+            const hasMore = rows.length > limit;
+            if (hasMore) rows.pop();
+            // 晚提交的行放在前面，仍然是 id 升序；客户端按 id 去重，已经有的会跳过
+            return ack({ success: true, room, has_more: hasMore, messages: late.concat(rows).map(historyRow) });
+        }
+
+        // 多查一行用来判断是否还有更早的消息；走 (room, id) 索引倒序扫描
+        let rows;
+        try {
+            // 最新的几百条在内存里，大多数翻页 (尤其是登录后的第一页) 不用碰数据库
+            rows = await historyCache.page(room, beforeId, limit + 1);
+            historyRequests.inc({ source: rows ? 'cache' : 'db' });
+            if (!rows) rows = await (beforeId > 0 ? store.messagesBefore(room, beforeId, limit + 1) : store.latestMessages(room, limit + 1));
+            if (rows.length <= limit) {
+                const oldest = rows.length ? rows[rows.length - 1].id : beforeId;
+                rows = rows.concat(await archive.read(room, oldest > 0 ? oldest : 0, limit + 1 - rows.length));
+            }
+        } catch (err) {
+            return ack({ success: false, msg: '数据库查询错误' });
+        }
+        const hasMore = rows.length > limit;
+        if (hasMore) rows.pop();
+        rows.reverse();
+        ack({ success: true, room, has_more: hasMore, messages: rows.map(historyRow) });
+    }));
+
+    function historyRow(r) {
+        return [r.id, r.user, r.content, r.type || 'text', r.time, r.ts, r.meta ? JSON.parse(r.meta) : null];
+    }
+
+    // --- 搜索 (当前房间，FTS5 按相关度排序，offset 分页) ---
+    // 请求: { q, offset }  返回: { success, q, results: [[id, user, time, snippet], ...], next_offset }
+    function search(q, offset) {
+        const terms = String(q || '').trim().split(/\s+/).filter(Boolean).slice(0, 8);
+        if (!terms.length) return Promise.resolve({ success: false, msg: '请输入搜索关键词' });
+        offset = Math.min(Math.max(parseInt(offset, 10) || 0, 0), SEARCH_MAX_OFFSET);
+
+        return store.searchMessages(socket.data.room, terms, SEARCH_PAGE + 1, offset).then(rows => {
+            const more = rows.length > SEARCH_PAGE;
+            if (more) rows.pop();
+            return {
+                success: true,
+                q: terms.join(' '),
+                results: rows.map(r => [r.id, r.user, r.time, r.snippet]),
+                next_offset: more && offset + SEARCH_PAGE <= SEARCH_MAX_OFFSET ? offset + SEARCH_PAGE : null
+            };
+        }).catch(() => ({ success: false, msg: '搜索失败' }));
+    }
+
+    socket.on('search', timed('search', async (data, ack) => {
+        if (typeof ack !== 'function') return;
+        if (!presence.nameOf(socket.id)) return ack({ success: false, msg: '请先登录' });
+        ack(await search(data && data.q, data && data.offset));
+    }));
+
     // --- 消息处理 ---
-    socket.on('chat message', (data) => {
-        const name = onlineUsers[socket.id];
-        if (!name) return;
+    // 请求: { msg, type, cid }，ack 返回 { success, id } (id 是入库后的行号)
+    // cid 是客户端生成的幂等键：断线后带着同一个 cid 重发，只会存一次、广播一次，ack 里还是原来的 id
+    socket.on('chat message', timed('chat message', (data, ack) => {
+        const name = presence.nameOf(socket.id);
+        const reply = typeof ack === 'function' ? ack : () => {};
+        if (!name) return reply({ success: false, msg: '请先登录' });
+        if (!data) return reply({ success: false, msg: '消息格式不对' });
 
-        const time = new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
         const msgContent = typeof data === 'string' ? data : data.msg;
         const msgType = data.type || 'text';
+        // 图片只能走 upload init / upload complete
+        if (msgType !== 'text') return reply({ success: false, msg: '不支持的消息类型' });
+        if (typeof msgContent !== 'string' || !msgContent) return reply({ success: false, msg: '消息不能为空' });
+
+        // 限流：连接和用户两级都要有令牌
+        if (!takeTokens('text', name)) return reply({ success: false, msg: '发送太快了' });
 
         // 指令处理
         if (msgType === 'text' && msgContent.startsWith('/')) {
-            handleCommand(socket, name, msgContent);
-            return;
+            reply({ success: true });
+            return handleCommand(socket, name, msgContent);
         }
 
-        const stmt = db.prepare("INSERT INTO messages (user, content, time, type) VALUES (?, ?, ?, ?)");
-        stmt.run(name, msgContent, time, msgType);
-        stmt.finalize();
+        // 等入库、ack 都完成才算处理完，timed() 量到的是整个过程 (包括在写后队列里等的那几毫秒)
+        return new Promise(resolve => saveMessage(socket, name, msgContent, msgType, { cid: data.cid }, (res) => {
+            reply(res);
+            resolve();
+        }));
+    }));
 
-        io.emit('chat message', { user: name, text: msgContent, type: msgType, id: socket.id, time: time });
-    });
+    function takeTokens(kind, name) {
+        const userBuckets = kind === 'image' ? userImageBuckets : userTextBuckets;
+        if (buckets[kind].take() && userBuckets.take(name)) return true;
+        if (Date.now() - lastSlowWarning > 2000) {
+            lastSlowWarning = Date.now();
+            socket.emit('system', '⚠️ 发送太快了，请慢一点');
+        }
+        return false;
+    }
+
+    // --- 图片上传 ---
+    // 先登记拿到 id，分块 PUT 到 /uploads/:id，最后 complete 校验哈希通过才发消息
+    socket.on('upload init', timed('upload init', (data, ack) => {
+        if (typeof ack !== 'function') return;
+        const name = presence.nameOf(socket.id);
+        if (!name) return ack({ success: false, msg: '请先登录' });
+        if (!takeTokens('image', name)) return ack({ success: false, msg: '发送太快了' });
+
+        const size = data && data.size;
+        if (Number.isInteger(size) && size > uploads.MAX_SIZE) return ack({ success: false, msg: '文件太大了' });
+        return new Promise(resolve => uploads.create({ user: name, size, sha256: data && data.sha256 }, (err, id) => {
+            ack(err ? { success: false, msg: '无法开始上传' } : { success: true, id, chunkSize: uploads.CHUNK_SIZE });
+            resolve();
+        }));
+    }));
+
+    socket.on('upload complete', timed('upload complete', (data, ack) => {
+        if (typeof ack !== 'function') return;
+        const name = presence.nameOf(socket.id);
+        if (!name) return ack({ success: false, msg: '请先登录' });
+
+        return new Promise(resolve => uploads.complete(String(data && data.id), name, (err, ref) => {
+            if (err) {
+                ack({ success: false, msg: err.message === 'hash mismatch' ? '文件校验失败' : '上传未完成' });
+                return resolve();
+            }
+            // 预览 (缩略图、占位图、尺寸) 在 worker 线程里生成；生成不了 meta 就是 null，接收方退回显示原图
+            // make 本身不 reject，这里再兜一层：不管预览出了什么事，消息都要发出去、ack 都要回
+            previews.make(ref).catch(() => null).then((meta) => {
+                saveMessage(socket, name, ref, 'image', { meta, cid: data.cid }, (res) => {
+                    ack(res);
+                    resolve();
+                });
+            });
+        }));
+    }));
+
+    // 入库后再广播，这样广播里带的是行号，客户端可以按 id 去重、断线后按 id 补齐
+    // 写后队列本来就几毫秒一批，多等这一下换来的是每条消息都有确定的 id
+    // done(res) 回调 ack 形状的结果 { success, id } / { success: false, msg }
+    function saveMessage(socket, user, content, type, { meta, cid } = {}, done = () => {}) {
+        const ts = Date.now();
+        const time = new Date(ts).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        const room = socket.data.room;
+        cid = typeof cid === 'string' && CID_RE.test(cid) ? cid : null;
+
+        // 队列满了说明数据库跟不上，直接拒绝
+        const row = { user, content, time, type, room, ts, meta: meta ? JSON.stringify(meta) : null, cid };
+        const queued = store.messageQueue.push(row, (err, result) => {
+            if (err || !result) return done({ success: false, msg: '消息保存失败' });
+            done({ success: true, id: result.id });
+            // 重发的消息之前已经广播过了
+            if (result.duplicate) return;
+            const cached = { id: result.id, user, content, time, type, ts, meta: row.meta };
+            historyCache.append(room, cached);
+            bus.publish('history append', { room, row: cached });
+            broadcastMessage({ id: result.id, user, text: content, type, time, ts, room, meta, cid });
+        });
+        if (!queued) done({ success: false, msg: '服务器繁忙，消息未发送，请稍后再试' });
+    }
+
+    function broadcastMessage(payload) {
+        const room = payload.room;
+        if (!payload.meta) delete payload.meta;
+        if (!payload.cid) delete payload.cid;
+        io.to(roomKey(room)).emit('chat message', payload);
+
+        // 只统计本进程里的接收者 (集群模式下每个 worker 各算各的)
+        const members = io.of('/').adapter.rooms.get(roomKey(room));
+        const recipients = members ? members.size : 0;
+        fanoutRecipients.observe({}, recipients);
+        fanoutBytes.inc({ event: 'chat message' }, Buffer.byteLength(JSON.stringify(payload)) * recipients);
+    }
 
     function handleCommand(socket, user, cmd) {
         let resultMsg = "";
         if (cmd === '/roll') resultMsg = `🎲 ${user} 掷出了：${Math.floor(Math.random()*100)+1} 点`;
         else if (cmd === '/coin') resultMsg = `🪙 ${user} 抛出了：${Math.random()>0.5?"正面":"反面"}`;
-        else if (cmd === '/help') { socket.emit('system', '指令: /roll, /coin'); return; }
+        else if (cmd === '/help') { socket.emit('system', '指令: /roll, /coin, /search 关键词'); return; }
+        else if (cmd.startsWith('/search')) {
+            // 搜索结果只发给自己
+            return search(cmd.slice('/search'.length)).then(res => {
+                if (res.success) socket.emit('search results', res);
+                else socket.emit('system', '❌ ' + res.msg);
+            });
+        }
         else { socket.emit('system', '❌ 未知指令'); return; }
-        io.emit('system', resultMsg);
+        backpressure.emit(io.to(roomKey(socket.data.room)), 'system', resultMsg);
     }
 
+    // 客户端发现 seq 断号时拉一次全量
+    socket.on('presence sync', (ack) => {
+        if (typeof ack === 'function' && presence.nameOf(socket.id)) presence.snapshot(ack);
+    });
+
     socket.on('disconnect', () => {
-        const name = onlineUsers[socket.id];
+        const name = presence.remove(socket.id);
         if (name) {
-            delete onlineUsers[socket.id];
-            io.emit('system', `${name} 下线了`);
-            io.emit('update user list', Object.values(onlineUsers));
+            backpressure.emit(io.to(roomKey(socket.data.room)), 'system', `${name} 下线了`);
         }
     });
 });
 
 const PORT = process.env.PORT || 3000;
-server.listen(PORT, () => { console.log(`Server running on port ${PORT}`); });
+archive.start();
+// 没有预览的老图片在后台补上，补好一条就更新各 worker 的热缓存
+previews.start((row, meta) => {
+    const json = JSON.stringify(meta);
+    historyCache.update(row.room, row.id, { meta: json });
+    bus.publish('history meta', { room: row.room, id: row.id, meta: json });
+});
+
+if (bus.enabled) bus.acceptConnections(server, io); // 端口由集群主进程监听
+else server.listen(PORT, () => { console.log(`Server running on port ${PORT}`); });
+
+// 退出前把队列里的消息写完 (Render 重新部署时会发 SIGTERM)
+process.on('SIGTERM', () => {
+    server.close();
+    trace.close(() => store.close(() => process.exit(0)));
+});
@@ -0,0 +1,225 @@
+"""极简 Socket.IO 客户端 (Engine.IO v4 + WebSocket 传输)，只用标准库，给 bench.py / replay.py 用。
+
+只实现压测需要的部分：文本帧、事件、ack、心跳。服务器发来的二进制帧直接忽略。
+"""
+import asyncio
+import base64
+import itertools
+import json
+import os
+import struct
+
+
+class ConnectError(Exception):
+    pass
+
+
+class SocketIOClient:
+    def __init__(self, host, port, headers=None):
+        self.host = host
+        self.port = port
+        self.headers = headers or {}
+        self.handlers = {}
+        self.acks = {}
+        self.ack_ids = itertools.count()
+        self.reader = None
+        self.writer = None
+        self.task = None
+        self.closed = asyncio.Event()
+
+    # --- 对外接口 ---
+    def on(self, event, handler):
+        """handler(*args) 在读循环里同步调用，不要在里面做耗时的事。"""
+        self.handlers[event] = handler
+
+    async def connect(self, timeout=10):
+        await asyncio.wait_for(self._handshake(), timeout)
+        self.task = asyncio.create_task(self._read_loop())
+
+    async def emit(self, event, *args):
+        await self._send_text("42" + json.dumps([event, *args], separators=(",", ":")))
+
+    async def call(self, event, *args, timeout=10):
+        """发送事件并等待服务器的 ack，返回 ack 的第一个参数。"""
+        ack_id = next(self.ack_ids)
+        fut = asyncio.get_running_loop().create_future()
+        self.acks[ack_id] = fut
+        try:
+            await self._send_text(f"42{ack_id}" + json.dumps([event, *args], separators=(",", ":")))
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self.acks.pop(ack_id, None)
+
+    def wait_for(self, event, timeout=10):
+        """等下一次收到某个事件 (比如 login_response)，返回第一个参数。"""
+        fut = asyncio.get_running_loop().create_future()
+        prev = self.handlers.get(event)
+
+        def once(*args):
+            if prev:
+                self.handlers[event] = prev
+            else:
+                self.handlers.pop(event, None)
+            if not fut.done():
+                fut.set_result(args[0] if args else None)
+
+        self.handlers[event] = once
+        return asyncio.wait_for(fut, timeout)
+
+    async def close(self):
+        if self.writer and not self.writer.is_closing():
+            try:
+                self.writer.write(self._frame(0x8, b""))
+                await self.writer.drain()
+            except ConnectionError:
+                pass
+            self.writer.close()
+        if self.task:
+            self.task.cancel()
+        self.closed.set()
+
+    # --- 握手 ---
+    async def _handshake(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        lines = [
+            "GET /socket.io/?EIO=4&transport=websocket HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+        ] + [f"{k}: {v}" for k, v in self.headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        if not head.startswith(b"HTTP/1.1 101"):
+            raise ConnectError(head.split(b"\r\n", 1)[0].decode(errors="replace"))
+
+        # Engine.IO 的 open 包，然后连接默认命名空间
+        opcode, payload = await self._read_message()
+        if not payload.startswith(b"0"):
+            raise ConnectError("unexpected engine.io packet: %r" % payload[:40])
+        await self._send_text("40")
+        while True:
+            opcode, payload = await self._read_message()
+            if payload.startswith(b"40"):
+                return
+            if payload.startswith(b"44"):
+                raise ConnectError(payload[2:].decode(errors="replace"))
+
+    # --- 读循环 ---
+    async def _read_loop(self):
+        try:
+            while True:
+                opcode, payload = await self._read_message()
+                if opcode == 0x8:
+                    break
+                if opcode != 0x1:
+                    continue
+                self._dispatch(payload.decode())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for fut in self.acks.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("socket closed"))
+            self.closed.set()
+
+    def _dispatch(self, packet):
+        kind = packet[:1]
+        if kind == "2":  # 服务器心跳
+            asyncio.create_task(self._send_text("3"))
+            return
+        if kind != "4":
+            return
+        body = packet[1:]
+        sio_type = body[:1]
+        rest = body[1:]
+        # 可能带 ack id：42<id>[...] / 43<id>[...]
+        i = 0
+        while i < len(rest) and rest[i].isdigit():
+            i += 1
+        ack_id = int(rest[:i]) if i else None
+        data = json.loads(rest[i:]) if rest[i:] else []
+
+        if sio_type == "2" and data:
+            handler = self.handlers.get(data[0])
+            if handler:
+                handler(*data[1:])
+        elif sio_type == "3" and ack_id is not None:
+            fut = self.acks.get(ack_id)
+            if fut and not fut.done():
+                fut.set_result(data[0] if data else None)
+
+    # --- WebSocket 帧 ---
+    async def _read_message(self):
+        chunks = []
+        first_opcode = None
+        while True:
+            b1, b2 = await self.reader.readexactly(2)
+            fin = b1 & 0x80
+            opcode = b1 & 0x0F
+            length = b2 & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            mask = await self.reader.readexactly(4) if b2 & 0x80 else None
+            data = await self.reader.readexactly(length)
+            if mask:
+                data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+
+            if opcode == 0x9:  # ping
+                self.writer.write(self._frame(0xA, data))
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode != 0x0:
+                first_opcode = opcode
+            chunks.append(data)
+            if fin:
+                return first_opcode, b"".join(chunks)
+
+    async def _send_text(self, text):
+        self.writer.write(self._frame(0x1, text.encode()))
+        await self.writer.drain()
+
+    @staticmethod
+    def _frame(opcode, data):
+        # 客户端发出的帧必须加掩码
+        head = bytes([0x80 | opcode])
+        n = len(data)
+        if n < 126:
+            head += bytes([0x80 | n])
+        elif n < 65536:
+            head += bytes([0x80 | 126]) + struct.pack("!H", n)
+        else:
+            head += bytes([0x80 | 127]) + struct.pack("!Q", n)
+        mask = os.urandom(4)
+        if n:
+            masked = (int.from_bytes(data, "big") ^ int.from_bytes((mask * (n // 4 + 1))[:n], "big")).to_bytes(n, "big")
+        else:
+            masked = b""
+        return head + mask + masked
+
+
+async def http_request(host, port, method, path, body=b"", headers=None, timeout=30):
+    """发一个 HTTP/1.1 请求 (Connection: close)，返回 (status, headers, body)。"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close", f"Content-Length: {len(body)}"]
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode(errors="replace").split("\r\n")
+    resp_headers = {}
+    for line in header_lines:
+        k, _, v = line.partition(":")
+        resp_headers[k.strip().lower()] = v.strip()
+    return int(status_line.split()[1]), resp_headers, payload
@@ -0,0 +1,142 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const zlib = require('zlib');
+
+const DAY = 24 * 3600 * 1000;
+const STORE = require.resolve('../lib/store');
+const ARCHIVE = require.resolve('../lib/archive');
+
+// 内存里的 messages 表，实现 archive.js 用到的那几个存储接口 (语义同 ../lib/storage/*.js：没有 ts 的老消息先归档)
+function memoryStore(rows) {
+    const table = new Map(rows.map(r => [r.id, { ...r }]));
+    const fake = {
+        table,
+        deletes: 0,
+        failDelete: 0, // 接下来几次 deleteMessages 失败，模拟段写好了但还没删掉就崩溃
+        async expiredMessages(cutoff, limit) {
+            const all = [...table.values()];
+            const legacy = all.filter(r => r.ts == null).sort((a, b) => a.id - b.id);
+            if (legacy.length) return legacy.slice(0, limit).map(r => ({ ...r }));
+            return all.filter(r => r.ts < cutoff).sort((a, b) => a.ts - b.ts).slice(0, limit).map(r => ({ ...r }));
+        },
+        async deleteMessages(ids) {
+            if (fake.failDelete > 0) {
+                fake.failDelete--;
+                throw new Error('crashed');
+            }
+            fake.deletes++;
+            ids.forEach(id => table.delete(id));
+        },
+        async reclaimSpace() {}
+    };
+    return fake;
+}
+
+// archive.js 加载时读环境变量、require('./store')；每个用例用自己的目录和假存储重新加载
+function load(t, store, env = {}) {
+    const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'archive-test-'));
+    t.after(() => fs.rmSync(dir, { recursive: true, force: true }));
+    t.mock.method(console, 'log', () => {});
+    t.mock.method(console, 'error', () => {});
+    Object.assign(process.env, { ARCHIVE_DIR: dir, RETENTION_DAYS: '30', ARCHIVE_BATCH: '2000' }, env);
+    require.cache[STORE] = { id: STORE, filename: STORE, loaded: true, exports: store };
+    delete require.cache[ARCHIVE];
+    try {
+        return { archive: require(ARCHIVE), dir };
+    } finally {
+        delete require.cache[STORE];
+        delete require.cache[ARCHIVE];
+        for (const k of ['ARCHIVE_DIR', 'RETENTION_DAYS', 'ARCHIVE_BATCH']) delete process.env[k];
+    }
+}
+
+function readIndex(dir) {
+    return fs.readFileSync(path.join(dir, 'index.jsonl'), 'utf8').split('\n').filter(Boolean).map(line => JSON.parse(line));
+}
+
+// id 1..n，交替两个房间；前 old 条已经过期
+function messages(n, old) {
+    const now = Date.now();
+    return Array.from({ length: n }, (_, i) => ({
+        id: i + 1, user: 'u', content: 'm' + (i + 1), time: '', type: 'text',
+        room: i % 2 ? 'b' : 'a', ts: i < old ? now - 40 * DAY + i : now - DAY + i, meta: null
+    }));
+}
+
+test('过期消息写进压缩段并从表里删掉，没过期的留着', async t => {
+    const store = memoryStore(messages(10, 6));
+    const { archive, dir } = load(t, store);
+    await archive.runOnce();
+
+    assert.deepStrictEqual([...store.table.keys()], [7, 8, 9, 10]);
+    const index = readIndex(dir);
+    assert.strictEqual(index.length, 1);
+    const { file, minId, maxId, rooms, count } = index[0];
+    assert.deepStrictEqual({ minId, maxId, rooms, count }, { minId: 1, maxId: 6, rooms: ['a', 'b'], count: 6 });
+    const rows = zlib.gunzipSync(fs.readFileSync(path.join(dir, file))).toString().split('\n').filter(Boolean).map(JSON.parse);
+    assert.deepStrictEqual(rows.map(r => r.id), [1, 2, 3, 4, 5, 6]);
+    assert.deepStrictEqual(fs.readdirSync(dir).filter(f => f.endsWith('.tmp')), []);
+});
+
+test('RETENTION_DAYS 没配就不归档', async t => {
+    const store = memoryStore(messages(4, 4));
+    const { archive, dir } = load(t, store, { RETENTION_DAYS: '' });
+    await archive.runOnce();
+    assert.strictEqual(store.table.size, 4);
+    assert.ok(!fs.existsSync(path.join(dir, 'index.jsonl')));
+});
+
+test('分批归档，read 按 id 倒序分页、只返回这个房间的', async t => {
+    const store = memoryStore(messages(20, 20));
+    const { archive, dir } = load(t, store, { ARCHIVE_BATCH: '3' });
+    await archive.runOnce();
+    assert.strictEqual(store.table.size, 0);
+    assert.strictEqual(readIndex(dir).length, 7);
+
+    const page1 = await archive.read('a', 0, 4);
+    assert.deepStrictEqual(page1.map(r => r.id), [19, 17, 15, 13]);
+    const page2 = await archive.read('a', page1[page1.length - 1].id, 4);
+    assert.deepStrictEqual(page2.map(r => r.id), [11, 9, 7, 5]);
+    const last = await archive.read('a', 5, 4);
+    assert.deepStrictEqual(last.map(r => r.id), [3, 1]);
+    assert.deepStrictEqual((await archive.read('b', 0, 100)).map(r => r.id), [20, 18, 16, 14, 12, 10, 8, 6, 4, 2]);
+    assert.deepStrictEqual(await archive.read('nobody', 0, 10), []);
+});
+
+test('段写完、删除前崩溃：下次重复归档，read 按 id 去重', async t => {
+    const store = memoryStore(messages(10, 6));
+    const { archive, dir } = load(t, store, { ARCHIVE_BATCH: '4' });
+
+    store.failDelete = 1;
+    await archive.runOnce(); // 第一段写好了，删除失败，这一轮中止
+    assert.strictEqual(store.table.size, 10);
+
+    // 崩溃期间又有消息过期：重跑时同样的行和新过期的行一起进了不同的段
+    for (const r of store.table.values()) if (r.id <= 8) r.ts = Date.now() - 40 * DAY + r.id;
+    await archive.runOnce();
+    assert.deepStrictEqual([...store.table.keys()], [9, 10]);
+    assert.ok(readIndex(dir).length >= 3);
+
+    const all = [...await archive.read('a', 0, 100), ...await archive.read('b', 0, 100)].map(r => r.id).sort((x, y) => x - y);
+    assert.deepStrictEqual(all, [1, 2, 3, 4, 5, 6, 7, 8]);
+    assert.deepStrictEqual((await archive.read('a', 0, 2)).map(r => r.id), [7, 5]);
+});
+
+test('没有 ts 的老消息先归档，段文件名不会出现 undefined', async t => {
+    const rows = messages(6, 0);
+    rows[0].ts = null;
+    rows[1].ts = null;
+    const store = memoryStore(rows);
+    const { archive, dir } = load(t, store, { ARCHIVE_BATCH: '10' });
+    await archive.runOnce();
+
+    assert.deepStrictEqual([...store.table.keys()], [3, 4, 5, 6]);
+    const index = readIndex(dir);
+    assert.strictEqual(index.length, 1);
+    assert.match(index[0].file, /^seg-0-1-2\.jsonl\.gz$/);
+    assert.deepStrictEqual((await archive.read('a', 0, 10)).map(r => r.id), [1]);
+    assert.deepStrictEqual((await archive.read('b', 0, 10)).map(r => r.id), [2]);
+});
@@ -0,0 +1,36 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const { claimIds } = require('../lib/storage/batch-ids');
+
+test('全部插入：id 按批内顺序分配，和 RETURNING 的顺序无关', () => {
+    const rows = [{ user: 'a', cid: 'x' }, { user: 'b' }, { user: 'a', cid: 'y' }];
+    const inserted = [{ id: 12, user: 'a', cid: 'y' }, { id: 10, user: 'a', cid: 'x' }, { id: 11, user: 'b', cid: null }];
+    assert.deepStrictEqual(claimIds(rows, inserted), {
+        results: [{ id: 10, duplicate: false }, { id: 11, duplicate: false }, { id: 12, duplicate: false }],
+        dups: []
+    });
+});
+
+test('冲突跳过的行进 dups，后面的行照样拿到自己的 id', () => {
+    const rows = [{ user: 'a', cid: 'old' }, { user: 'a', cid: 'new' }, { user: 'b' }];
+    const inserted = [{ id: 21, user: 'b', cid: null }, { id: 20, user: 'a', cid: 'new' }];
+    const { results, dups } = claimIds(rows, inserted);
+    assert.deepStrictEqual(dups, [0]);
+    assert.deepStrictEqual(results, [null, { id: 20, duplicate: false }, { id: 21, duplicate: false }]);
+});
+
+test('同一批里重复的 cid 只有第一条算插入', () => {
+    const rows = [{ user: 'a', cid: 'x' }, { user: 'a', cid: 'x' }, { user: 'b', cid: 'x' }];
+    const inserted = [{ id: 5, user: 'a', cid: 'x' }, { id: 6, user: 'b', cid: 'x' }];
+    const { results, dups } = claimIds(rows, inserted);
+    assert.deepStrictEqual(dups, [1]);
+    assert.deepStrictEqual(results, [{ id: 5, duplicate: false }, null, { id: 6, duplicate: false }]);
+});
+
+test('用户名里带换行也不会和别人的 cid 混淆', () => {
+    const rows = [{ user: 'a\nb', cid: 'c' }, { user: 'a', cid: 'b\nc' }];
+    const inserted = [{ id: 1, user: 'a', cid: 'b\nc' }];
+    const { results, dups } = claimIds(rows, inserted);
+    assert.deepStrictEqual(dups, [0]);
+    assert.deepStrictEqual(results[1], { id: 1, duplicate: false });
+});
@@ -0,0 +1,81 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const vm = require('vm');
+const { spawnSync } = require('child_process');
+
+// build.py 的 JS 压缩器是手写的：把真实的前端文件压一遍，确认压出来的还是合法的 JS，行为也没变
+const ROOT = path.join(__dirname, '..');
+const python = spawnSync('python3', ['--version']).status === 0;
+
+function minify(kind, text) {
+    const res = spawnSync('python3', ['-c', `import sys; sys.path.insert(0, sys.argv[1]); import build; sys.stdout.write(build.minify_${kind}(sys.stdin.read()))`, ROOT], {
+        input: text,
+        encoding: 'utf8',
+        env: { ...process.env, PYTHONDONTWRITEBYTECODE: '1', PYTHONIOENCODING: 'utf-8' }
+    });
+    assert.strictEqual(res.status, 0, res.stderr);
+    return res.stdout;
+}
+
+test('public/*.js 压缩后 node --check 通过，而且确实变小了', { skip: !python && 'no python3' }, () => {
+    const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'build-'));
+    try {
+        const files = fs.readdirSync(path.join(ROOT, 'public')).filter(f => f.endsWith('.js'));
+        assert.ok(files.length > 0);
+        for (const file of files) {
+            const source = fs.readFileSync(path.join(ROOT, 'public', file), 'utf8');
+            const out = minify('js', source);
+            assert.ok(out.length < source.length, file);
+            const dest = path.join(dir, file);
+            fs.writeFileSync(dest, out);
+            const check = spawnSync(process.execPath, ['--check', dest], { encoding: 'utf8' });
+            assert.strictEqual(check.status, 0, `${file}: ${check.stderr}`);
+        }
+    } finally {
+        fs.rmSync(dir, { recursive: true, force: true });
+    }
+});
+
+test('容易压坏的写法：压缩前后求值结果一样', { skip: !python && 'no python3' }, () => {
+    const cases = [
+        // 正则和除号
+        'var a = 10, g = 2; [a / 2 / g, "x/y".replace(/\\//g, "|"), /[/]/.test("/")]',
+        'var s = "a"; (function () { return /b/.test(s) })()',
+        // 模板字符串，里面还有嵌套的模板和注释样子的文本
+        'var n = 3; `n = ${n > 2 ? `big ${n}` : "small"} // not a comment /* nor this */`',
+        // 字符串里的注释和 URL
+        '["http://example.com", "/* keep */", \'it\\\'s\'].join(" ")',
+        // 自动分号插入：return 后换行、换行后的 ++
+        '(function () { var x = 1\nvar y = x\n++y\nreturn [x, y] })()',
+        '(function () { return\n42 })()',
+        // 关键字和标识符之间的空格
+        'var t = typeof "s"; var inst = [] instanceof Array; [t, inst, void 0 === undefined]',
+        'var i = 0, out = []; for (let k of [1, 2]) out.push(k + i++); out',
+        // a + +b、a - -b 不能被合成 ++/--
+        'var a = 1, b = 2; [a + +b, a - -b, a+ ++b]',
+        // 箭头函数返回对象、可选链、空值合并
+        '((o) => ({ v: o?.x ?? "none" }))({}).v',
+        // 行注释和块注释
+        'var z = 1; // comment\n/* block\n comment */ z += 1; z'
+    ];
+    // 每次求值都在新的 context 里，数组原型不是同一个，按 JSON 比
+    const result = js => JSON.stringify(vm.runInNewContext(js));
+    for (const code of cases) {
+        const out = minify('js', code);
+        assert.strictEqual(result(out), result(code), `${JSON.stringify(code)} -> ${JSON.stringify(out)}`);
+    }
+});
+
+test('index.html 里的内联脚本压缩后仍然合法', { skip: !python && 'no python3' }, () => {
+    const html = fs.readFileSync(path.join(ROOT, 'index.html'), 'utf8');
+    const out = minify('html', html);
+    assert.ok(out.length < html.length);
+    for (const [, body] of out.matchAll(/<script>([\s\S]*?)<\/script>/g)) {
+        assert.doesNotThrow(() => new vm.Script(body));
+    }
+    // 外链脚本一个都不能丢
+    assert.deepStrictEqual(out.match(/<script src="[^"]+"><\/script>/g), html.match(/<script src="[^"]+"><\/script>/g));
+});
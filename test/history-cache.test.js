@@ -0,0 +1,143 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const HistoryCache = require('../lib/history-cache');
+
+const row = (id, type = 'text') => ({ id, user: 'u', content: type === 'image' ? '/attachments/' + 'a'.repeat(64) + '.png' : 'msg ' + id, time: '12:00', type, ts: id, meta: null });
+
+// 假的数据库：和真的一样每次返回新的行对象，记录被查了几次
+function fakeLoad(rooms) {
+    const calls = { seed: 0, fetch: 0 };
+    return {
+        calls,
+        seed: async (room, n) => { calls.seed++; return (rooms[room] || []).slice(-n).reverse().map(r => ({ ...r })); },
+        fetch: async (ids) => { calls.fetch++; return Object.values(rooms).flat().filter(r => ids.includes(r.id)).map(r => ({ ...r })); }
+    };
+}
+
+const range = (from, to, type) => Array.from({ length: to - from + 1 }, (_, i) => row(from + i, type));
+const ids = rows => rows && rows.map(r => r.id);
+
+test('第一页从种子里取，之后不再查库', async () => {
+    const load = fakeLoad({ a: range(1, 100) });
+    const cache = new HistoryCache(load, { perRoom: 50 });
+    assert.deepStrictEqual(ids(await cache.page('a', 0, 3)), [100, 99, 98]);
+    assert.deepStrictEqual(ids(await cache.page('a', 98, 3)), [97, 96, 95]);
+    assert.strictEqual(load.calls.seed, 1);
+});
+
+test('窗口边界：刚好够、差一行、游标在窗口外', async () => {
+    const cache = new HistoryCache(fakeLoad({ a: range(1, 100) }), { perRoom: 10 }); // 窗口是 91..100
+    assert.deepStrictEqual(ids(await cache.page('a', 0, 10)), range(91, 100).map(r => r.id).reverse());
+    assert.strictEqual(await cache.page('a', 0, 11), null);
+    assert.deepStrictEqual(ids(await cache.page('a', 95, 4)), [94, 93, 92, 91]);
+    assert.strictEqual(await cache.page('a', 95, 5), null);
+    assert.strictEqual(await cache.page('a', 91, 1), null); // 游标是窗口里最旧的
+    assert.strictEqual(await cache.page('a', 50, 1), null);
+});
+
+test('房间消息不满一页时交给调用方查库 (可能还有归档)', async () => {
+    const cache = new HistoryCache(fakeLoad({ a: range(1, 3) }), { perRoom: 10 });
+    assert.strictEqual(await cache.page('a', 0, 4), null);
+    assert.deepStrictEqual(ids(await cache.page('a', 0, 3)), [3, 2, 1]);
+});
+
+test('append：按 id 插入、去重、窗口满了丢最旧的、没看过的房间不缓存', async () => {
+    const cache = new HistoryCache(fakeLoad({ a: range(1, 10) }), { perRoom: 10 });
+    cache.append('b', row(1));
+    assert.strictEqual(cache.rooms.has('b'), false);
+
+    await cache.page('a', 0, 1);
+    cache.append('a', row(12));
+    cache.append('a', row(11)); // 别的 worker 的消息晚到
+    cache.append('a', row(12));
+    cache.append('a', row(1)); // 比窗口还旧
+    assert.deepStrictEqual(ids(cache.rooms.get('a').rows), range(3, 12).map(r => r.id));
+});
+
+test('种子查询期间到的消息不丢也不重复', async () => {
+    let release;
+    const load = {
+        seed: () => new Promise(resolve => { release = () => resolve(range(1, 5).reverse()); }),
+        fetch: async () => []
+    };
+    const cache = new HistoryCache(load, { perRoom: 10 });
+    const pending = cache.page('a', 0, 6);
+    cache.append('a', row(5)); // 查询也查到了
+    cache.append('a', row(6)); // 查询之后才提交
+    release();
+    assert.deepStrictEqual(ids(await pending), [6, 5, 4, 3, 2, 1]);
+});
+
+test('种子查询失败：不留半截状态，下次重新查', async () => {
+    let fail = true;
+    const load = {
+        seed: async () => { if (fail) throw new Error('db down'); return range(1, 5).reverse(); },
+        fetch: async () => []
+    };
+    const cache = new HistoryCache(load, { perRoom: 10 });
+    await assert.rejects(cache.page('a', 0, 1), /db down/);
+    assert.strictEqual(cache.rooms.has('a'), false);
+    fail = false;
+    assert.deepStrictEqual(ids(await cache.page('a', 0, 1)), [5]);
+});
+
+test('字节上限：先剥图片内容 (翻页时回库补齐)，再砍最久没访问的房间', async () => {
+    const rooms = { a: range(1, 20, 'image'), b: range(21, 40), c: range(41, 60) };
+    const load = fakeLoad(rooms);
+    const cache = new HistoryCache(load, { perRoom: 20, maxBytes: 1e9 });
+    await cache.page('a', 0, 1);
+    await cache.page('b', 0, 1);
+    await cache.page('c', 0, 1);
+    const full = cache.bytes;
+
+    // 只剥图片就够了
+    cache.maxBytes = full - 1000;
+    cache.enforce();
+    assert.ok(cache.bytes <= cache.maxBytes);
+    const stripped = cache.rooms.get('a').rows.filter(r => r.stripped);
+    assert.ok(stripped.length > 0 && stripped.every(r => r.content === null));
+    assert.strictEqual(cache.rooms.get('b').rows.length, 20);
+
+    // 剥掉的行翻页时按 id 回库补齐，返回的内容是完整的
+    const page = await cache.page('a', 0, 20);
+    assert.ok(page.every(r => r.content && !r.stripped));
+    assert.strictEqual(load.calls.fetch, 1);
+
+    // 再收紧：a 刚被访问过，最久没访问的是 b，先砍 b 最旧的行
+    cache.maxBytes = Math.floor(cache.bytes * 0.6);
+    cache.enforce();
+    assert.ok(cache.bytes <= cache.maxBytes);
+    assert.ok(!cache.rooms.has('b') || cache.rooms.get('b').rows.length < 20);
+    assert.strictEqual(cache.rooms.get('a').rows.length, 20);
+    // 剩下的仍然是连续的最新一段
+    for (const entry of cache.rooms.values()) {
+        const list = ids(entry.rows);
+        list.forEach((id, i) => i && assert.strictEqual(id, list[i - 1] + 1));
+    }
+
+    // bytes 的账和逐行重算的一致
+    let recount = 0;
+    for (const entry of cache.rooms.values()) entry.rows.forEach(r => { recount += 120 + 2 * ((r.content || '').length + (r.meta || '').length + r.user.length + r.time.length); });
+    assert.strictEqual(cache.bytes, recount);
+});
+
+test('update 补字段并重新计算字节', async () => {
+    const cache = new HistoryCache(fakeLoad({ a: range(1, 5, 'image') }), { perRoom: 10 });
+    await cache.page('a', 0, 1);
+    const before = cache.bytes;
+    cache.update('a', 3, { meta: '{"width":10,"height":10}' });
+    assert.strictEqual(cache.rooms.get('a').rows[2].meta, '{"width":10,"height":10}');
+    assert.strictEqual(cache.bytes, before + 2 * 24);
+    cache.update('a', 99, { meta: 'x' }); // 不在窗口里
+    cache.update('b', 1, { meta: 'x' }); // 没缓存的房间
+    assert.strictEqual(cache.bytes, before + 2 * 24);
+});
+
+test('关掉时不查库、不缓存', async () => {
+    const load = fakeLoad({ a: range(1, 10) });
+    const cache = new HistoryCache(load, { enabled: false });
+    assert.strictEqual(await cache.page('a', 0, 1), null);
+    cache.append('a', row(11));
+    assert.strictEqual(load.calls.seed, 0);
+    assert.strictEqual(cache.rooms.size, 0);
+});
@@ -0,0 +1,201 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const path = require('path');
+const zlib = require('zlib');
+const codec = require('../lib/image-codec');
+
+const fixture = name => fs.readFileSync(path.join(__dirname, 'fixtures', name));
+
+// 两张同尺寸图像 RGB 的平均绝对误差
+function meanError(a, b) {
+    assert.strictEqual(a.width, b.width);
+    assert.strictEqual(a.height, b.height);
+    let sum = 0;
+    for (let i = 0; i < a.data.length; i += 4) {
+        sum += Math.abs(a.data[i] - b.data[i]) + Math.abs(a.data[i + 1] - b.data[i + 1]) + Math.abs(a.data[i + 2] - b.data[i + 2]);
+    }
+    return sum / (a.width * a.height * 3);
+}
+
+// 手工拼一个 PNG：IHDR 可以写任意尺寸，idat 是压缩前的数据
+function png(width, height, idat, color = 2) {
+    const chunk = (type, body) => {
+        const len = Buffer.alloc(4);
+        len.writeUInt32BE(body.length);
+        return Buffer.concat([len, Buffer.from(type, 'latin1'), body, Buffer.alloc(4)]);
+    };
+    const ihdr = Buffer.alloc(13);
+    ihdr.writeUInt32BE(width, 0);
+    ihdr.writeUInt32BE(height, 4);
+    ihdr[8] = 8;
+    ihdr[9] = color;
+    return Buffer.concat([
+        Buffer.from([0x89, 0x50, 0x4e, 0x47, 0x0d, 0x0a, 0x1a, 0x0a]),
+        chunk('IHDR', ihdr), chunk('IDAT', zlib.deflateSync(idat)), chunk('IEND', Buffer.alloc(0))
+    ]);
+}
+
+function image(width, height, fill) {
+    const data = new Uint8Array(width * height * 4);
+    for (let y = 0; y < height; y++) {
+        for (let x = 0; x < width; x++) data.set(fill(x, y), (y * width + x) * 4);
+    }
+    return { width, height, data };
+}
+
+const reference = codec.decode(fixture('video-001.png'));
+
+test('PNG 解码出基准尺寸', () => {
+    assert.deepStrictEqual([reference.width, reference.height], [150, 103]);
+    assert.strictEqual(codec.hasAlpha(reference), false);
+});
+
+test('JPEG / GIF 解码和 PNG 基准一致', () => {
+    // JPEG 是有损的，GIF 是 256 色，只要求平均误差在各自的量化误差以内
+    // (q50 那张 Go 标准库解出来和基准的平均误差也有 6.5)
+    const cases = {
+        'video-001.jpeg': 1,
+        'video-001.progressive.jpeg': 1,
+        'video-001.q50.420.jpeg': 7.5,
+        'video-001.gif': 4,
+        'video-001.interlaced.gif': 4
+    };
+    for (const [name, tolerance] of Object.entries(cases)) {
+        const img = codec.decode(fixture(name));
+        assert.ok(meanError(img, reference) < tolerance, name);
+    }
+});
+
+test('baseline 和 progressive JPEG 解出来几乎一样', () => {
+    const a = codec.decode(fixture('video-001.jpeg'));
+    const b = codec.decode(fixture('video-001.progressive.jpeg'));
+    assert.ok(meanError(a, b) < 1);
+});
+
+test('灰度 JPEG 解成 R=G=B', () => {
+    const img = codec.decode(fixture('video-005.gray.jpeg'));
+    for (let i = 0; i < img.data.length; i += 4) {
+        assert.ok(img.data[i] === img.data[i + 1] && img.data[i] === img.data[i + 2]);
+    }
+});
+
+test('PNG 调色板、alpha、Adam7 隔行', () => {
+    const palette = codec.decode(fixture('basn3p08.png'));
+    assert.deepStrictEqual([palette.width, palette.height], [32, 32]);
+    assert.strictEqual(codec.hasAlpha(palette), false);
+    assert.strictEqual(codec.hasAlpha(codec.decode(fixture('basn6a08.png'))), true);
+    assert.deepStrictEqual(codec.decode(fixture('gray-gradient.interlaced.png')), codec.decode(fixture('gray-gradient.png')));
+});
+
+test('JPEG 只需要小图时按 1/8 解码', () => {
+    const img = codec.decode(fixture('video-001.jpeg'), 16);
+    assert.deepStrictEqual([img.width, img.height], [19, 13]);
+    assert.ok(meanError(img, codec.scale(reference, 19)) < 8);
+});
+
+test('截断的 progressive JPEG 照样解出整张图', () => {
+    const img = codec.decode(fixture('video-001.progressive.truncated.jpeg'));
+    assert.deepStrictEqual([img.width, img.height], [150, 103]);
+});
+
+test('截断在任何位置都只会抛 Error 或返回完整尺寸的图', () => {
+    for (const name of fs.readdirSync(path.join(__dirname, 'fixtures')).filter(f => /\.(png|jpeg|gif)$/.test(f))) {
+        const buf = fixture(name);
+        for (let n = 0; n < buf.length; n += Math.max(1, buf.length >> 5)) {
+            let img;
+            try {
+                img = codec.decode(buf.subarray(0, n));
+            } catch (err) {
+                assert.ok(err instanceof Error, `${name} 截到 ${n}`);
+                continue;
+            }
+            if (img) assert.strictEqual(img.data.length, img.width * img.height * 4, `${name} 截到 ${n}`);
+        }
+    }
+});
+
+test('坏数据抛错', () => {
+    assert.throws(() => codec.decode(fixture('invalid-zlib.png')));
+    // IDAT 解压出来的数据比尺寸要求的少
+    assert.throws(() => codec.decode(png(64, 64, Buffer.alloc(100))), /truncated/);
+    // 不认识的格式、太短的文件不抛错，返回 null
+    assert.strictEqual(codec.decode(Buffer.from('not an image at all, just some text')), null);
+    assert.strictEqual(codec.decode(Buffer.alloc(10)), null);
+    assert.strictEqual(codec.dimensions(Buffer.alloc(100)), null);
+    // 随机字节改坏 JPEG 的熵编码段
+    const jpeg = Buffer.from(fixture('video-001.jpeg'));
+    for (let i = 1000; i < jpeg.length - 2; i += 97) jpeg[i] = (jpeg[i] * 31 + 7) & 0xff;
+    try {
+        codec.decode(jpeg);
+    } catch (err) {
+        assert.ok(err instanceof Error);
+    }
+});
+
+test('超大尺寸：能读出尺寸，但不解码', () => {
+    const huge = png(100000, 100000, Buffer.alloc(10));
+    assert.deepStrictEqual(codec.dimensions(huge), { width: 100000, height: 100000 });
+    assert.throws(() => codec.decode(huge), /too large/);
+
+    // JPEG 的 SOF 改成 65535x65535
+    const jpeg = Buffer.from(fixture('video-001.jpeg'));
+    const sof = jpeg.indexOf(Buffer.from([0xff, 0xc0]));
+    jpeg.writeUInt16BE(65535, sof + 5);
+    jpeg.writeUInt16BE(65535, sof + 7);
+    assert.deepStrictEqual(codec.dimensions(jpeg), { width: 65535, height: 65535 });
+    assert.throws(() => codec.decode(jpeg), /too large/);
+
+    // GIF 逻辑屏幕和帧都改成 65535x65535
+    const gif = Buffer.from(fixture('video-001.gif'));
+    gif.writeUInt16LE(65535, 6);
+    gif.writeUInt16LE(65535, 8);
+    assert.deepStrictEqual(codec.dimensions(gif), { width: 65535, height: 65535 });
+    assert.throws(() => codec.decode(gif));
+});
+
+test('解压炸弹：声明的尺寸很小，IDAT 解压出来很大', () => {
+    const bomb = png(10, 10, Buffer.alloc(64 * 1024 * 1024));
+    assert.ok(bomb.length < 200 * 1024);
+    assert.throws(() => codec.decode(bomb));
+});
+
+test('WebP / AVIF 只读尺寸', () => {
+    // VP8L 头：14 位宽-1、14 位高-1
+    const webp = Buffer.alloc(30);
+    webp.write('RIFF', 0, 'latin1');
+    webp.write('WEBPVP8L', 8, 'latin1');
+    webp[20] = 0x2f;
+    webp.writeUInt32LE((640 - 1) | ((480 - 1) << 14), 21);
+    assert.deepStrictEqual(codec.dimensions(webp), { width: 640, height: 480 });
+    assert.strictEqual(codec.decode(webp), null);
+});
+
+test('缩放按 alpha 加权，透明像素的颜色不渗进来', () => {
+    const img = image(2, 1, x => x ? [0, 0, 0, 0] : [200, 100, 50, 255]);
+    const out = codec.scale(img, 1);
+    assert.deepStrictEqual(Array.from(out.data), [200, 100, 50, 128]);
+    assert.strictEqual(codec.scale(reference, 1000), reference);
+    const thumb = codec.scale(reference, 32);
+    assert.deepStrictEqual([thumb.width, thumb.height], [32, 22]);
+});
+
+test('PNG 编码往返无损', () => {
+    const img = image(7, 5, (x, y) => [x * 30, y * 50, (x * y) & 0xff, x === 3 ? 100 : 255]);
+    assert.deepStrictEqual(codec.decode(codec.encodePng(img, true)), img);
+    // 不带 alpha 编码时透明度丢掉，颜色不变
+    const opaque = codec.decode(codec.encodePng(reference, false));
+    assert.strictEqual(meanError(opaque, reference), 0);
+});
+
+test('JPEG 编码往返误差在质量范围内', () => {
+    const high = codec.encodeJpeg(reference, 90);
+    const low = codec.encodeJpeg(reference, 30);
+    assert.ok(low.length < high.length);
+    assert.deepStrictEqual(codec.dimensions(high), { width: 150, height: 103 });
+    assert.ok(meanError(codec.decode(high), reference) < 4);
+    assert.ok(meanError(codec.decode(low), reference) < 10);
+    // 奇数尺寸、1x1 也要能编
+    const tiny = codec.decode(codec.encodeJpeg(image(1, 1, () => [255, 0, 0, 255]), 90));
+    assert.ok(tiny.data[0] > 200 && tiny.data[1] < 50 && tiny.data[2] < 50);
+});
@@ -0,0 +1,109 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const crypto = require('crypto');
+const os = require('os');
+const path = require('path');
+
+const MODULE = require.resolve('../lib/session');
+
+// session.js 在加载时读环境变量、定密钥，每个用例按自己的环境重新加载一份
+function load(env) {
+    const saved = {};
+    for (const k of Object.keys(env)) {
+        saved[k] = process.env[k];
+        if (env[k] === undefined) delete process.env[k];
+        else process.env[k] = env[k];
+    }
+    delete require.cache[MODULE];
+    try {
+        return require(MODULE);
+    } finally {
+        for (const k of Object.keys(saved)) {
+            if (saved[k] === undefined) delete process.env[k];
+            else process.env[k] = saved[k];
+        }
+    }
+}
+
+const SECRET = 'a'.repeat(64);
+const withSecret = (extra = {}) => load({ SESSION_SECRET: SECRET, SESSION_TTL_DAYS: undefined, ...extra });
+
+function withClock(now, fn) {
+    const real = Date.now;
+    Date.now = () => now;
+    try {
+        return fn();
+    } finally {
+        Date.now = real;
+    }
+}
+
+test('签发的令牌能验证回用户名', () => {
+    const session = withSecret();
+    assert.strictEqual(session.verify(session.issue('小明')), '小明');
+});
+
+test('正文或签名被改过的令牌不认', () => {
+    const session = withSecret();
+    const token = session.issue('alice');
+    const [body, mac] = token.split('.');
+    const forged = Buffer.from(JSON.stringify({ u: 'admin', exp: Date.now() + 1e9 })).toString('base64url');
+    assert.strictEqual(session.verify(forged + '.' + mac), null);
+    assert.strictEqual(session.verify(body + '.' + (mac[0] === 'A' ? 'B' : 'A') + mac.slice(1)), null);
+    assert.strictEqual(session.verify(body + '.' + mac.slice(1)), null);
+    assert.strictEqual(session.verify(body + '.'), null);
+});
+
+test('换了密钥以前的令牌全部失效', () => {
+    const token = withSecret().issue('alice');
+    assert.strictEqual(load({ SESSION_SECRET: 'b'.repeat(64) }).verify(token), null);
+});
+
+test('格式不对的输入返回 null，不抛错', () => {
+    const session = withSecret();
+    for (const bad of [undefined, null, 42, {}, '', 'no-dot', '.abc', 'x'.repeat(600) + '.' + 'y', '%%%.%%%']) {
+        assert.strictEqual(session.verify(bad), null, JSON.stringify(bad));
+    }
+});
+
+test('签名对但正文不是合法 JSON 或缺字段也返回 null', () => {
+    const session = withSecret();
+    // issue 只签合法的正文，这里用同一个密钥直接签任意正文
+    const sign = body => body + '.' + crypto.createHmac('sha256', Buffer.from(SECRET)).update(body).digest('base64url');
+    assert.strictEqual(session.verify(sign(Buffer.from('not json').toString('base64url'))), null);
+    assert.strictEqual(session.verify(sign(Buffer.from('{"u":1,"exp":9e15}').toString('base64url'))), null);
+    assert.strictEqual(session.verify(sign(Buffer.from('{"u":"a"}').toString('base64url'))), null);
+    assert.strictEqual(session.verify(sign(Buffer.from('{"u":"a","exp":9e15}').toString('base64url'))), 'a');
+});
+
+test('过了 SESSION_TTL_DAYS 天令牌过期', () => {
+    const session = withSecret({ SESSION_TTL_DAYS: '2' });
+    const day = 24 * 3600 * 1000;
+    const t0 = 1700000000000;
+    const token = withClock(t0, () => session.issue('alice'));
+    assert.strictEqual(withClock(t0 + 2 * day - 1, () => session.verify(token)), 'alice');
+    assert.strictEqual(withClock(t0 + 2 * day, () => session.verify(token)), null);
+});
+
+test('默认有效期 7 天', () => {
+    const session = withSecret();
+    const day = 24 * 3600 * 1000;
+    const token = withClock(0, () => session.issue('alice'));
+    assert.strictEqual(withClock(7 * day - 1, () => session.verify(token)), 'alice');
+    assert.strictEqual(withClock(7 * day, () => session.verify(token)), null);
+});
+
+test('生产环境没配 SESSION_SECRET 拒绝启动', () => {
+    assert.throws(() => load({ SESSION_SECRET: undefined, NODE_ENV: 'production' }), /SESSION_SECRET/);
+});
+
+test('开发环境没配 SESSION_SECRET 时密钥存到文件，重启后令牌还有效', t => {
+    const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'session-test-'));
+    t.after(() => fs.rmSync(dir, { recursive: true, force: true }));
+    t.mock.method(console, 'warn', () => {});
+    const env = { SESSION_SECRET: undefined, NODE_ENV: undefined, SESSION_KEY_FILE: path.join(dir, 'session.key') };
+    const token = load(env).issue('alice');
+    assert.ok(fs.existsSync(env.SESSION_KEY_FILE));
+    assert.strictEqual(load(env).verify(token), 'alice');
+});
@@ -0,0 +1,55 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const WorkerPool = require('../lib/worker-pool');
+const codec = require('../lib/image-codec');
+
+const pool = new WorkerPool(path.join(__dirname, '..', 'lib', 'thumb-worker.js'), { size: 1 });
+const fixture = name => path.join(__dirname, 'fixtures', name);
+
+test.after(() => pool.close());
+
+test('不透明的图出 JPEG 缩略图和 PNG 占位图', async () => {
+    const res = await pool.run({ file: fixture('video-001.jpeg') });
+    assert.deepStrictEqual([res.width, res.height], [150, 103]);
+    assert.strictEqual(res.mime, 'image/jpeg');
+    const thumb = Buffer.from(res.thumb);
+    assert.deepStrictEqual(codec.dimensions(thumb), { width: 150, height: 103 }); // 比 320 小的不放大
+    assert.match(res.blur, /^data:image\/png;base64,/);
+    const blur = codec.decode(Buffer.from(res.blur.split(',')[1], 'base64'));
+    assert.deepStrictEqual([blur.width, blur.height], [16, 11]);
+});
+
+test('带透明的图出 PNG 缩略图', async () => {
+    const res = await pool.run({ file: fixture('basn6a08.png') });
+    assert.strictEqual(res.mime, 'image/png');
+    assert.strictEqual(codec.hasAlpha(codec.decode(Buffer.from(res.thumb))), true);
+});
+
+test('解不了的图只给尺寸，读不出尺寸的给 null，文件不在了报错', async () => {
+    const dir = fs.mkdtempSync(path.join(os.tmpdir(), 'thumb-'));
+    try {
+        const webp = Buffer.alloc(64);
+        webp.write('RIFF', 0, 'latin1');
+        webp.write('WEBPVP8L', 8, 'latin1');
+        webp[20] = 0x2f;
+        webp.writeUInt32LE((640 - 1) | ((480 - 1) << 14), 21);
+        fs.writeFileSync(path.join(dir, 'a.webp'), webp);
+        assert.deepStrictEqual(await pool.run({ file: path.join(dir, 'a.webp') }), { width: 640, height: 480 });
+
+        fs.writeFileSync(path.join(dir, 'a.txt'), 'hello, this is not an image file');
+        assert.strictEqual(await pool.run({ file: path.join(dir, 'a.txt') }), null);
+
+        await assert.rejects(pool.run({ file: path.join(dir, 'missing.png') }));
+    } finally {
+        fs.rmSync(dir, { recursive: true, force: true });
+    }
+});
+
+test('截断的 JPEG 也能出缩略图，坏掉的 PNG 退回只给尺寸', async () => {
+    const truncated = await pool.run({ file: fixture('video-001.progressive.truncated.jpeg') });
+    assert.ok(truncated.thumb);
+    assert.deepStrictEqual(await pool.run({ file: fixture('invalid-zlib.png') }), { width: 232, height: 232 });
+});
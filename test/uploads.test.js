@@ -0,0 +1,167 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const http = require('http');
+const crypto = require('crypto');
+
+const root = fs.mkdtempSync(path.join(os.tmpdir(), 'uploads-'));
+process.env.UPLOAD_DIR = root;
+const uploads = require('../lib/uploads');
+const attachments = require('../lib/attachments');
+
+// 真的 HTTP 服务器，补上 put/head 用到的那几个 express 方法
+const server = http.createServer((req, res) => {
+    const url = new URL(req.url, 'http://localhost');
+    req.params = { id: url.pathname.split('/').pop() };
+    req.query = Object.fromEntries(url.searchParams);
+    req.get = name => req.headers[name.toLowerCase()];
+    res.set = (name, value) => {
+        if (typeof name === 'object') Object.entries(name).forEach(([k, v]) => res.setHeader(k, v));
+        else res.setHeader(name, value);
+        return res;
+    };
+    res.status = code => { res.statusCode = code; return res; };
+    res.sendStatus = code => res.status(code).end();
+    (req.method === 'HEAD' ? uploads.head : uploads.put)(req, res);
+});
+
+test.before(() => new Promise(resolve => server.listen(0, '127.0.0.1', resolve)));
+test.after(() => {
+    server.close();
+    fs.rmSync(root, { recursive: true, force: true });
+});
+
+// PNG 文件头 + 随机内容，sniff 认得出来就行
+function image(size) {
+    const buf = crypto.randomBytes(size);
+    Buffer.from([0x89, 0x50, 0x4e, 0x47, 0x0d, 0x0a, 0x1a, 0x0a]).copy(buf);
+    return buf;
+}
+
+const sha256 = buf => crypto.createHash('sha256').update(buf).digest('hex');
+const create = opts => new Promise((resolve, reject) => uploads.create(opts, (err, id) => err ? reject(err) : resolve(id)));
+const complete = (id, user) => new Promise((resolve, reject) => uploads.complete(id, user, (err, ref) => err ? reject(err) : resolve(ref)));
+
+// chunks 给了就用 chunked 编码一段段发 (不带 content-length)，每段之间停一下，让服务器分开收到
+function request(method, id, { offset, body, chunks } = {}) {
+    return new Promise((resolve, reject) => {
+        const headers = body ? { 'Content-Length': body.length } : {};
+        const req = http.request({
+            host: '127.0.0.1', port: server.address().port, method, headers,
+            path: `/uploads/${id}` + (offset != null ? `?offset=${offset}` : '')
+        }, (res) => {
+            res.resume();
+            res.on('end', () => resolve({ status: res.statusCode, offset: Number(res.headers['upload-offset']) }));
+        });
+        req.on('error', reject);
+        if (!chunks) return req.end(body);
+        const next = (i) => {
+            if (i === chunks.length) return req.end();
+            req.write(chunks[i], () => setTimeout(() => next(i + 1), 30));
+        };
+        next(0);
+    });
+}
+
+const partSize = id => fs.statSync(path.join(root, 'tmp', id + '.part')).size;
+
+test('登记时校验大小和哈希', async () => {
+    await assert.rejects(create({ user: 'a', size: 0 }), /invalid size/);
+    await assert.rejects(create({ user: 'a', size: 1.5 }), /invalid size/);
+    await assert.rejects(create({ user: 'a', size: uploads.MAX_SIZE + 1 }), /too large/);
+    await assert.rejects(create({ user: 'a', size: 10, sha256: 'abc' }), /invalid hash/);
+});
+
+test('分块传完、校验哈希后移进附件目录', async () => {
+    const buf = image(uploads.CHUNK_SIZE * 2 + 1000);
+    const id = await create({ user: 'a', size: buf.length, sha256: sha256(buf) });
+    let offset = 0;
+    while (offset < buf.length) {
+        const res = await request('PUT', id, { offset, body: buf.subarray(offset, offset + uploads.CHUNK_SIZE) });
+        assert.strictEqual(res.status, 204);
+        assert.strictEqual(res.offset, Math.min(offset + uploads.CHUNK_SIZE, buf.length));
+        offset = res.offset;
+    }
+    await assert.rejects(complete(id, 'b'), /unknown upload/);
+    const ref = await complete(id, 'a');
+    assert.strictEqual(ref, `${attachments.URL_PREFIX}${sha256(buf)}.png`);
+    assert.ok(fs.readFileSync(attachments.filePath(ref.slice(attachments.URL_PREFIX.length))).equals(buf));
+    // 临时文件都收走了
+    assert.strictEqual((await request('HEAD', id)).status, 404);
+});
+
+test('偏移对不上返回 409 和正确的偏移；HEAD 报告进度', async () => {
+    const buf = image(1000);
+    const id = await create({ user: 'a', size: buf.length });
+    assert.strictEqual((await request('PUT', id, { offset: 0, body: buf.subarray(0, 400) })).status, 204);
+    // 重发同一块 / 跳过一段
+    assert.deepStrictEqual(await request('PUT', id, { offset: 0, body: buf.subarray(0, 400) }), { status: 409, offset: 400 });
+    assert.deepStrictEqual(await request('PUT', id, { offset: 800, body: buf.subarray(800) }), { status: 409, offset: 400 });
+    assert.deepStrictEqual(await request('HEAD', id), { status: 204, offset: 400 });
+    await assert.rejects(complete(id, 'a'), /incomplete/);
+    assert.strictEqual((await request('PUT', id, { offset: 400, body: buf.subarray(400) })).status, 204);
+    await complete(id, 'a');
+});
+
+test('中途断开：已经落盘的部分算数，从 HEAD 报告的位置续传', async () => {
+    const buf = image(uploads.CHUNK_SIZE);
+    const id = await create({ user: 'a', size: buf.length, sha256: sha256(buf) });
+    await new Promise((resolve) => {
+        const req = http.request({
+            host: '127.0.0.1', port: server.address().port, method: 'PUT',
+            path: `/uploads/${id}?offset=0`, headers: { 'Content-Length': buf.length }
+        });
+        req.on('error', () => {});
+        req.write(buf.subarray(0, 100 * 1024), () => setTimeout(() => { req.destroy(); resolve(); }, 50));
+    });
+    // 等服务器那边写完、关掉文件
+    let head;
+    for (let i = 0; i < 50; i++) {
+        await new Promise(r => setTimeout(r, 20));
+        head = await request('HEAD', id);
+        if (head.offset === 100 * 1024) break;
+    }
+    assert.ok(head.offset > 0 && head.offset <= 100 * 1024, String(head.offset));
+    assert.strictEqual((await request('PUT', id, { offset: head.offset, body: buf.subarray(head.offset) })).status, 204);
+    await complete(id, 'a'); // 哈希对得上，说明断开前写下的都是正确的前缀
+});
+
+test('声明的长度超过这一块的上限：413，什么都不写', async () => {
+    const buf = image(uploads.CHUNK_SIZE + 10);
+    const id = await create({ user: 'a', size: buf.length });
+    assert.strictEqual((await request('PUT', id, { offset: 0, body: buf })).status, 413);
+    assert.strictEqual(partSize(id), 0);
+    // 最后一块比剩下的多
+    assert.strictEqual((await request('PUT', id, { offset: 0, body: buf.subarray(0, uploads.CHUNK_SIZE) })).status, 204);
+    assert.strictEqual((await request('PUT', id, { offset: uploads.CHUNK_SIZE, body: buf.subarray(0, 11) })).status, 413);
+    assert.strictEqual(partSize(id), uploads.CHUNK_SIZE);
+});
+
+test('chunked 请求体超长：413，文件截回这一块开始的地方', async () => {
+    const buf = image(1000);
+    const id = await create({ user: 'a', size: buf.length });
+    assert.strictEqual((await request('PUT', id, { offset: 0, body: buf.subarray(0, 300) })).status, 204);
+    const res = await request('PUT', id, { offset: 300, chunks: [buf.subarray(300, 900), buf.subarray(0, 500)] });
+    assert.deepStrictEqual(res, { status: 413, offset: 300 });
+    assert.strictEqual(partSize(id), 300);
+    assert.deepStrictEqual(await request('HEAD', id), { status: 204, offset: 300 });
+    // 之后照常续传
+    assert.strictEqual((await request('PUT', id, { offset: 300, chunks: [buf.subarray(300, 600), buf.subarray(600)] })).status, 204);
+    await complete(id, 'a');
+});
+
+test('哈希不对或者不是图片：拒绝并删掉临时文件', async () => {
+    const buf = image(100);
+    const id = await create({ user: 'a', size: buf.length, sha256: sha256(Buffer.from('other')) });
+    await request('PUT', id, { offset: 0, body: buf });
+    await assert.rejects(complete(id, 'a'), /hash mismatch/);
+    await new Promise(r => setTimeout(r, 20));
+    assert.strictEqual((await request('HEAD', id)).status, 404);
+
+    const text = Buffer.from('just some text, definitely not an image');
+    const id2 = await create({ user: 'a', size: text.length });
+    await request('PUT', id2, { offset: 0, body: text });
+    await assert.rejects(complete(id2, 'a'), /unsupported type/);
+});
@@ -0,0 +1,111 @@
+const test = require('node:test');
+const assert = require('node:assert');
+const WriteQueue = require('../lib/write-queue');
+
+// 内存里的假存储：按 (user, cid) 去重，id 递增；results[i] 对应 items[i]，和 storage 的 insertMessages 约定一致
+function memoryStore({ delay = 1, fail = () => false } = {}) {
+    const rows = [];
+    const byCid = new Map();
+    const batches = [];
+    const writeBatch = (items, cb) => {
+        batches.push(items.length);
+        setTimeout(() => {
+            if (fail(items)) return cb(new Error('disk full'));
+            cb(null, items.map(item => {
+                const key = item.cid && item.user + '\n' + item.cid;
+                if (key && byCid.has(key)) return { id: byCid.get(key), duplicate: true };
+                rows.push(item);
+                if (key) byCid.set(key, rows.length);
+                return { id: rows.length, duplicate: false };
+            }));
+        }, delay);
+    };
+    return { rows, batches, writeBatch };
+}
+
+const push = (queue, item) => new Promise((resolve, reject) => {
+    if (!queue.push(item, (err, res) => err ? reject(err) : resolve(res))) reject(new Error('full'));
+});
+
+test('按 push 的顺序落库，每条的回调拿到自己那一行的 id', async () => {
+    const store = memoryStore();
+    const queue = new WriteQueue(store.writeBatch, { interval: 2, maxBatch: 7 });
+    const results = await Promise.all(Array.from({ length: 50 }, (_, i) => push(queue, { user: 'u', n: i })));
+    assert.deepStrictEqual(store.rows.map(r => r.n), Array.from({ length: 50 }, (_, i) => i));
+    results.forEach((res, i) => assert.deepStrictEqual(res, { id: i + 1, duplicate: false }));
+    // 凑够 maxBatch 就写，一批不超过 maxBatch
+    assert.ok(store.batches.every(n => n <= 7));
+    assert.strictEqual(store.batches.reduce((a, b) => a + b, 0), 50);
+});
+
+test('同一个时间窗口里的消息合成一批', async () => {
+    const store = memoryStore();
+    const queue = new WriteQueue(store.writeBatch, { interval: 20, maxBatch: 100 });
+    await Promise.all([push(queue, { n: 1 }), push(queue, { n: 2 }), push(queue, { n: 3 })]);
+    assert.deepStrictEqual(store.batches, [3]);
+});
+
+test('同一时间只有一批在写，写的时候进来的排到下一批', async () => {
+    let inflight = 0;
+    let maxInflight = 0;
+    const store = memoryStore({ delay: 10 });
+    const queue = new WriteQueue((items, cb) => {
+        maxInflight = Math.max(maxInflight, ++inflight);
+        store.writeBatch(items, (err, res) => { inflight--; cb(err, res); });
+    }, { interval: 1, maxBatch: 5 });
+    const all = [];
+    for (let i = 0; i < 23; i++) {
+        all.push(push(queue, { n: i }));
+        if (i % 4 === 0) await new Promise(r => setTimeout(r, 3));
+    }
+    await Promise.all(all);
+    assert.strictEqual(maxInflight, 1);
+    assert.deepStrictEqual(store.rows.map(r => r.n), Array.from({ length: 23 }, (_, i) => i));
+});
+
+test('重发的 cid 拿回原来的 id，标记 duplicate，不会再存一次', async () => {
+    const store = memoryStore();
+    const queue = new WriteQueue(store.writeBatch, { interval: 1 });
+    const first = await push(queue, { user: 'a', cid: 'c1' });
+    // 同一批里重复、跨批重复、不同用户同一个 cid
+    const [again, sameBatch, other] = await Promise.all([
+        push(queue, { user: 'a', cid: 'c1' }),
+        push(queue, { user: 'a', cid: 'c1' }),
+        push(queue, { user: 'b', cid: 'c1' })
+    ]);
+    assert.deepStrictEqual(again, { id: first.id, duplicate: true });
+    assert.deepStrictEqual(sameBatch, { id: first.id, duplicate: true });
+    assert.deepStrictEqual(other, { id: 2, duplicate: false });
+    assert.strictEqual(store.rows.length, 2);
+});
+
+test('写失败：这一批的回调都拿到错误，队列继续处理后面的', async () => {
+    let failOnce = true;
+    const store = memoryStore({ fail: () => failOnce && !(failOnce = false) });
+    const queue = new WriteQueue(store.writeBatch, { interval: 1 });
+    const errors = [];
+    queue.on('error', err => errors.push(err));
+    const failed = await Promise.allSettled([push(queue, { n: 1 }), push(queue, { n: 2 })]);
+    assert.deepStrictEqual(failed.map(r => r.status), ['rejected', 'rejected']);
+    assert.strictEqual(errors.length, 1);
+    assert.deepStrictEqual(await push(queue, { n: 3 }), { id: 1, duplicate: false });
+});
+
+test('队列满了拒绝写入', () => {
+    const queue = new WriteQueue(() => {}, { interval: 1000, maxBatch: 100, maxPending: 3 });
+    assert.ok(queue.push({}) && queue.push({}) && queue.push({}));
+    assert.strictEqual(queue.full, true);
+    assert.strictEqual(queue.push({}), false);
+    clearTimeout(queue.timer);
+});
+
+test('close 等所有积压都写完才回调', async () => {
+    const store = memoryStore({ delay: 5 });
+    const queue = new WriteQueue(store.writeBatch, { interval: 1000, maxBatch: 4 });
+    for (let i = 0; i < 10; i++) queue.push({ n: i });
+    await new Promise(resolve => queue.close(resolve));
+    assert.strictEqual(store.rows.length, 10);
+    assert.strictEqual(queue.size, 0);
+    // 空队列直接回调
+    await new Promise(resolve => queue.close(resolve));
+});